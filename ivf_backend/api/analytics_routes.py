@@ -1,7 +1,29 @@
 # ivf_backend/api/analytics_routes.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request
+
+from ..services.doctor_chatbot import DoctorChatbot
+from .dependencies import get_chatbot
+
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 @router.get("/ping")
 async def ping():
     return {"status":"ok"}
+
+@router.get("/pipeline")
+async def pipeline_timings(chatbot: DoctorChatbot = Depends(get_chatbot)):
+    """Per-stage latency of recent chat turns (avg / p95 ms); "total" is the critical path."""
+    return chatbot.stage_metrics.snapshot()
+
+@router.get("/memory")
+async def memory_cache(chatbot: DoctorChatbot = Depends(get_chatbot)):
+    """Session store backend; for SQLite, its recent-history cache: sessions held, bytes, hit rate."""
+    return chatbot.memory_manager.cache_stats()
+
+@router.get("/retention")
+async def retention_report(request: Request):
+    """Last archival run: sessions/messages archived, archive file, bytes reclaimed, DB size."""
+    job = getattr(request.app.state, "retention", None)
+    if job is None:
+        return {"enabled": False}
+    return {"enabled": True, "last_run": job.last_report}
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from fastapi.responses import JSONResponse
 import logging
 from ..models.chat_models import ChatRequest, ChatResponse
 from ..services.doctor_chatbot import DoctorChatbot
+from .dependencies import get_chatbot
 
 # REMOVE /api prefix
 router = APIRouter(prefix="", tags=["chat"])
@@ -40,12 +41,14 @@ def _serialize_chat_response(resp: ChatResponse) -> dict:
 
 # Now endpoint is: POST /chat
 @router.post("/chat", response_model=ChatResponse)
-async def handle_chat(req: ChatRequest, request: Request):
-    rag = getattr(request.app.state, "rag_engine", None)
-    chatbot = DoctorChatbot(rag=rag)
-
+async def handle_chat(
+    req: ChatRequest,
+    background_tasks: BackgroundTasks,
+    chatbot: DoctorChatbot = Depends(get_chatbot)
+):
     try:
-        resp = chatbot.process_message(req)
+        # the exchange is written to memory after the response has gone out
+        resp = await chatbot.aprocess_message(req, defer=background_tasks.add_task)
         payload = _serialize_chat_response(resp)
         return JSONResponse(status_code=200, content=payload)
     except Exception as e:
@@ -0,0 +1,18 @@
+# ivf_backend/api/dependencies.py
+from fastapi import Request, HTTPException
+
+from ..services.doctor_chatbot import DoctorChatbot
+
+
+def get_chatbot(request: Request) -> DoctorChatbot:
+    """The chat pipeline built once in the startup hook (shared LLM client/cache, memory DB, safety rules)."""
+    chatbot = getattr(request.app.state, "chatbot", None)
+    if chatbot is None:
+        raise HTTPException(status_code=503, detail="Chat service is not available.")
+    return chatbot
+
+
+def get_tts(request: Request):
+    """Offline TTS engine, or None when espeak-ng is not installed."""
+    tts = getattr(request.app.state, "tts", None)
+    return tts if tts is not None and tts.available else None
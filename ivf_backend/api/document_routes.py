@@ -1,13 +1,14 @@
-import os
-import shutil
-import tempfile
+import asyncio
 import logging
 from pathlib import Path
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from typing import Optional, List, Dict, Any
+from fastapi import APIRouter, UploadFile, File, Form, Request, HTTPException
 from fastapi.responses import JSONResponse
 
 from ..services.document_processor import DocumentProcessor
 from ..services.llm_engine import LLMEngine
+from ..config import settings
+from .uploads import upload_limit, too_large, save_upload, discard
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/documents", tags=["documents"])
@@ -16,13 +17,64 @@ processor = DocumentProcessor()
 llm = LLMEngine()
 
 
+def _index_for_session(request: Request, session_id: Optional[str], result: Dict[str, Any], filename: str) -> int:
+    session_index = getattr(request.app.state, "session_index", None)
+    if not (session_index and session_id and result.get("chunks")):
+        return 0
+    try:
+        return session_index.add_document(session_id, result["chunks"], source=filename)
+    except Exception as e:
+        logger.exception(f"Session indexing failed (continuing): {e}")
+        return 0
+
+
+def _is_ivf_relevant(content: str) -> bool:
+    """LLM classifier: is this document about IVF / reproductive health?"""
+    relevance_prompt = (
+        "You are an IVF content classifier.\n"
+        "Read the text below and answer ONLY 'YES' or 'NO'.\n\n"
+        "YES = The document is about IVF, fertility, pregnancy, reproductive health, "
+        "menstrual cycles, hormones, infertility, ovulation, sperm, embryos, gynaecology, "
+        "laparoscopy, ovarian reserve, AMH, semen analysis, reproductive tests.\n\n"
+        "NO = Everything else. Financial docs, legal docs, academic papers, software, "
+        "general reports, school assignments, novels, textbooks, random content, etc.\n\n"
+        f"Document text:\n{content}\n\n"
+        "Is this document related to IVF?"
+    )
+
+    relevance = llm.generate_response(relevance_prompt).strip().lower()
+    return relevance.startswith("yes")
+
+
+def _explain(content: str) -> str:
+    summary_prompt = (
+        "Below is the extracted content of a medical document.\n\n"
+        "You MUST follow these rules:\n"
+        "- Summarize it as simply as possible.\n"
+        "- DO NOT provide any medical advice.\n"
+        "- DO NOT diagnose or suggest treatment.\n"
+        "- If anything sounds serious, ALWAYS say: 'Please visit your doctor.'\n"
+        "- Keep it factual and IVF-safe.\n\n"
+        f"Document content:\n{content}\n\n"
+        "Now provide a short, safe explanation:"
+    )
+
+    return llm.generate_response(summary_prompt)
+
+
 @router.post("/analyze")
-async def analyze_document(file: UploadFile = File(...)):
+async def analyze_document(
+    request: Request,
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None)
+):
     """
     Upload → extract → IVF relevance check → safe summary.
     If the document is NOT related to IVF → reject it.
+    With a session_id, the document is also indexed so follow-up chat questions can retrieve from it.
     """
 
+    temp_path = None
     try:
         file_ext = Path(file.filename).suffix.lower()
 
@@ -30,19 +82,15 @@ async def analyze_document(file: UploadFile = File(...)):
         if file_ext not in processor.supported_formats:
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_ext}")
 
-        # Save temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            temp_path = tmp.name
+        # Save temporarily (streamed to disk, rejected once over the type's limit)
+        limit = upload_limit(file_ext)
+        saved = await save_upload(file, file_ext, limit)
+        if saved is None:
+            raise HTTPException(status_code=413, detail=too_large(limit))
+        temp_path, _ = saved
 
-        # Extract text
-        result = processor.process_document(temp_path, file_ext)
-
-        # Cleanup
-        try:
-            os.remove(temp_path)
-        except:
-            pass
+        # Extract text (parsing runs off the event loop)
+        result = await asyncio.to_thread(processor.process_document, temp_path, file_ext)
 
         if result is None or "error" in result:
             raise HTTPException(status_code=500, detail=result.get("error", "Processing failed"))
@@ -56,24 +104,15 @@ async def analyze_document(file: UploadFile = File(...)):
                 content={"error": "Could not extract readable text from this file."}
             )
 
+        # Structured lab table when the parser covers the report, raw text otherwise
+        content = processor.prompt_content(result)
+
         # ------------------------------------------------------------
-        # IVF RELEVANCE CHECK  (LLM classifier)
+        # IVF RELEVANCE CHECK
+        # Fertility lab values are proof enough; otherwise ask the LLM classifier.
         # ------------------------------------------------------------
-        relevance_prompt = (
-            "You are an IVF content classifier.\n"
-            "Read the text below and answer ONLY 'YES' or 'NO'.\n\n"
-            "YES = The document is about IVF, fertility, pregnancy, reproductive health, "
-            "menstrual cycles, hormones, infertility, ovulation, sperm, embryos, gynaecology, "
-            "laparoscopy, ovarian reserve, AMH, semen analysis, reproductive tests.\n\n"
-            "NO = Everything else. Financial docs, legal docs, academic papers, software, "
-            "general reports, school assignments, novels, textbooks, random content, etc.\n\n"
-            f"Document text:\n{extracted}\n\n"
-            "Is this document related to IVF?"
-        )
-
-        relevance = llm.generate_response(relevance_prompt).strip().lower()
-
-        if not relevance.startswith("yes"):
+        has_markers = processor.has_fertility_markers(result.get("lab_values", []))
+        if not has_markers and not await asyncio.to_thread(_is_ivf_relevant, content):
             # Reject file completely
             return JSONResponse(
                 status_code=400,
@@ -86,26 +125,21 @@ async def analyze_document(file: UploadFile = File(...)):
         # ------------------------------------------------------------
         # IVF-SAFE EXPLANATION
         # ------------------------------------------------------------
-        summary_prompt = (
-            "Below is the extracted text from a medical document.\n\n"
-            "You MUST follow these rules:\n"
-            "- Summarize it as simply as possible.\n"
-            "- DO NOT provide any medical advice.\n"
-            "- DO NOT diagnose or suggest treatment.\n"
-            "- If anything sounds serious, ALWAYS say: 'Please visit your doctor.'\n"
-            "- Keep it factual and IVF-safe.\n\n"
-            f"Document text:\n{extracted}\n\n"
-            "Now provide a short, safe explanation:"
-        )
+        explanation = await asyncio.to_thread(_explain, content)
 
-        explanation = llm.generate_response(summary_prompt)
+        # ------------------------------------------------------------
+        # INDEX FOR FOLLOW-UP QUESTIONS IN CHAT
+        # ------------------------------------------------------------
+        indexed = _index_for_session(request, session_id, result, file.filename)
 
         return JSONResponse(
             status_code=200,
             content={
                 "filename": file.filename,
                 "extracted_text": extracted,
-                "explanation": explanation
+                "explanation": explanation,
+                "lab_values": result.get("lab_values", []),
+                "indexed_chunks": indexed
             }
         )
 
@@ -114,7 +148,121 @@ async def analyze_document(file: UploadFile = File(...)):
     except Exception as e:
         logger.exception(f"Document analysis failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        discard(temp_path)
+
+
+@router.post("/analyze-batch")
+async def analyze_documents_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    session_id: Optional[str] = Form(None)
+):
+    """
+    Several reports in one request: extract concurrently, drop duplicate uploads (by content hash),
+    then ONE relevance check (skipped when lab markers are present) and ONE explanation over the
+    merged structured content.
+    """
+
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.MAX_BATCH_FILES} files per batch")
+
+    unique: List[Dict[str, Any]] = []
+    try:
+        # ------------------------------------------------------------
+        # SAVE + DEDUPLICATE
+        # ------------------------------------------------------------
+        report: List[Dict[str, Any]] = []
+        seen: Dict[str, str] = {}
+
+        for f in files:
+            file_ext = Path(f.filename or "").suffix.lower()
+            entry = {"filename": f.filename}
+            report.append(entry)
+
+            if file_ext not in processor.supported_formats:
+                entry["error"] = f"Unsupported file type: {file_ext}"
+                continue
+
+            limit = upload_limit(file_ext)
+            saved = await save_upload(f, file_ext, limit)
+            if saved is None:
+                entry["error"] = too_large(limit)
+                continue
+            path, digest = saved
+            if digest in seen:
+                discard(path)
+                entry["duplicate_of"] = seen[digest]
+                continue
+            seen[digest] = f.filename
 
+            unique.append({"entry": entry, "ext": file_ext, "path": path})
+
+        # ------------------------------------------------------------
+        # CONCURRENT EXTRACTION
+        # ------------------------------------------------------------
+        results = await asyncio.gather(
+            *(asyncio.to_thread(processor.process_document, u["path"], u["ext"]) for u in unique)
+        )
+
+        docs = []
+        for u, result in zip(unique, results):
+            entry = u["entry"]
+            if result is None or "error" in result:
+                entry["error"] = (result or {}).get("error", "Processing failed")
+            elif not result.get("extracted_text", "").strip():
+                entry["error"] = "Could not extract readable text from this file."
+            else:
+                entry["lab_values"] = result.get("lab_values", [])
+                docs.append((entry, result))
+
+        if not docs:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Could not extract readable text from these files.", "files": report}
+            )
+
+        # ------------------------------------------------------------
+        # MERGED CONTENT → single relevance check + single explanation
+        # ------------------------------------------------------------
+        content = "\n\n".join(
+            f"### {entry['filename']}\n{processor.prompt_content(result)}" for entry, result in docs
+        )
+
+        has_markers = any(processor.has_fertility_markers(result.get("lab_values", [])) for _, result in docs)
+        if not has_markers and not await asyncio.to_thread(_is_ivf_relevant, content):
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "error": "These documents are not related to IVF or reproductive health.",
+                    "relevant": False,
+                    "files": report
+                }
+            )
+
+        explanation = await asyncio.to_thread(_explain, content)
+
+        indexed = 0
+        for entry, result in docs:
+            indexed += _index_for_session(request, session_id, result, entry["filename"])
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "files": report,
+                "explanation": explanation,
+                "indexed_chunks": indexed
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Batch document analysis failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for u in unique:
+            discard(u["path"])
 
 
 @router.post("/upload")
@@ -1,42 +1,90 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-import pytesseract
-from PIL import Image
+import asyncio
 import io
-from ivf_backend.services.llm_engine import run_llm_ivf_safe
+import logging
+from pathlib import Path
+from fastapi import APIRouter, UploadFile, File, Request, HTTPException
+from fastapi.responses import JSONResponse
+import PyPDF2
 
+from ..services.llm_engine import LLMEngine
+from ..services.document_processor import DocumentProcessor
+from ..services.ocr_service import IMAGE_EXTENSIONS
+from ..config import settings
+from .uploads import too_large, read_upload
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/files", tags=["files"])
 
+llm = LLMEngine()
+processor = DocumentProcessor()
+
+# a PDF page with less text than this is treated as a scan and OCR'd
+MIN_TEXT_CHARS_PER_PAGE = 50
+
+
+def _pdf_text_layer(content: bytes):
+    """Return (text, page_count) from the PDF's embedded text layer."""
+    reader = PyPDF2.PdfReader(io.BytesIO(content))
+    text = "\n".join((page.extract_text() or "") for page in reader.pages)
+    return text, len(reader.pages)
+
+
 @router.post("/analyze")
-async def analyze_file(file: UploadFile = File(...)):
-    """Extract text → LLM summarizes → returns SAFE IVF explanation."""
+async def analyze_file(request: Request, file: UploadFile = File(...)):
+    """Extract text (OCR for images / scanned PDFs) → LLM summarizes → returns SAFE IVF explanation."""
     try:
-        content = await file.read()
+        file_ext = Path(file.filename or "").suffix.lower()
+        # held in memory for the OCR pool: no streamed-CSV allowance here
+        content = await read_upload(file, settings.MAX_FILE_SIZE)
+        if content is None:
+            raise HTTPException(status_code=413, detail=too_large(settings.MAX_FILE_SIZE))
+        ocr = getattr(request.app.state, "ocr_service", None)
 
-        # --- Step 1: Extract text (OCR for images / direct for txt/pdf) ---
+        # --- Step 1: Extract text ---
         text = ""
+        used_ocr = False
 
-        if file.filename.endswith((".png", ".jpg", ".jpeg")):
-            img = Image.open(io.BytesIO(content))
-            text = pytesseract.image_to_string(img)
-
-        elif file.filename.endswith(".txt"):
+        if file_ext == ".txt":
             text = content.decode("utf-8", errors="ignore")
 
+        elif file_ext == ".pdf":
+            text, page_count = await asyncio.to_thread(_pdf_text_layer, content)
+            if len(text.strip()) < MIN_TEXT_CHARS_PER_PAGE * max(page_count, 1) and ocr and ocr.available:
+                try:
+                    text = (await ocr.extract_text(content, file_ext))["text"]
+                    used_ocr = True
+                except RuntimeError as e:
+                    logger.warning(f"Scanned PDF OCR unavailable, using text layer: {e}")
+
+        elif file_ext in IMAGE_EXTENSIONS:
+            if not ocr or not ocr.available:
+                raise HTTPException(status_code=503, detail="OCR is not available on this server.")
+            text = (await ocr.extract_text(content, file_ext))["text"]
+            used_ocr = True
+
         else:
-            text = "Unable to extract text — unsupported file type."
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_ext}")
 
         if not text.strip():
-            raise Exception("No readable text found in the uploaded file.")
+            return JSONResponse(
+                status_code=400,
+                content={"error": "No readable text found in the uploaded file."}
+            )
 
-        # --- Step 2: Analyze with IVF-Safe LLM ---
-        result = run_llm_ivf_safe(
-            f"Extracted text from patient document:\n\n{text}\n\n"
-            "Explain this document simply. If anything appears serious, tell them to visit their doctor."
-        )
+        # --- Step 2: Analyze with IVF-Safe LLM (lab table when the parser covers the report) ---
+        labs = processor.extract_lab_values(text)
+        content = processor.prompt_content({**labs, "extracted_text": text[:3000]})
+        result = await asyncio.to_thread(llm.explain_document, content)  # sync Groq call
 
-        return JSONResponse({"summary": result})
+        return JSONResponse({
+            "summary": result,
+            "extracted_text": text[:3000],
+            "lab_values": labs["lab_values"],
+            "ocr": used_ocr
+        })
 
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception(f"File analysis failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,43 @@
+# ivf_backend/api/session_routes.py
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from ..services.doctor_chatbot import DoctorChatbot
+from .dependencies import get_chatbot
+
+router = APIRouter(prefix="/sessions", tags=["sessions"])
+
+
+@router.get("/{session_id}/messages")
+async def session_messages(
+    session_id: str,
+    before: Optional[int] = Query(None, ge=1, description="Return messages older than this message id"),
+    limit: int = Query(50, ge=1, le=200),
+    chatbot: DoctorChatbot = Depends(get_chatbot)
+):
+    """
+    Page backwards through a session's history, oldest first within a page:
+      {"session_id", "messages": [{"id", "role", "content", "timestamp", "tokens"}], "next_before"}
+    Pass next_before as ?before= for the previous page; it is null on the oldest page.
+    """
+    memory = chatbot.memory_manager
+    msgs, next_before = await asyncio.to_thread(memory.get_messages_page, session_id, before, limit)
+    if not msgs and before is None:
+        if await asyncio.to_thread(memory.get_session_info, session_id) is None:
+            raise HTTPException(status_code=404, detail="Session not found.")
+
+    return {
+        "session_id": session_id,
+        "messages": [
+            {
+                "id": int(m.message_id),
+                "role": getattr(m.role, "value", m.role),
+                "content": m.content,
+                "timestamp": m.timestamp.isoformat(),
+                "tokens": m.tokens,
+            }
+            for m in msgs
+        ],
+        "next_before": next_before,
+    }
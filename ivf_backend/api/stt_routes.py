@@ -1,45 +1,52 @@
 # ivf_backend/api/stt_routes.py
-from fastapi import APIRouter, UploadFile, File
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
+import asyncio
+import json
+import logging
 import traceback
-import os
 
 from ivf_backend.services.audio_service import AudioService
-from ivf_backend.services.speech_to_text import SpeechToText
+from ivf_backend.services.speech_to_text import STTBusyError
+from ivf_backend.services.stt_service import STTUnavailableError
+from ivf_backend.services.speculative_rag import SpeculativeRetriever
+from ivf_backend.config import settings
 
 router = APIRouter(prefix="/audio", tags=["audio"])
+logger = logging.getLogger(__name__)
 
-# Initialize engines once (fail early on startup if model missing)
-stt_engine = SpeechToText()
 audio_svc = AudioService()
 
 
 @router.post("/transcribe")
-async def transcribe_audio(file: UploadFile = File(...)):
+async def transcribe_audio(request: Request, file: UploadFile = File(...), policy: Optional[str] = Form(None)):
     """
-    Robust STT endpoint that always returns JSON.
-    Frontend should POST multipart/form-data with field "file".
-    Response: {"text": "..."} on success or {"error": "..."} on failure.
+    The single STT endpoint. Always returns JSON.
+    Frontend should POST multipart/form-data with field "file" (optional "policy" overrides STT_POLICY:
+    local_only | fallback | latency_first).
+    Response: {"text": "...", "engine": "vosk|whisper|stub", "segments": n} on success or {"error": "..."} on failure.
+    Silence is trimmed and long recordings are split at pauses before decoding (VAD_* settings).
     """
+    stt = getattr(request.app.state, "stt_service", None)
+    if stt is None:
+        return JSONResponse(status_code=503, content={"error": "Speech recognition is not available."})
+
     try:
-        # save uploaded raw bytes to temp file
-        saved_path = audio_svc.save_uploaded_file(file)
-        # convert to wav 16k mono
-        wav_path = audio_svc.convert_to_wav(saved_path)
+        # decode straight from memory to 16k mono PCM (no temp files), off the event loop
+        audio_bytes = await file.read()
+        pcm = await asyncio.to_thread(audio_svc.decode_to_pcm, audio_bytes)
 
-        # transcribe
-        text = stt_engine.transcribe(wav_path)
+        result = await stt.transcribe(pcm, policy=policy)
+        return JSONResponse(status_code=200, content={
+            "text": result["text"], "engine": result["engine"], "segments": result["segments"]
+        })
 
-        # cleanup temporary files (best-effort)
-        try:
-            if os.path.exists(saved_path):
-                os.remove(saved_path)
-            if os.path.exists(wav_path) and wav_path != saved_path:
-                os.remove(wav_path)
-        except Exception:
-            pass
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
 
-        return JSONResponse(status_code=200, content={"text": text})
+    except (STTBusyError, STTUnavailableError) as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
 
     except Exception as e:
         # Return JSON error (no HTML), include traceback in logs only
@@ -48,3 +55,78 @@ async def transcribe_audio(file: UploadFile = File(...)):
         print("STT ERROR:", str(e))
         print(tb)
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.get("/metrics")
+async def stt_metrics(request: Request):
+    """Pool occupancy, real-time factor of recent transcriptions and speculative-retrieval hit rate."""
+    pool = getattr(request.app.state, "stt_pool", None)
+    if pool is None:
+        return JSONResponse(status_code=503, content={"error": "Speech recognition is not available."})
+    speculation = getattr(request.app.state, "speculation_metrics", None)
+    return {**pool.stats(), "speculation": speculation.snapshot() if speculation else None}
+
+
+def _is_end_message(text: str) -> bool:
+    text = (text or "").strip()
+    if text.lower() == "end":
+        return True
+    try:
+        return json.loads(text).get("event") == "end"
+    except (ValueError, AttributeError):
+        return False
+
+
+@router.websocket("/stream")
+async def stream_audio(websocket: WebSocket, sample_rate: int = 16000):
+    """
+    Streaming STT over a WebSocket.
+    Client sends binary frames of 16-bit mono PCM (at ?sample_rate=, default 16000) while recording,
+    then a text frame "end" (or {"event": "end"}).
+    Server sends {"type": "partial", "text"} whenever the running guess changes,
+    {"type": "result", "text"} for each finished segment, and {"type": "final", "text", "context_ready"}
+    before closing.
+    While the user speaks, RAG retrieval starts on stable partial transcripts; context_ready says whether
+    those results could be reused for the final text, so the /chat call that follows skips the search.
+    """
+    pool = getattr(websocket.app.state, "stt_pool", None)
+    await websocket.accept()
+    if pool is None:
+        await websocket.send_json({"type": "error", "error": "Speech recognition is not available."})
+        await websocket.close()
+        return
+
+    transcriber = pool.stream(sample_rate)
+
+    rag = getattr(websocket.app.state, "rag_engine", None)
+    speculation = getattr(websocket.app.state, "speculation_metrics", None)
+    speculator = SpeculativeRetriever(rag, speculation) if settings.STT_SPECULATE and rag and speculation else None
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                if speculator:
+                    speculator.cancel()
+                return
+
+            if message.get("bytes"):
+                event = await pool.run(transcriber.feed, message["bytes"], limit=False)
+                if speculator:
+                    speculator.observe(event, transcriber.text)
+                # partials are only worth sending when the guess moved
+                if event.pop("changed", True):
+                    await websocket.send_json(event)
+
+            elif _is_end_message(message.get("text")):
+                break
+
+        final = await pool.run(transcriber.finish, limit=False)
+        context_ready = await speculator.resolve(final) if speculator else False
+        await websocket.send_json({"type": "final", "text": final, "context_ready": context_ready})
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        logger.info("STT stream client disconnected")
+        if speculator:
+            speculator.cancel()
@@ -1,71 +1,39 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+# ivf_backend/api/tts_routes.py
+import base64
+import logging
+from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
-import os
-import requests
-from pydub import AudioSegment
-import io
+from pydantic import BaseModel, Field
 
-router = APIRouter(prefix="/audio", tags=["audio"])
+from ..config import settings
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_URL = "https://api.groq.com/openai/v1/audio/transcriptions"
+router = APIRouter(prefix="/tts", tags=["tts"])
+logger = logging.getLogger(__name__)
 
 
-@router.post("/transcribe")
-async def transcribe_audio(file: UploadFile = File(...)):
-    """Accept Streamlit audio, convert to WAV, then send to Groq."""
+class SpeakRequest(BaseModel):
+    text: str = Field(..., min_length=1)
 
-    try:
-        if not GROQ_API_KEY:
-            raise HTTPException(status_code=500, detail="GROQ_API_KEY missing")
-
-        # Read raw bytes
-        raw_bytes = await file.read()
-
-        # Detect/force MIME
-        mime = file.content_type or "audio/webm"
-        if mime == "application/octet-stream":
-            mime = "audio/webm"
 
-        # -----------------------------
-        # 🔥 Convert ANY audio → WAV
-        # -----------------------------
-        audio_segment = AudioSegment.from_file(io.BytesIO(raw_bytes))
-        wav_buffer = io.BytesIO()
-        audio_segment.export(wav_buffer, format="wav")
-        wav_buffer.seek(0)
+@router.post("/speak")
+async def speak(payload: SpeakRequest, request: Request):
+    """
+    Offline text-to-speech.
+    Response: {"audio": <base64 WAV>, "format": "wav", "sentences": n, "cached": k}
+    Repeated sentences (disclaimers, canned replies) come from the phrase cache.
+    """
+    tts = getattr(request.app.state, "tts", None)
+    if tts is None or not tts.available:
+        return JSONResponse(status_code=503, content={"error": "Text-to-speech is not available."})
 
-        # Prepare Groq request
-        files = {
-            "file": ("audio.wav", wav_buffer.read(), "audio/wav")
-        }
-
-        data = {
-            "model": "whisper-large-v3-turbo",
-            "response_format": "json"
+    try:
+        result = await tts.speak(payload.text[:settings.TTS_MAX_CHARS])
+        return {
+            "audio": base64.b64encode(result["audio"]).decode("ascii"),
+            "format": "wav",
+            "sentences": result["sentences"],
+            "cached": result["cached"],
         }
-
-        # Send to Groq
-        resp = requests.post(
-            GROQ_URL,
-            headers={"Authorization": f"Bearer {GROQ_API_KEY}"},
-            files=files,
-            data=data,
-            timeout=40,
-        )
-
-        if resp.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"GROQ Whisper error: {resp.text}"
-            )
-
-        text = resp.json().get("text", "").strip()
-
-        return JSONResponse(status_code=200, content={"text": text})
-
     except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"STT conversion error: {str(e)}"
-        )
+        logger.exception(f"TTS error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
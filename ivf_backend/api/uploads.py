@@ -0,0 +1,61 @@
+# ivf_backend/api/uploads.py
+import hashlib
+import os
+import tempfile
+from typing import Optional, Tuple
+
+from fastapi import UploadFile
+
+from ..config import settings
+
+
+def upload_limit(file_ext: str) -> int:
+    """Largest accepted upload for this file type (CSVs are streamed, so they may be much larger)."""
+    return settings.MAX_CSV_FILE_SIZE if file_ext == ".csv" else settings.MAX_FILE_SIZE
+
+
+def too_large(limit: int) -> str:
+    return f"File exceeds {limit // (1024 * 1024)}MB limit"
+
+
+async def read_upload(file: UploadFile, limit: int) -> Optional[bytes]:
+    """The upload's bytes for consumers that need them in memory, or None when it exceeds `limit`
+    (never reads more than one byte past it)."""
+    data = await file.read(limit + 1)
+    return data if len(data) <= limit else None
+
+
+async def save_upload(file: UploadFile, suffix: str, limit: int) -> Optional[Tuple[str, str]]:
+    """
+    Copy the upload to a temp file UPLOAD_CHUNK_BYTES at a time.
+    Returns (path, sha256 hex digest), or None once it exceeds `limit` bytes (nothing is left on disk).
+    The caller removes the file.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    try:
+        with tmp:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > limit:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+    except BaseException:
+        discard(tmp.name)
+        raise
+
+    if size > limit:
+        discard(tmp.name)
+        return None
+    return tmp.name, digest.hexdigest()
+
+
+def discard(path: Optional[str]):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,183 @@
+# ivf_backend/api/voice_routes.py
+import asyncio
+import base64
+import json
+import logging
+from typing import Optional, AsyncIterator, Dict, Any
+from fastapi import APIRouter, Depends, Request, UploadFile, File, Form
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.concurrency import iterate_in_threadpool
+
+from ..models.chat_models import ChatRequest
+from ..services.audio_service import AudioService
+from ..services.doctor_chatbot import DoctorChatbot
+from ..services.speech_to_text import STTBusyError
+from ..services.stt_service import STTUnavailableError
+from .chat_routes import _serialize_chat_response
+from .dependencies import get_chatbot, get_tts
+
+router = APIRouter(prefix="/voice", tags=["voice"])
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+def _ndjson(event: dict) -> bytes:
+    return (json.dumps(event) + "\n").encode("utf-8")
+
+
+def _b64(audio: Optional[bytes]) -> Optional[str]:
+    return base64.b64encode(audio).decode("ascii") if audio else None
+
+
+async def _reply_events(chatbot: DoctorChatbot, req: ChatRequest, tts) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Chat reply pipelined per sentence:
+      {"type": "sentence", "index", "text", "audio": WAV bytes | None} ..., then {"type": "done", "response"}
+      (or {"type": "error"}).
+    Sentence i is synthesized while the LLM is still writing sentence i+1.
+    """
+    # sentence events in LLM order; audio tasks start as soon as each sentence is known
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for event in iterate_in_threadpool(chatbot.stream_sentences(req)):
+                if event["type"] == "sentence":
+                    text = tts.clean(event["text"]) if tts else event["text"]
+                    audio = None
+                    if tts and tts.speakable(text):
+                        audio = asyncio.ensure_future(tts.synthesize_sentence_async(text))
+                    await queue.put(("sentence", event["text"], audio))
+                else:
+                    await queue.put(("done", event["response"], None))
+        except Exception as e:
+            logger.exception(f"Voice reply pipeline error: {e}")
+            await queue.put(("error", str(e), None))
+        finally:
+            await queue.put((_END, None, None))
+
+    producer = asyncio.ensure_future(produce())
+    index = 0
+    try:
+        while True:
+            kind, payload, audio = await queue.get()
+            if kind is _END:
+                break
+
+            if kind == "sentence":
+                clip = None
+                if audio is not None:
+                    try:
+                        clip = await audio
+                    except Exception as e:
+                        logger.warning(f"TTS failed for sentence {index}: {e}")
+                yield {"type": "sentence", "index": index, "text": payload, "audio": clip}
+                index += 1
+            elif kind == "done":
+                yield {"type": "done", "response": payload}
+            else:
+                yield {"type": "error"}
+    finally:
+        # client went away: stop the pipeline and any pending synthesis
+        producer.cancel()
+        while not queue.empty():
+            _, _, audio = queue.get_nowait()
+            if audio is not None:
+                audio.cancel()
+
+
+async def _ndjson_events(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for event in events:
+        if event["type"] == "sentence":
+            yield _ndjson({**event, "audio": _b64(event["audio"])})
+        elif event["type"] == "done":
+            yield _ndjson({"type": "done", **_serialize_chat_response(event["response"])})
+        else:
+            yield _ndjson({"type": "error", "error": "Internal server error"})
+
+
+@router.post("/chat")
+async def voice_chat(
+    req: ChatRequest,
+    chatbot: DoctorChatbot = Depends(get_chatbot),
+    tts=Depends(get_tts)
+):
+    """
+    Spoken chat reply, pipelined per sentence.
+    Streams NDJSON:
+      {"type": "sentence", "index": i, "text": "...", "audio": <base64 WAV or null>}
+      ...
+      {"type": "done", ...ChatResponse fields}
+    The first audio arrives long before the full answer is generated.
+    """
+    events = _reply_events(chatbot, req, tts)
+    return StreamingResponse(_ndjson_events(events), media_type="application/x-ndjson")
+
+
+@router.post("/ask")
+async def voice_ask(
+    request: Request,
+    file: UploadFile = File(...),
+    session_id: str = Form(...),
+    language: str = Form("en"),
+    policy: Optional[str] = Form(None),
+    stream: bool = Form(False),
+    chatbot: DoctorChatbot = Depends(get_chatbot),
+    tts=Depends(get_tts)
+):
+    """
+    One round trip for a voice turn: speech-to-text → chat pipeline → text-to-speech.
+    stream=false: {"transcript", "engine", ...ChatResponse fields, "audio": <base64 WAV or null>, "format": "wav"}
+    stream=true:  NDJSON — {"type": "transcript", "text", "engine"}, then the /voice/chat events.
+    """
+    stt = getattr(request.app.state, "stt_service", None)
+    if stt is None:
+        return JSONResponse(status_code=503, content={"error": "Speech recognition is not available."})
+
+    try:
+        audio_bytes = await file.read()
+        pcm = await asyncio.to_thread(AudioService.decode_to_pcm, audio_bytes)
+        heard = await stt.transcribe(pcm, policy=policy)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except (STTBusyError, STTUnavailableError) as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    except Exception as e:
+        logger.exception(f"/voice/ask STT error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    transcript = heard["text"].strip()
+    if not transcript:
+        return JSONResponse(
+            status_code=422,
+            content={"error": "No speech recognized.", "transcript": "", "engine": heard["engine"]}
+        )
+
+    req = ChatRequest(message=transcript, session_id=session_id, language=language)
+    events = _reply_events(chatbot, req, tts)
+
+    if stream:
+        async def body():
+            yield _ndjson({"type": "transcript", "text": transcript, "engine": heard["engine"]})
+            async for chunk in _ndjson_events(events):
+                yield chunk
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    clips, response = [], None
+    async for event in events:
+        if event["type"] == "sentence" and event["audio"]:
+            clips.append(event["audio"])
+        elif event["type"] == "done":
+            response = event["response"]
+        elif event["type"] == "error":
+            return JSONResponse(status_code=500, content={"error": "Internal server error", "transcript": transcript})
+
+    return {
+        "transcript": transcript,
+        "engine": heard["engine"],
+        **_serialize_chat_response(response),
+        "audio": _b64(tts.concat_wav(clips)) if clips else None,
+        "format": "wav",
+    }
@@ -0,0 +1,117 @@
+"""
+Conversation-memory (SQLite) benchmark.
+
+Concurrent workers insert messages and read session history, once through MemoryManager
+(per-thread WAL connections, cached statements, write-behind batches) and once through a
+connect-per-call baseline that mirrors the old implementation.
+
+    python -m ivf_backend.benchmarks.memory --workers 8 --sessions 50 --messages 200 --reads 200
+"""
+
+import argparse
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List
+
+from ..services.memory_manager import MemoryManager
+
+
+class ConnectPerCall:
+    """Old behavior: fresh connection, rollback journal, one commit per message."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS conversations (session_id TEXT PRIMARY KEY, user_id TEXT, created_at TEXT DEFAULT (datetime('now')), updated_at TEXT DEFAULT (datetime('now')), message_count INTEGER DEFAULT 0, metadata TEXT DEFAULT '{}')''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, timestamp TEXT DEFAULT (datetime('now')))''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS idx_messages_session_time ON messages(session_id, timestamp)''')
+
+    def create_session(self, session_id: str, user_id=None):
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            conn.execute('''INSERT OR IGNORE INTO conversations (session_id, user_id) VALUES (?, ?)''', (session_id, user_id))
+
+    def add_message(self, session_id: str, role: str, content: str):
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            conn.execute('''INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)''', (session_id, role, content))
+            conn.execute('''UPDATE conversations SET updated_at = datetime('now'), message_count = message_count + 1 WHERE session_id = ?''', (session_id,))
+
+    def get_conversation_history(self, session_id: str, limit: int = 10):
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            return conn.execute('''SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY timestamp DESC LIMIT ?''', (session_id, limit)).fetchall()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _parallel(workers: int, fn: Callable[[int], None]) -> float:
+    threads = [threading.Thread(target=fn, args=(w,)) for w in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def run_store(name: str, store, args) -> Dict[str, Any]:
+    sessions = [f"bench-{i}" for i in range(args.sessions)]
+    for sid in sessions:
+        store.create_session(sid)
+
+    def insert(worker: int):
+        for i in range(args.messages):
+            sid = sessions[(worker * args.messages + i) % len(sessions)]
+            store.add_message(sid, "user" if i % 2 == 0 else "assistant", f"message {worker}-{i} about embryo transfer")
+
+    def read(worker: int):
+        for i in range(args.reads):
+            store.get_conversation_history(sessions[(worker + i) % len(sessions)], limit=6)
+
+    insert_s = _parallel(args.workers, insert)
+    flush_start = time.perf_counter()
+    store.flush()  # write-behind: count the time until everything is durable in the table
+    insert_s += time.perf_counter() - flush_start
+
+    read_s = _parallel(args.workers, read)
+    store.close()
+
+    inserts = args.workers * args.messages
+    reads = args.workers * args.reads
+    return {
+        "store": name,
+        "inserts_per_s": round(inserts / insert_s, 1),
+        "history_reads_per_s": round(reads / read_s, 1),
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark conversation-memory SQLite throughput.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200, help="inserts per worker")
+    parser.add_argument("--reads", type=int, default=200, help="history reads per worker")
+    args = parser.parse_args(argv)
+
+    print(f"{args.workers} workers, {args.sessions} sessions, "
+          f"{args.messages} inserts + {args.reads} history reads per worker")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = [
+            run_store("connect-per-call", ConnectPerCall(str(Path(tmp) / "baseline.db")), args),
+            run_store("MemoryManager", MemoryManager(db_path=str(Path(tmp) / "memory.db")), args),
+        ]
+
+    width = max(len(r["store"]) for r in rows)
+    print(f"{'store'.ljust(width)}  inserts/s  history reads/s")
+    for r in rows:
+        print(f"{r['store'].ljust(width)}  {str(r['inserts_per_s']).rjust(9)}  {str(r['history_reads_per_s']).rjust(15)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Speech-to-text benchmark.
+
+Runs a set of IVF-vocabulary utterances through each STT backend and reports
+word error rate, real-time factor, peak memory and throughput at a given concurrency.
+
+    python -m ivf_backend.benchmarks.stt                       # synthesize the built-in set with espeak-ng
+    python -m ivf_backend.benchmarks.stt --corpus path/to/dir  # <name>.wav + <name>.txt pairs
+    python -m ivf_backend.benchmarks.stt --chunk-frames 2000,4000,8000 --pool-sizes 1,2,4 --concurrency 4
+
+Each Vosk (chunk size, pool size) combination is one row, so STT_CHUNK_FRAMES and
+STT_POOL_SIZE can be picked from data. Whisper runs when GROQ_API_KEY is set.
+Every row runs in its own fresh process, so peak_rss_mb is that configuration's peak
+(model load included) rather than the high-water mark of the rows before it.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import re
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+from ..config import settings
+from ..services.audio_service import AudioService, TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH
+from ..services.speech_to_text import SpeechToText, RecognizerPool
+from ..services.stt_service import STTBackend, VoskBackend, WhisperBackend, STTService
+from ..services.text_to_speech import TextToSpeech
+
+
+IVF_UTTERANCES = [
+    "what is the success rate of ivf for a woman over forty",
+    "my amh level is one point two is that low",
+    "how many days after egg retrieval is the embryo transfer",
+    "can i exercise during ovarian stimulation",
+    "what does a high fsh level mean for my fertility",
+    "is progesterone support needed after a frozen embryo transfer",
+    "what is the difference between icsi and conventional ivf",
+    "how long should i wait before taking a pregnancy test",
+    "what are the side effects of the trigger shot",
+    "my estradiol was three thousand on day ten is that normal",
+    "what is ovarian hyperstimulation syndrome",
+    "should we do genetic testing on our blastocysts",
+]
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+# ---------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------
+def normalize(text: str) -> List[str]:
+    return _WORD.findall((text or "").lower())
+
+
+def word_errors(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """(substitutions + deletions + insertions, reference word count) via word-level edit distance."""
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1], len(ref)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ---------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------
+def load_corpus(directory: Path) -> List[Dict[str, Any]]:
+    items = []
+    for wav in sorted(directory.glob("*.wav")):
+        ref = wav.with_suffix(".txt")
+        if not ref.exists():
+            continue
+        items.append({
+            "name": wav.stem,
+            "text": ref.read_text(encoding="utf-8").strip(),
+            "pcm": AudioService.decode_to_pcm(wav.read_bytes()),
+        })
+    return items
+
+
+def synthesize_corpus() -> List[Dict[str, Any]]:
+    tts = TextToSpeech()
+    if not tts.available:
+        raise SystemExit("espeak-ng not found — pass --corpus with recorded WAV/TXT pairs instead.")
+    try:
+        return [
+            {"name": f"ivf_{i:02d}", "text": text, "pcm": AudioService.decode_to_pcm(tts.synthesize_sentence(text))}
+            for i, text in enumerate(IVF_UTTERANCES)
+        ]
+    finally:
+        tts.shutdown()
+
+
+# ---------------------------------------------------------
+# Runs
+# ---------------------------------------------------------
+async def run_backend(backend: STTBackend, corpus: List[Dict[str, Any]], concurrency: int,
+                      repeat: int, vad: bool) -> Dict[str, Any]:
+    service = STTService(local=backend, policy="local_only") if vad else None
+    limit = asyncio.Semaphore(concurrency)
+    results: List[Dict[str, Any]] = []
+
+    async def one(item: Dict[str, Any]):
+        async with limit:
+            start = time.perf_counter()
+            if service:
+                text = (await service.transcribe(item["pcm"], TARGET_SAMPLE_RATE))["text"]
+            else:
+                text = await backend.transcribe(item["pcm"], TARGET_SAMPLE_RATE)
+            elapsed = time.perf_counter() - start
+        errors, words = word_errors(item["text"], text)
+        audio_seconds = len(item["pcm"]) / (TARGET_SAMPLE_WIDTH * TARGET_SAMPLE_RATE)
+        results.append({"errors": errors, "words": words, "audio": audio_seconds, "elapsed": elapsed})
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(one(item) for _ in range(repeat) for item in corpus))
+    wall = time.perf_counter() - wall
+
+    rtf = sorted(r["elapsed"] / r["audio"] for r in results if r["audio"] > 0)
+    audio_total = sum(r["audio"] for r in results)
+    return {
+        "wer": round(sum(r["errors"] for r in results) / max(1, sum(r["words"] for r in results)), 4),
+        "rtf_avg": round(sum(rtf) / len(rtf), 4) if rtf else None,
+        "rtf_p95": round(rtf[int(0.95 * (len(rtf) - 1))], 4) if rtf else None,
+        "utterances_per_s": round(len(results) / wall, 2),
+        "audio_s_per_s": round(audio_total / wall, 2),
+    }
+
+
+async def _bench(backend_name: str, chunk_frames: int, pool_size: int, corpus: List[Dict[str, Any]],
+                 concurrency: int, repeat: int, vad: bool) -> Dict[str, Any]:
+    if backend_name == "vosk":
+        stt = SpeechToText()
+        stt.chunk_frames = chunk_frames
+        pool = RecognizerPool(stt=stt, size=pool_size, max_queue=10_000)
+        try:
+            return await run_backend(VoskBackend(pool), corpus, concurrency, repeat, vad)
+        finally:
+            pool.shutdown()
+
+    backend = WhisperBackend()
+    try:
+        return await run_backend(backend, corpus, concurrency, repeat, vad)
+    finally:
+        await backend.aclose()
+
+
+def _bench_process(*bench_args) -> Dict[str, Any]:
+    # entry point of the per-row child process
+    row = asyncio.run(_bench(*bench_args))
+    row["peak_rss_mb"] = peak_rss_mb()
+    return row
+
+
+def bench_in_fresh_process(*bench_args) -> Dict[str, Any]:
+    """_bench in a new interpreter: ru_maxrss only ever grows, so a shared process would report
+    the largest configuration so far instead of this one."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_bench_process, *bench_args).result()
+
+
+def run(args) -> List[Dict[str, Any]]:
+    corpus = load_corpus(Path(args.corpus)) if args.corpus else synthesize_corpus()
+    if not corpus:
+        raise SystemExit("No utterances to benchmark.")
+    print(f"{len(corpus)} utterances, {sum(len(c['pcm']) for c in corpus) / 32000:.1f}s of audio, "
+          f"concurrency {args.concurrency}, repeat {args.repeat}, vad {'on' if args.vad else 'off'}")
+
+    rows = []
+    backends = args.backends.split(",")
+
+    if "vosk" in backends:
+        for chunk_frames in args.chunk_frames:
+            for pool_size in args.pool_sizes:
+                row = bench_in_fresh_process("vosk", chunk_frames, pool_size, corpus,
+                                             args.concurrency, args.repeat, args.vad)
+                rows.append({"backend": "vosk", "chunk_frames": chunk_frames, "pool_size": pool_size, **row})
+
+    if "whisper" in backends:
+        if not settings.GROQ_API_KEY:
+            print("GROQ_API_KEY not set — skipping whisper")
+        else:
+            row = bench_in_fresh_process("whisper", None, None, corpus, args.concurrency, args.repeat, args.vad)
+            rows.append({"backend": "whisper", "chunk_frames": None, "pool_size": None, **row})
+
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    columns = ["backend", "chunk_frames", "pool_size", "wer", "rtf_avg", "rtf_p95",
+               "utterances_per_s", "audio_s_per_s", "peak_rss_mb"]
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark speech-to-text backends on IVF vocabulary.")
+    parser.add_argument("--corpus", help="directory of <name>.wav + <name>.txt pairs (default: synthesize)")
+    parser.add_argument("--backends", default="vosk,whisper", help="comma-separated: vosk,whisper")
+    parser.add_argument("--chunk-frames", type=_int_list, default=[settings.STT_CHUNK_FRAMES])
+    parser.add_argument("--pool-sizes", type=_int_list, default=[settings.STT_POOL_SIZE])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the corpus")
+    parser.add_argument("--vad", action="store_true", help="go through STTService with silence trimming")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    rows = run(args)
+    if not rows:
+        raise SystemExit("No backend was available.")
+
+    print_table(rows)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,93 @@ class Settings(BaseSettings):
     SIMILARITY_TOP_K: int = 5
     SIMILARITY_THRESHOLD: float = 0.40
 
+    # ---------------------------------------------------------
+    # Per-session uploaded-document index
+    # ---------------------------------------------------------
+    DOC_CHUNK_CHARS: int = 800
+    DOC_CHUNK_OVERLAP: int = 100
+    SESSION_DOC_TOP_K: int = 3
+    SESSION_INDEX_MAX_SESSIONS: int = 200
+    SESSION_INDEX_MAX_CHUNKS: int = 200
+    SESSION_INDEX_TTL_SECONDS: int = 60 * 60
+    SESSION_INDEX_MAX_BYTES: int = 64 * 1024 * 1024  # 64MB
+
+    # ---------------------------------------------------------
+    # Chat pipeline
+    # ---------------------------------------------------------
+    CHAT_CPU_WORKERS: int = 4   # embedding / FAISS / retrieval threads shared by all chat requests
+
+    # ---------------------------------------------------------
+    # Conversation memory (SQLite)
+    # ---------------------------------------------------------
+    MEMORY_FLUSH_BATCH: int = 64        # queued messages that trigger an immediate flush
+    MEMORY_FLUSH_INTERVAL: float = 0.5  # seconds between background flushes
+    MEMORY_WINDOW_SIZE: int = 12        # recent messages cached per session (>= SUMMARY_KEEP_MESSAGES + 2 * SUMMARY_EVERY_TURNS)
+    MEMORY_CACHE_MAX_SESSIONS: int = 2000
+    MEMORY_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # 32MB
+    SQLITE_BUSY_TIMEOUT: float = 5.0    # seconds a writer waits for the lock
+    SQLITE_CACHE_KB: int = 8192         # page cache per connection
+    SQLITE_CACHED_STATEMENTS: int = 64  # prepared statements kept per connection
+    SQLITE_MMAP_MB: int = 256           # hot database memory-mapped up to this size
+    HISTORY_TOKEN_BUDGET: int = 1200    # prompt tokens for the session summary + recent turns
+    SUMMARY_EVERY_TURNS: int = 4        # fold older messages into the summary every N turns
+    SUMMARY_KEEP_MESSAGES: int = 4      # most recent messages always kept verbatim
+    SUMMARY_MAX_TOKENS: int = 250
+
+    # session store backend: sqlite (local file) | redis (shared across nodes) | memory (in-process stand-in)
+    SESSION_STORE: str = "sqlite"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_TIMEOUT: float = 2.0
+    SESSION_KEY_PREFIX: str = "ivf:session"
+    SESSION_TTL_SECONDS: int = 7 * 24 * 3600  # key-value sessions expire this long after the last write
+    SESSION_MAX_MESSAGES: int = 50            # messages kept per session in the key-value list
+
+    # retention (SQLite store): idle sessions move to compressed archives so the hot database stays small
+    RETENTION_IDLE_DAYS: int = 90
+    RETENTION_BATCH_SESSIONS: int = 200  # sessions archived + deleted per transaction
+    RETENTION_INTERVAL_HOURS: float = 24.0  # 0 disables the background job
+    RETENTION_ARCHIVE_DIR: str = str(Path(__file__).parent / "data" / "archive")
+
+    # ---------------------------------------------------------
+    # Speech-to-text
+    # ---------------------------------------------------------
+    STT_POOL_SIZE: int = 2    # concurrent Vosk decodes per worker
+    STT_CHUNK_FRAMES: int = 4000  # frames per AcceptWaveform call (tune with python -m ivf_backend.benchmarks.stt)
+    STT_MAX_QUEUE: int = 8    # waiting requests beyond this get a 503
+    STT_POLICY: str = "local_only"       # local_only | fallback | latency_first
+    STT_REMOTE_BACKEND: str = "groq"     # groq | stub | none
+    STT_REMOTE_TIMEOUT: float = 8.0      # seconds before the remote engine counts as timed out
+    STT_WHISPER_MODEL: str = "whisper-large-v3-turbo"
+    STT_SEGMENT_CONCURRENCY: int = 2     # segments of one recording decoded at once
+
+    # speculative retrieval on streaming partial transcripts
+    STT_SPECULATE: bool = True
+    STT_SPECULATE_MIN_WORDS: int = 3
+    STT_SPECULATE_STABLE_CHUNKS: int = 2       # partial unchanged for this many audio chunks = stable
+    STT_SPECULATE_MIN_SIMILARITY: float = 0.85 # final vs speculated query (word-level) to reuse results
+    STT_SPECULATE_WORKERS: int = 2             # dedicated search threads shared by all voice streams
+    RAG_PREFETCH_TTL_SECONDS: int = 120
+
+    # voice activity detection (energy based) before transcription
+    VAD_ENABLED: bool = True
+    VAD_FRAME_MS: int = 30
+    VAD_MIN_RMS: int = 200               # int16 RMS floor (~-44 dBFS) below which a frame is silence
+    VAD_NOISE_RATIO: float = 3.0         # speech must be this much louder than the noise floor
+    VAD_MIN_SPEECH_MS: int = 120         # shorter bursts (clicks, breaths) are dropped
+    VAD_MIN_PAUSE_MS: int = 500          # a gap at least this long is a split point
+    VAD_PADDING_MS: int = 200            # silence kept around each speech region
+    VAD_MAX_SEGMENT_SECONDS: float = 12.0
+
+    # ---------------------------------------------------------
+    # Text-to-speech (offline, espeak-ng)
+    # ---------------------------------------------------------
+    TTS_VOICE: str = "en-us"
+    TTS_RATE: int = 165       # words per minute
+    TTS_MAX_WORKERS: int = 2
+    TTS_MAX_CHARS: int = 4000
+    TTS_CACHE_DIR: str = str(Path(__file__).parent / "data" / "tts_cache")
+    TTS_CACHE_MAX_BYTES: int = 200 * 1024 * 1024  # least recently used clips (by mtime) are evicted past this
+
     # ---------------------------------------------------------
     # App Settings
     # ---------------------------------------------------------
@@ -56,7 +143,21 @@ class Settings(BaseSettings):
     # File Uploads
     # ---------------------------------------------------------
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_CSV_FILE_SIZE: int = 500 * 1024 * 1024  # CSVs are scanned in CSV_CHUNK_ROWS chunks, never loaded whole
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024  # uploads are copied to disk this much at a time
+    MAX_BATCH_FILES: int = 10
     ALLOWED_EXTENSIONS: List[str] = [".pdf", ".txt", ".doc", ".docx", ".csv"]
+    CSV_CHUNK_ROWS: int = 50_000  # rows held in memory at once while scanning a CSV
+    LAB_TABLE_MIN_COVERAGE: float = 0.6  # below this, send raw text instead of the lab table
+
+    # ---------------------------------------------------------
+    # OCR (image lab reports / scanned PDFs)
+    # ---------------------------------------------------------
+    OCR_MAX_WORKERS: int = 2
+    OCR_MAX_SIDE: int = 2500  # px; larger photos are downsampled before OCR
+    OCR_PDF_DPI: int = 200
+    OCR_LANG: str = "eng"
+    OCR_CACHE_SIZE: int = 256
 
     # ---------------------------------------------------------
     # Data directory
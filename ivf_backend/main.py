@@ -4,17 +4,30 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 from fastapi import status
-import logging, uvicorn, traceback
+import logging, uvicorn, traceback, asyncio
 from pathlib import Path
 from .config import settings
 from .api.chat_routes import router as chat_router
 from .api.feedback_routes import router as feedback_router
 from .api.document_routes import router as document_router
 from .api.analytics_routes import router as analytics_router
-from .api.audio_routes import router as audio_router
+from .api.file_routes import router as file_router
 from .services.rag_engine import RAGEngine
-from .api.tts_routes import router as tts_router
+from .services.session_index import SessionDocumentIndex
+from .services.ocr_service import OCRService
+from .services.speech_to_text import RecognizerPool
+from .services.stt_service import STTService
+from .services.speculative_rag import SpeculationMetrics
+from .services.text_to_speech import TextToSpeech
+from .services.doctor_chatbot import DoctorChatbot, MEDICAL_DISCLAIMER
+from .services.safety_handler import SafetyHandler
+from .services.llm_engine import LLMEngine
+from .services.memory_manager import MemoryManager
+from .services.retention import RetentionJob
 from .api.stt_routes import router as stt_router
+from .api.tts_routes import router as tts_router
+from .api.voice_routes import router as voice_router
+from .api.session_routes import router as session_router
 from dotenv import load_dotenv
 import os
 print(" Loaded GROQ key:", os.getenv("GROQ_API_KEY"))
@@ -37,10 +50,12 @@ app.add_middleware(CORSMiddleware,
 app.include_router(chat_router)
 app.include_router(feedback_router)
 app.include_router(document_router)
+app.include_router(file_router)
 app.include_router(stt_router)
-app.include_router(analytics_router)
 app.include_router(tts_router)
-app.include_router(audio_router)
+app.include_router(voice_router)
+app.include_router(session_router)
+app.include_router(analytics_router)
 
 
 # mount assets (try both names)
@@ -88,9 +103,83 @@ async def on_startup():
         logger.error(f"RAG initialization failed: {e}\n{traceback.format_exc()}")
         app.state.rag_engine = None
 
+    # per-session index over uploaded documents (needs the embedding model)
+    rag = app.state.rag_engine
+    if rag and rag.embedding_model:
+        app.state.session_index = SessionDocumentIndex(embed_fn=rag.embed_texts, query_embed_fn=rag.get_embedding)
+    else:
+        logger.warning("Embedding model unavailable — uploaded documents will not be searchable in chat.")
+        app.state.session_index = None
+
+    # the chat pipeline (LLM client + response cache, memory DB, safety rules) is built once and shared;
+    # it reuses the startup RAG engine, so a failed RAG init leaves chat unavailable (503) rather than
+    # loading the embedding model a second time
+    app.state.chatbot = None
+    if app.state.rag_engine is None:
+        logger.error("Chat pipeline not started: RAG engine failed to initialize.")
+    else:
+        try:
+            app.state.chatbot = DoctorChatbot(rag=app.state.rag_engine, session_index=app.state.session_index)
+        except Exception as e:
+            logger.error(f"Chat pipeline initialization failed: {e}\n{traceback.format_exc()}")
+
+    # idle sessions are archived out of the conversation DB on a schedule
+    app.state.retention = None
+    # (SQLite store only; key-value sessions expire by TTL)
+    memory = app.state.chatbot.memory_manager if app.state.chatbot else None
+    if isinstance(memory, MemoryManager) and settings.RETENTION_INTERVAL_HOURS > 0:
+        app.state.retention = RetentionJob(memory)
+        app.state.retention_task = asyncio.create_task(app.state.retention.run_forever())
+
+    # Vosk model loads once here; all recognizers in the pool share it
+    try:
+        app.state.stt_pool = RecognizerPool()
+    except Exception as e:
+        logger.error(f"STT initialization failed: {e}")
+        app.state.stt_pool = None
+
+    # one STT entrypoint; backends (local Vosk / remote Whisper) chosen by STT_POLICY
+    app.state.stt_service = STTService.from_settings(app.state.stt_pool)
+    # hit rate of RAG retrieval started on partial transcripts (/audio/stream)
+    app.state.speculation_metrics = SpeculationMetrics()
+
+    # offline TTS; warm the phrase cache with replies that repeat on almost every turn
+    app.state.tts = TextToSpeech()
+    app.state.tts_warmup = asyncio.create_task(app.state.tts.warm([
+        MEDICAL_DISCLAIMER,
+        SafetyHandler().get_emergency_response(),
+        LLMEngine.NON_IVF_REPLY,
+    ]))
+
+    app.state.ocr_service = OCRService()
+    if not app.state.ocr_service.available:
+        logger.warning("pytesseract not installed — image OCR disabled.")
+
 @app.on_event("shutdown")
 async def on_shutdown():
     logger.info("Shutting down application.")
+    ocr = getattr(app.state, "ocr_service", None)
+    if ocr:
+        ocr.shutdown()
+    retention_task = getattr(app.state, "retention_task", None)
+    if retention_task:
+        retention_task.cancel()
+    retention = getattr(app.state, "retention", None)
+    if retention:
+        # a run in progress holds SQLite connections the chatbot is about to close
+        await retention.aclose()
+    chatbot = getattr(app.state, "chatbot", None)
+    if chatbot:
+        await chatbot.aclose()
+    tts = getattr(app.state, "tts", None)
+    if tts:
+        tts.shutdown()
+    stt_service = getattr(app.state, "stt_service", None)
+    if stt_service:
+        await stt_service.aclose()
+    stt_pool = getattr(app.state, "stt_pool", None)
+    if stt_pool:
+        stt_pool.shutdown()
 
 if __name__ == "__main__":
     uvicorn.run("ivf_backend.main:app", host=settings.API_HOST, port=settings.API_PORT, reload=settings.DEBUG,
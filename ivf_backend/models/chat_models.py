@@ -14,6 +14,7 @@ class ChatMessage(BaseModel):
     content: str
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     message_id: Optional[str] = None
+    tokens: Optional[int] = None
 
 class ChatRequest(BaseModel):
     message: str
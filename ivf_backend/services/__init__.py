@@ -4,6 +4,7 @@ from .llm_engine import LLMEngine
 from .doctor_chatbot import DoctorChatbot
 from .safety_handler import SafetyHandler
 from .memory_manager import MemoryManager
+from .session_store import SessionStore
 
 __all__ = [
     "RAGEngine",
@@ -11,5 +12,6 @@ __all__ = [
     "DoctorChatbot",
     "SafetyHandler",
     "MemoryManager",
+    "SessionStore",
 ]
 __version__ = "1.0.0"
@@ -1,47 +1,140 @@
 # ivf_backend/services/audio_service.py
 
 import io
-import os
-import tempfile
+import wave
+from typing import List, Tuple
+
+import numpy as np
 from pydub import AudioSegment
 
+from ..config import settings
+
+# Vosk models are trained on 16kHz mono 16-bit PCM
+TARGET_SAMPLE_RATE = 16000
+TARGET_SAMPLE_WIDTH = 2
+
 
 class AudioService:
 
     @staticmethod
-    def save_uploaded_file(upload_file):
+    def decode_to_pcm(data: bytes, sample_rate: int = TARGET_SAMPLE_RATE) -> bytes:
         """
-        Save uploaded audio to a temporary file.
-        Works for WebM, OGG, MP4, M4A, WAV, etc.
+        Decode uploaded audio (WAV, WebM, OGG, MP4, M4A, ...) straight from memory
+        to raw 16-bit mono PCM at `sample_rate`. Nothing touches the disk.
         """
 
-        suffix = os.path.splitext(upload_file.filename)[1] or ".webm"
+        is_wav = data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+        # Fast path: already the PCM layout the recognizer wants
+        if is_wav:
+            try:
+                with wave.open(io.BytesIO(data), "rb") as wf:
+                    if (
+                        wf.getnchannels() == 1
+                        and wf.getsampwidth() == TARGET_SAMPLE_WIDTH
+                        and wf.getframerate() == sample_rate
+                        and wf.getcomptype() == "NONE"
+                    ):
+                        return wf.readframes(wf.getnframes())
+            except (wave.Error, EOFError):
+                pass
+
+        try:
+            # WAV is parsed natively by pydub; other containers are piped through ffmpeg's stdin
+            sound = AudioSegment.from_file(io.BytesIO(data), format="wav" if is_wav else None)
+            sound = (
+                sound.set_frame_rate(sample_rate)
+                .set_channels(1)
+                .set_sample_width(TARGET_SAMPLE_WIDTH)
+            )
+            return sound.raw_data
+
+        except Exception as e:
+            raise Exception(f"Python audio decode/convert failed: {e}")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(upload_file.file.read())
-            return tmp.name
+    @staticmethod
+    def pcm_to_wav(pcm: bytes, sample_rate: int = TARGET_SAMPLE_RATE) -> bytes:
+        """Wrap raw 16-bit mono PCM in a WAV header (in memory)."""
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(TARGET_SAMPLE_WIDTH)
+            wf.setframerate(sample_rate)
+            wf.writeframes(pcm)
+        return buf.getvalue()
 
+    # ---------------------------------------------------------
+    # Voice activity detection
+    # ---------------------------------------------------------
     @staticmethod
-    def convert_to_wav(input_path):
+    def detect_speech(pcm: bytes, sample_rate: int = TARGET_SAMPLE_RATE) -> List[Tuple[int, int]]:
         """
-        Convert the uploaded audio file to 16kHz mono WAV
-        using ONLY Python (no FFmpeg).
+        Energy-based VAD over 16-bit mono PCM.
+        Returns padded (start, end) byte ranges of speech; pauses shorter than VAD_MIN_PAUSE_MS
+        stay inside a range, bursts shorter than VAD_MIN_SPEECH_MS are dropped.
         """
+        frame = sample_rate * settings.VAD_FRAME_MS // 1000
+        n_frames = len(pcm) // (frame * TARGET_SAMPLE_WIDTH)
+        if n_frames == 0:
+            return []
 
-        try:
-            # Load using pydub (can decode webm/ogg/mp4 etc.)
-            sound = AudioSegment.from_file(input_path)
+        samples = np.frombuffer(pcm, dtype=np.int16, count=n_frames * frame).astype(np.float32)
+        rms = np.sqrt(np.mean(samples.reshape(n_frames, frame) ** 2, axis=1))
 
-            # Convert to required format
-            sound = sound.set_frame_rate(16000).set_channels(1)
+        # adapt to the recording: the quietest frames approximate the room noise,
+        # unless there is no silence at all (then the "floor" is speech and must not exceed the loud frames)
+        noise_floor, loud = (float(v) for v in np.percentile(rms, [10, 90]))
+        threshold = max(settings.VAD_MIN_RMS, min(noise_floor * settings.VAD_NOISE_RATIO, loud / 2))
+        voiced = rms > threshold
 
-            # Output file
-            output_path = input_path.rsplit(".", 1)[0] + ".wav"
+        min_pause = max(1, settings.VAD_MIN_PAUSE_MS // settings.VAD_FRAME_MS)
+        min_speech = max(1, settings.VAD_MIN_SPEECH_MS // settings.VAD_FRAME_MS)
 
-            # Export as WAV
-            sound.export(output_path, format="wav")
+        # runs of voiced frames, merged across short pauses
+        runs: List[List[int]] = []
+        for i in np.flatnonzero(voiced).tolist():
+            if runs and i - runs[-1][1] < min_pause:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+        runs = [r for r in runs if r[1] - r[0] >= min_speech]
 
-            return output_path
+        frame_bytes = frame * TARGET_SAMPLE_WIDTH
+        pad = sample_rate * settings.VAD_PADDING_MS // 1000 * TARGET_SAMPLE_WIDTH
+        total = len(pcm) - len(pcm) % TARGET_SAMPLE_WIDTH
 
-        except Exception as e:
-            raise Exception(f"Python audio decode/convert failed: {e}")
+        ranges: List[Tuple[int, int]] = []
+        for start, end in runs:
+            lo = max(0, start * frame_bytes - pad)
+            hi = min(total, end * frame_bytes + pad)
+            if ranges and lo <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], hi)
+            else:
+                ranges.append((lo, hi))
+        return ranges
+
+    @classmethod
+    def speech_segments(cls, pcm: bytes, sample_rate: int = TARGET_SAMPLE_RATE) -> List[bytes]:
+        """
+        Silence-trimmed PCM split at pauses: consecutive speech ranges are packed into segments
+        of at most VAD_MAX_SEGMENT_SECONDS (a single longer utterance stays whole).
+        Long pauses between ranges are cut out. Returns [] when nothing sounds like speech.
+        """
+        max_bytes = int(settings.VAD_MAX_SEGMENT_SECONDS * sample_rate) * TARGET_SAMPLE_WIDTH
+
+        segments: List[bytes] = []
+        current: List[bytes] = []
+        size = 0
+        for lo, hi in cls.detect_speech(pcm, sample_rate):
+            if current and size + (hi - lo) > max_bytes:
+                segments.append(b"".join(current))
+                current, size = [], 0
+            current.append(pcm[lo:hi])
+            size += hi - lo
+        if current:
+            segments.append(b"".join(current))
+        return segments
+
+    @classmethod
+    def trim_silence(cls, pcm: bytes, sample_rate: int = TARGET_SAMPLE_RATE) -> bytes:
+        return b"".join(cls.speech_segments(pcm, sample_rate))
@@ -1,33 +1,65 @@
 # ivf_backend/services/doctor_chatbot.py
+import asyncio
 import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Union, Callable
 
 from .rag_engine import RAGEngine
 from .llm_engine import LLMEngine
-from .memory_manager import MemoryManager
+from .session_store import SessionStore
 from .safety_handler import SafetyHandler
+from .session_index import SessionDocumentIndex
+from .stage_graph import Stage, StageGraph, StageMetrics
+from .text_to_speech import SentenceBuffer
+from ..config import settings
 from ..models.chat_models import ChatRequest, ChatResponse, ChatMessage
 
 logger = logging.getLogger(__name__)
 
+MEDICAL_DISCLAIMER = "⚠️ This information is educational. Consult a healthcare provider for medical advice."
+LLM_ERROR_REPLY = "I'm experiencing a temporary issue generating a response. Please try again shortly."
+
 
 class DoctorChatbot:
     def __init__(
         self,
         rag: Optional[RAGEngine] = None,
         llm: Optional[LLMEngine] = None,
-        memory: Optional[MemoryManager] = None,
-        safety: Optional[SafetyHandler] = None
+        memory: Optional[SessionStore] = None,
+        safety: Optional[SafetyHandler] = None,
+        session_index: Optional[SessionDocumentIndex] = None
     ):
         # allow injection (useful for tests / startup wiring)
         self.rag_engine = rag or RAGEngine()
         self.llm_engine = llm or LLMEngine()
-        self.memory_manager = memory or MemoryManager()
+        self.memory_manager = memory or SessionStore.from_settings()
         self.safety_handler = safety or SafetyHandler()
+        # optional: only available when embeddings are loaded
+        self.session_index = session_index
+        # bounded pool for the CPU-heavy stages (embedding, FAISS) of the async pipeline
+        self._executor = ThreadPoolExecutor(max_workers=settings.CHAT_CPU_WORKERS, thread_name_prefix="chat")
+
+        # async turn: memory reads/writes and both retrievals overlap; the LLM waits for what it needs
+        self.stage_metrics = StageMetrics()
+        self._graph = StageGraph([
+            Stage("ensure_session", self._stage_ensure_session),
+            Stage("history", self._stage_history),
+            # after the history read: the current message is appended to the prompt separately
+            Stage("user_message", self._stage_user_message, after=("ensure_session", "history")),
+            Stage("knowledge", self._stage_knowledge),
+            Stage("session_docs", self._stage_session_docs),
+            Stage("llm", self._stage_llm, after=("history", "knowledge", "session_docs")),
+        ], self.stage_metrics)
         logger.info("DoctorChatbot initialized")
 
+    async def aclose(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        await self.llm_engine.aclose()
+        # write out messages still queued in memory
+        await asyncio.to_thread(self.memory_manager.close)
+
     def process_message(self, chat_request: ChatRequest) -> ChatResponse:
         """
         High-level flow:
@@ -35,126 +67,351 @@ class DoctorChatbot:
         - detect emergency
         - store user message
         - fetch short history
-        - optionally RAG -> context
+        - optionally RAG -> context (global index + the session's uploaded documents)
         - generate LLM response
         - filter LLM output
         - store assistant message
         - return ChatResponse (with UTC timestamp)
         """
         try:
-            # 1) Input filtering
-            filtered = self.safety_handler.filter_content(chat_request.message)
-            if not filtered:
-                return self._create_error(
-                    chat_request.session_id,
-                    "I couldn't process that message. Please ask IVF-related questions."
-                )
-
-            # 2) Emergency detection
-            if self.safety_handler.detect_medical_emergency(filtered):
-                return self._create_emergency(chat_request.session_id)
-
-            # 3) Ensure session exists & store user message
-            self.memory_manager.create_session(chat_request.session_id, chat_request.user_id)
-            self.memory_manager.add_message(chat_request.session_id, "user", filtered)
-
-            # 4) Fetch conversation history (as ChatMessage objects)
-            history_msgs: List[ChatMessage] = self.memory_manager.get_conversation_history(
-                chat_request.session_id, limit=6
-            )
-
-            # Convert history into list of dicts required by LLM
-            conversation_history = []
-            for m in history_msgs:
-                # m.role may be an enum or string
-                role = getattr(m, "role", None)
-                if hasattr(role, "value"):
-                    role_val = role.value
-                else:
-                    role_val = str(role)
-                conversation_history.append({"role": role_val, "content": m.content})
-
-            # 5) RAG retrieval (optional)
-            similar_chunks: List[Dict[str, Any]] = []
-            if getattr(chat_request, "include_context", True):
-                try:
-                    similar_chunks = self.rag_engine.search_similar_chunks(filtered, top_k=5) or []
-                except Exception as e:
-                    # do not fail entire request for RAG errors
-                    logger.exception(f"RAG search error (continuing without context): {e}")
-                    similar_chunks = []
-
-            # 6) Build context for LLM
-            context = self.rag_engine.format_context(similar_chunks) if similar_chunks else ""
+            turn = self._prepare_turn(chat_request)
+            if isinstance(turn, ChatResponse):
+                return turn
 
             # 7) Generate LLM response
             try:
                 llm_resp = self.llm_engine.generate_response(
-                    user_message=filtered,
-                    context=context,
-                    conversation_history=conversation_history,
+                    user_message=turn["message"],
+                    context=turn["context"],
+                    conversation_history=turn["history"],
                     language=getattr(chat_request, "language", "en")
                 )
             except Exception as e:
                 logger.exception(f"LLM generation error: {e}")
-                llm_resp = "I'm experiencing a temporary issue generating a response. Please try again shortly."
+                llm_resp = LLM_ERROR_REPLY
 
-            # 8) Post-process LLM output (safety)
-            try:
-                llm_resp = self.safety_handler.filter_output(llm_resp)
-            except Exception:
-                # Ensure we never crash the pipeline here
-                logger.exception("Safety handler failed while filtering LLM output; returning raw output.")
-
-            # 9) Persist assistant message
-            self.memory_manager.add_message(chat_request.session_id, "assistant", llm_resp)
-
-            # 10) Build sources list for response
-            sources = []
-            for ch in similar_chunks[:3]:
-                sources.append({
-                    "id": ch.get("id") or ch.get("id", ch.get("chunk_id", None)),
-                    "category": ch.get("category", "Unknown"),
-                    "question": ch.get("question", "") or "",
-                    "similarity_score": float(ch.get("similarity_score", 0.0)),
-                    "warning": ch.get("warning") if "warning" in ch else None
-                })
-
-            # 11) Compute confidence (simple heuristic)
-            max_sim = 0.0
-            if sources:
-                try:
-                    max_sim = max(s.get("similarity_score", 0.0) for s in sources)
-                except Exception:
-                    max_sim = 0.0
-            confidence = float(min(1.0, max(0.0, 0.5 + max_sim / 2.0)))
-
-            # 12) Append a medical disclaimer if not present
-            disclaimer_needed = True
-            check_text = llm_resp.lower()
-            for token in ["consult", "doctor", "medical", "seek medical advice", "healthcare provider"]:
-                if token in check_text:
-                    disclaimer_needed = False
+            return self._finalize_turn(chat_request, turn, llm_resp)
+
+        except Exception as e:
+            logger.exception(f"Unhandled error in DoctorChatbot.process_message: {e}")
+            return self._create_error(chat_request.session_id, "Technical error. Try again later.")
+
+    async def aprocess_message(
+        self,
+        chat_request: ChatRequest,
+        defer: Optional[Callable[..., Any]] = None
+    ) -> ChatResponse:
+        """
+        process_message for the event loop, run as a stage graph: session upsert, history read,
+        knowledge-base and session-document retrieval all run concurrently; the LLM starts when its
+        inputs are ready. Retrieval uses the bounded CPU executor, SQLite worker threads, Groq is awaited.
+        The user message is stored during retrieval, before the reply exists. `defer(fn, *args)`
+        (e.g. BackgroundTasks.add_task) stores the assistant message after the response is sent;
+        without it that happens before returning.
+        """
+        try:
+            filtered = self._screen(chat_request)
+            if isinstance(filtered, ChatResponse):
+                return filtered
+
+            state = {"request": chat_request, "message": filtered}
+            timings = await self._graph.run(state)
+            logger.debug(f"Chat stage timings: { {k: round(v * 1000, 1) for k, v in timings.items()} }")
+
+            turn = state["turn"]
+            llm_resp = self._filter_output(state["llm"])
+
+            persist = (self._persist_reply, chat_request.session_id, llm_resp)
+            if defer is not None:
+                defer(*persist)
+            else:
+                await asyncio.to_thread(*persist)
+
+            return self._build_response(chat_request, turn, llm_resp)
+
+        except Exception as e:
+            logger.exception(f"Unhandled error in DoctorChatbot.aprocess_message: {e}")
+            return self._create_error(chat_request.session_id, "Technical error. Try again later.")
+
+    # ---------- async stages ----------
+    async def _stage_ensure_session(self, state: Dict[str, Any]):
+        req = state["request"]
+        await asyncio.to_thread(self.memory_manager.create_session, req.session_id, req.user_id)
+
+    async def _stage_history(self, state: Dict[str, Any]) -> List[Dict[str, str]]:
+        return await asyncio.to_thread(self._history, state["request"].session_id)
+
+    async def _stage_user_message(self, state: Dict[str, Any]):
+        await asyncio.to_thread(self.memory_manager.add_message, state["request"].session_id, "user", state["message"])
+
+    async def _stage_knowledge(self, state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._search_knowledge, state["request"], state["message"])
+
+    async def _stage_session_docs(self, state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._search_session_docs, state["request"], state["message"])
+
+    async def _stage_llm(self, state: Dict[str, Any]) -> str:
+        turn = self._turn(state["message"], state["history"], state["knowledge"], state["session_docs"])
+        state["turn"] = turn
+
+        # 7) Generate LLM response
+        try:
+            return await self.llm_engine.agenerate_response(
+                user_message=turn["message"],
+                context=turn["context"],
+                conversation_history=turn["history"],
+                language=getattr(state["request"], "language", "en")
+            )
+        except Exception as e:
+            logger.exception(f"LLM generation error: {e}")
+            return LLM_ERROR_REPLY
+
+    def stream_sentences(self, chat_request: ChatRequest) -> Iterator[Dict[str, Any]]:
+        """
+        Same pipeline as process_message, but yields the answer sentence by sentence as the LLM
+        produces it ({"type": "sentence", "text"}), then {"type": "done", "response": ChatResponse}.
+        Each sentence passes the output safety filter before it is released; the first one that
+        fails closes the LLM stream, and only the filter's replacement is voiced after what was
+        already said.
+        """
+        try:
+            turn = self._prepare_turn(chat_request)
+        except Exception as e:
+            logger.exception(f"Unhandled error in DoctorChatbot.stream_sentences: {e}")
+            turn = self._create_error(chat_request.session_id, "Technical error. Try again later.")
+
+        if isinstance(turn, ChatResponse):
+            for sentence in SentenceBuffer.split(turn.response):
+                yield {"type": "sentence", "text": sentence}
+            yield {"type": "done", "response": turn}
+            return
+
+        buffer = SentenceBuffer()
+        parts: List[str] = []
+        voiced: List[str] = []
+        replacement = None  # set when the stream is cut off: the text said instead of the rest
+
+        stream = self.llm_engine.stream_response(
+            user_message=turn["message"],
+            context=turn["context"],
+            conversation_history=turn["history"],
+            language=getattr(chat_request, "language", "en")
+        )
+        try:
+            for delta in stream:
+                parts.append(delta)
+                for sentence in buffer.feed(delta):
+                    filtered = self._filter_output(sentence)
+                    if filtered != sentence:
+                        replacement = filtered
+                        break
+                    voiced.append(sentence)
+                    yield {"type": "sentence", "text": sentence}
+                if replacement is not None:
                     break
-            if disclaimer_needed:
-                llm_resp = llm_resp.rstrip() + "\n\n⚠️ This information is educational. Consult a healthcare provider for medical advice."
-
-            # 13) Build ChatResponse with UTC ISO timestamp
-            resp = ChatResponse(
-                response=llm_resp,
-                session_id=chat_request.session_id,
-                message_id=str(uuid.uuid4()),
-                timestamp=datetime.now(timezone.utc),
-                sources=sources,
-                confidence=confidence,
-                warning="MEDICAL WARNING" if any(s.get("warning") for s in sources) else None
+
+            tail = buffer.flush() if replacement is None else None
+            if tail:
+                filtered = self._filter_output(tail)
+                if filtered != tail:
+                    replacement = filtered
+                else:
+                    voiced.append(tail)
+                    yield {"type": "sentence", "text": tail}
+
+        except Exception as e:
+            logger.exception(f"LLM streaming error: {e}")
+            replacement = LLM_ERROR_REPLY
+        finally:
+            # stop generating (and close the Groq connection) once the answer is cut off
+            stream.close()
+
+        if replacement is None:
+            llm_text = "".join(parts)
+            spoken = llm_text.rstrip()
+        else:
+            # what the user heard, then the replacement; the unsent rest of the answer is dropped
+            spoken = " ".join(voiced)
+            llm_text = f"{spoken} {replacement}" if spoken else replacement
+        resp = self._finalize_turn(chat_request, turn, llm_text)
+
+        # voice only what the final response adds after the spoken sentences: the replacement
+        # and/or the disclaimer (or all of it, if the filter replaced the whole answer)
+        if resp.response.startswith(spoken):
+            extra = resp.response[len(spoken):]
+        else:
+            extra = resp.response
+        for sentence in SentenceBuffer.split(extra):
+            yield {"type": "sentence", "text": sentence}
+
+        yield {"type": "done", "response": resp}
+
+    # ---------- pipeline stages ----------
+    def _screen(self, chat_request: ChatRequest) -> Union[ChatResponse, str]:
+        """Steps 1-2: returns the filtered message, or the early reply that ends the turn."""
+        # 1) Input filtering
+        filtered = self.safety_handler.filter_content(chat_request.message)
+        if not filtered:
+            return self._create_error(
+                chat_request.session_id,
+                "I couldn't process that message. Please ask IVF-related questions."
             )
 
-            return resp
+        # 2) Emergency detection
+        if self.safety_handler.detect_medical_emergency(filtered):
+            return self._create_emergency(chat_request.session_id)
+
+        return filtered
+
+    def _record_user_message(self, chat_request: ChatRequest, filtered: str):
+        # 3) Ensure session exists & store user message
+        self.memory_manager.create_session(chat_request.session_id, chat_request.user_id)
+        self.memory_manager.add_message(chat_request.session_id, "user", filtered)
 
+    def _history(self, session_id: str) -> List[Dict[str, Any]]:
+        # 4) Fetch the rolling summary + the recent messages it does not cover (as ChatMessage objects);
+        #    the LLM engine trims them to its token budget
+        summary, summary_tokens, history_msgs = self.memory_manager.get_prompt_history(session_id)
+
+        # Convert history into list of dicts required by LLM
+        conversation_history = []
+        if summary:
+            conversation_history.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}",
+                "tokens": summary_tokens,
+                "summary": True,
+            })
+        for m in history_msgs:
+            # m.role may be an enum or string
+            role = getattr(m, "role", None)
+            if hasattr(role, "value"):
+                role_val = role.value
+            else:
+                role_val = str(role)
+            conversation_history.append({"role": role_val, "content": m.content, "tokens": m.tokens})
+        return conversation_history
+
+    def _search_knowledge(self, chat_request: ChatRequest, filtered: str) -> List[Dict[str, Any]]:
+        # 5) RAG retrieval (optional)
+        if not getattr(chat_request, "include_context", True):
+            return []
+        try:
+            return self.rag_engine.search_similar_chunks(filtered, top_k=5) or []
         except Exception as e:
-            logger.exception(f"Unhandled error in DoctorChatbot.process_message: {e}")
-            return self._create_error(chat_request.session_id, "Technical error. Try again later.")
+            # do not fail entire request for RAG errors
+            logger.exception(f"RAG search error (continuing without context): {e}")
+            return []
+
+    def _search_session_docs(self, chat_request: ChatRequest, filtered: str) -> List[Dict[str, Any]]:
+        # 5b) Session document retrieval (user's own uploads)
+        if not self.session_index or not getattr(chat_request, "include_context", True):
+            return []
+        try:
+            return self.session_index.search(chat_request.session_id, filtered)
+        except Exception as e:
+            logger.exception(f"Session document search error (continuing without it): {e}")
+            return []
+
+    def _turn(self, filtered: str, history: List[Dict[str, str]],
+              similar_chunks: List[Dict[str, Any]], doc_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # 6) Build context for LLM
+        context_parts = []
+        if similar_chunks:
+            context_parts.append(self.rag_engine.format_context(similar_chunks))
+        if doc_chunks:
+            context_parts.append(self.session_index.format_context(doc_chunks))
+
+        return {
+            "message": filtered,
+            "history": history,
+            "chunks": similar_chunks,
+            "context": "\n\n".join(context_parts),
+        }
+
+    def _prepare_turn(self, chat_request: ChatRequest) -> Union[ChatResponse, Dict[str, Any]]:
+        """Steps 1-6: safety checks, memory, retrieval. Returns an early ChatResponse or the turn state."""
+        filtered = self._screen(chat_request)
+        if isinstance(filtered, ChatResponse):
+            return filtered
+
+        # history first: the current message is appended to the prompt separately
+        history = self._history(chat_request.session_id)
+        self._record_user_message(chat_request, filtered)
+        similar_chunks = self._search_knowledge(chat_request, filtered)
+        doc_chunks = self._search_session_docs(chat_request, filtered)
+        return self._turn(filtered, history, similar_chunks, doc_chunks)
+
+    def _finalize_turn(self, chat_request: ChatRequest, turn: Dict[str, Any], llm_resp: str) -> ChatResponse:
+        """Steps 8-13: output safety, persistence, sources, confidence, disclaimer."""
+        llm_resp = self._filter_output(llm_resp)
+
+        # 9) Persist assistant message
+        self.memory_manager.add_message(chat_request.session_id, "assistant", llm_resp)
+        self.memory_manager.schedule_summary(chat_request.session_id, self.llm_engine.summarize_conversation)
+
+        return self._build_response(chat_request, turn, llm_resp)
+
+    def _persist_reply(self, session_id: str, assistant_text: str):
+        # 9) store the assistant message (the user message was stored during retrieval)
+        self.memory_manager.add_message(session_id, "assistant", assistant_text)
+        self.memory_manager.schedule_summary(session_id, self.llm_engine.summarize_conversation)
+
+    def _filter_output(self, llm_resp: str) -> str:
+        # 8) Post-process LLM output (safety)
+        try:
+            return self.safety_handler.filter_output(llm_resp)
+        except Exception:
+            # Ensure we never crash the pipeline here
+            logger.exception("Safety handler failed while filtering LLM output; returning raw output.")
+            return llm_resp
+
+    def _build_response(self, chat_request: ChatRequest, turn: Dict[str, Any], llm_resp: str) -> ChatResponse:
+        """Steps 10-13: sources, confidence, disclaimer."""
+        similar_chunks = turn["chunks"]
+
+        # 10) Build sources list for response
+        sources = []
+        for ch in similar_chunks[:3]:
+            sources.append({
+                "id": ch.get("id") or ch.get("id", ch.get("chunk_id", None)),
+                "category": ch.get("category", "Unknown"),
+                "question": ch.get("question", "") or "",
+                "similarity_score": float(ch.get("similarity_score", 0.0)),
+                "warning": ch.get("warning") if "warning" in ch else None
+            })
+
+        # 11) Compute confidence (simple heuristic)
+        max_sim = 0.0
+        if sources:
+            try:
+                max_sim = max(s.get("similarity_score", 0.0) for s in sources)
+            except Exception:
+                max_sim = 0.0
+        confidence = float(min(1.0, max(0.0, 0.5 + max_sim / 2.0)))
+
+        # 12) Append a medical disclaimer if not present
+        disclaimer_needed = True
+        check_text = llm_resp.lower()
+        for token in ["consult", "doctor", "medical", "seek medical advice", "healthcare provider"]:
+            if token in check_text:
+                disclaimer_needed = False
+                break
+        if disclaimer_needed:
+            llm_resp = llm_resp.rstrip() + "\n\n" + MEDICAL_DISCLAIMER
+
+        # 13) Build ChatResponse with UTC ISO timestamp
+        return ChatResponse(
+            response=llm_resp,
+            session_id=chat_request.session_id,
+            message_id=str(uuid.uuid4()),
+            timestamp=datetime.now(timezone.utc),
+            sources=sources,
+            confidence=confidence,
+            warning="MEDICAL WARNING" if any(s.get("warning") for s in sources) else None
+        )
 
     # ---------- helper response factories ----------
     def _create_error(self, session_id: str, message: str) -> ChatResponse:
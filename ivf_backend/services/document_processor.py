@@ -1,10 +1,13 @@
 # ivf_backend/services/document_processor.py
 import logging
+import re
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from pathlib import Path
 import PyPDF2
 
+from ..config import settings
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -13,6 +16,58 @@ except ImportError:
     docx = None
 
 
+# ---------------------------------------------------------
+# Lab-value pattern table (compiled once at import)
+# ---------------------------------------------------------
+_NUMBER = r"\d+(?:\.\d+)?"
+_UNIT = (
+    r"(?:ng/ml|pg/ml|pmol/l|nmol/l|miu/ml|mu/ml|iu/ml|miu/l|iu/l|u/l|µiu/ml|uiu/ml"
+    r"|mill(?:ion)?/ml|million/ejaculate|million|x\s?10\^?6/ml|m/ml|ml|%)"
+)
+
+# order matters: more specific names first ("progressive motility" before "motility",
+# "total sperm count" before "sperm concentration")
+LAB_ANALYTES = [
+    ("AMH", r"amh|anti[- ]?m[uü]ll?erian\s+hormone"),
+    ("FSH", r"fsh|follicle[- ]stimulating\s+hormone"),
+    ("LH", r"lh|luteini[sz]ing\s+hormone"),
+    ("Estradiol", r"estradiol|oestradiol|e2"),
+    ("Progesterone", r"progesterone|p4"),
+    ("Beta hCG", r"(?:beta|b|β)[- ]?h?cg|hcg"),
+    ("Prolactin", r"prolactin|prl"),
+    ("TSH", r"tsh|thyroid[- ]stimulating\s+hormone"),
+    ("AFC", r"afc|antral\s+follicle\s+count"),
+    ("Semen volume", r"(?:semen\s+)?volume"),
+    ("Total sperm count", r"total\s+sperm\s+(?:count|number)"),
+    # plain "sperm count" is how many reports label the concentration (million/ml)
+    ("Sperm concentration", r"sperm\s+concentration|(?<!total\s)sperm\s+count"),
+    ("Progressive motility", r"progressive\s+motility|pr\s+motility"),
+    ("Total motility", r"total\s+motility|motility"),
+    ("Morphology", r"(?:normal\s+)?morphology|normal\s+forms"),
+    ("Vitality", r"vitality"),
+    ("pH", r"ph"),
+]
+
+# analytes specific enough that finding one marks the document as fertility-related
+FERTILITY_MARKERS = {
+    "AMH", "FSH", "LH", "Estradiol", "Progesterone", "Beta hCG", "AFC",
+    "Total sperm count", "Progressive motility", "Total motility",
+}
+
+LAB_PATTERNS = [
+    (name, re.compile(
+        rf"(?<![a-z])(?:{aliases})(?![a-z])(?:\s*\([^)\n]*\))?[^\d\n<>≤≥]{{0,40}}?"
+        rf"(?P<value>(?:[<>≤≥]=?\s*)?{_NUMBER})\s*(?P<unit>{_UNIT})?(?P<rest>[^\n]*)",
+        re.IGNORECASE
+    ))
+    for name, aliases in LAB_ANALYTES
+]
+
+_RANGE_RE = re.compile(rf"(?P<low>{_NUMBER})\s*(?:-|–|to)\s*(?P<high>{_NUMBER})|(?P<op>[<>≤≥]=?)\s*(?P<bound>{_NUMBER})")
+# a line that looks like a measurement: a number followed by a known unit, or a numeric range
+_MEASUREMENT_RE = re.compile(rf"{_NUMBER}\s*{_UNIT}(?![a-z])|{_NUMBER}\s*(?:-|–)\s*{_NUMBER}", re.IGNORECASE)
+
+
 class DocumentProcessor:
     """Process medical documents for IVF chatbot"""
 
@@ -41,6 +96,91 @@ class DocumentProcessor:
             logger.error(f"Processing error: {e}")
             return {"error": f"Processing failed: {str(e)}"}
 
+    # -------------------- CHUNKING -------------------------
+    def chunk_text(self, text: str, size: int = None, overlap: int = None) -> List[str]:
+        """Split full document text into overlapping chunks for the session index"""
+        size = size or settings.DOC_CHUNK_CHARS
+        overlap = settings.DOC_CHUNK_OVERLAP if overlap is None else overlap
+
+        text = " ".join(text.split())
+        chunks = []
+        start = 0
+        while start < len(text):
+            end = min(len(text), start + size)
+            # avoid cutting words in half when there is a space to break on
+            if end < len(text):
+                space = text.rfind(" ", start + overlap + 1, end)
+                if space != -1:
+                    end = space
+            chunks.append(text[start:end].strip())
+            if end >= len(text):
+                break
+            start = max(end - overlap, start + 1)
+            space = text.find(" ", start, end)
+            if space != -1:
+                start = space + 1
+
+        return [c for c in chunks if c]
+
+    # -------------------- LAB VALUES -------------------------
+    def extract_lab_values(self, text: str) -> Dict[str, Any]:
+        """
+        Pull (analyte, value, unit, reference range) rows out of report text.
+        Coverage = matched lines / lines that look like measurements.
+        """
+        values: List[Dict[str, Optional[str]]] = []
+        seen = set()
+        measurement_lines = 0
+        matched_lines = 0
+
+        for line in text.splitlines():
+            is_measurement = bool(_MEASUREMENT_RE.search(line))
+            measurement_lines += is_measurement
+
+            for name, pattern in LAB_PATTERNS:
+                m = pattern.search(line)
+                if not m:
+                    continue
+                # bare aliases like "volume" or "pH" need a unit or range to count
+                if not is_measurement and not m.group("unit"):
+                    break
+
+                ref = _RANGE_RE.search(m.group("rest") or "")
+                if ref and ref.group("low"):
+                    ref_range = f"{ref.group('low')}-{ref.group('high')}"
+                elif ref:
+                    ref_range = f"{ref.group('op')}{ref.group('bound')}"
+                else:
+                    ref_range = None
+
+                row = (name, m.group("value").replace(" ", ""), (m.group("unit") or "").strip(), ref_range)
+                if row not in seen:
+                    seen.add(row)
+                    values.append({"analyte": row[0], "value": row[1], "unit": row[2] or None, "reference_range": row[3]})
+                matched_lines += is_measurement
+                break
+
+        coverage = matched_lines / measurement_lines if measurement_lines else 0.0
+        return {"lab_values": values, "lab_coverage": round(coverage, 2)}
+
+    @staticmethod
+    def has_fertility_markers(values: List[Dict[str, Any]]) -> bool:
+        return any(v["analyte"] in FERTILITY_MARKERS for v in values)
+
+    @staticmethod
+    def format_lab_table(values: List[Dict[str, Any]]) -> str:
+        lines = ["Lab values (analyte | value | unit | reference range):"]
+        for v in values:
+            lines.append(f"{v['analyte']} | {v['value']} | {v.get('unit') or '-'} | {v.get('reference_range') or '-'}")
+        return "\n".join(lines)
+
+    def prompt_content(self, result: Dict[str, Any]) -> str:
+        """Compact structured table for the LLM, or the raw text when the table covers too little"""
+        values = result.get("lab_values") or []
+        if values and result.get("lab_coverage", 0.0) >= settings.LAB_TABLE_MIN_COVERAGE:
+            return self.format_lab_table(values)
+        return result.get("extracted_text", "")
+
     # -------------------- PDF -------------------------
     def _process_pdf(self, file_path: str) -> Dict[str, Any]:
         """Extract text from PDF"""
@@ -57,6 +197,8 @@ class DocumentProcessor:
                 "type": "pdf",
                 "page_count": len(reader.pages),
                 "extracted_text": text[:3000],
+                "chunks": self.chunk_text(text),
+                **self.extract_lab_values(text),
                 "summary": f"PDF with {len(reader.pages)} pages processed.",
                 "word_count": len(text.split())
             }
@@ -79,6 +221,8 @@ class DocumentProcessor:
                 "type": "word",
                 "word_count": len(text.split()),
                 "extracted_text": text[:3000],
+                "chunks": self.chunk_text(text),
+                **self.extract_lab_values(text),
                 "summary": "Word document processed successfully"
             }
 
@@ -88,22 +232,89 @@ class DocumentProcessor:
 
     # -------------------- CSV -------------------------
     def _process_csv(self, file_path: str) -> Dict[str, Any]:
-        """Extract table structure from CSV"""
+        """Extract table structure from CSV, streaming it in bounded chunks"""
         try:
-            df = pd.read_csv(file_path)
+            rows = 0
+            columns: List[str] = []
+            sample_data: List[Dict[str, Any]] = []
+            stats: Dict[str, Dict[str, Any]] = {}
+
+            with pd.read_csv(file_path, chunksize=settings.CSV_CHUNK_ROWS) as reader:
+                for chunk in reader:
+                    if not columns:
+                        columns = list(chunk.columns)
+                    if len(sample_data) < 5:
+                        sample_data.extend(chunk.head(5 - len(sample_data)).to_dict("records"))
+
+                    rows += len(chunk)
+                    for col in chunk.columns:
+                        self._update_column_stats(stats.setdefault(col, self._new_column_stats()), chunk[col])
 
             return {
                 "type": "csv",
-                "rows": len(df),
-                "columns": list(df.columns),
-                "sample_data": df.head(5).to_dict("records"),
-                "summary": f"CSV with {len(df)} rows processed"
+                "rows": rows,
+                "columns": columns,
+                "sample_data": sample_data,
+                "column_stats": {col: self._finalize_column_stats(stats[col]) for col in columns},
+                "summary": f"CSV with {rows} rows processed"
             }
 
         except Exception as e:
             logger.error(f"CSV error: {e}")
             return {"error": "Failed to process CSV"}
 
+    @staticmethod
+    def _new_column_stats() -> Dict[str, Any]:
+        return {"kinds": set(), "null_count": 0, "count": 0, "sum": 0.0, "min": None, "max": None}
+
+    @staticmethod
+    def _update_column_stats(acc: Dict[str, Any], series: pd.Series):
+        """Fold one chunk of a column into its running stats"""
+        nulls = int(series.isna().sum())
+        acc["null_count"] += nulls
+
+        # an all-empty chunk says nothing about the column type (pandas reads it as float)
+        if nulls == len(series):
+            return
+
+        kind = series.dtype.kind
+        values = series.dropna()
+        # integer columns with gaps come back as float; keep reporting them as integers
+        if kind == "f" and (values % 1 == 0).all():
+            kind = "i"
+
+        acc["kinds"].add(kind)
+        if kind not in "iuf":
+            return
+
+        acc["count"] += len(values)
+        acc["sum"] += float(values.sum())
+        lo, hi = float(values.min()), float(values.max())
+        acc["min"] = lo if acc["min"] is None else min(acc["min"], lo)
+        acc["max"] = hi if acc["max"] is None else max(acc["max"], hi)
+
+    @staticmethod
+    def _finalize_column_stats(acc: Dict[str, Any]) -> Dict[str, Any]:
+        """Resolve the column type across chunks and drop numeric stats for non-numeric columns"""
+        kinds = acc["kinds"]
+        if not kinds:
+            col_type = "empty"
+        elif kinds <= set("iu"):
+            col_type = "integer"
+        elif kinds <= set("iuf"):
+            col_type = "float"
+        elif kinds == {"b"}:
+            col_type = "boolean"
+        else:
+            col_type = "string"
+
+        result = {"type": col_type, "null_count": acc["null_count"]}
+        if col_type in ("integer", "float") and acc["count"]:
+            result["min"] = acc["min"]
+            result["max"] = acc["max"]
+            result["mean"] = acc["sum"] / acc["count"]
+        return result
+
     # -------------------- TEXT -------------------------
     def _process_text(self, file_path: str) -> Dict[str, Any]:
         """Extract plain text from .txt files"""
@@ -115,6 +326,8 @@ class DocumentProcessor:
                 "type": "text",
                 "word_count": len(text.split()),
                 "extracted_text": text[:3000],
+                "chunks": self.chunk_text(text),
+                **self.extract_lab_values(text),
                 "summary": "Text file processed successfully"
             }
 
@@ -1,13 +1,16 @@
 # ivf_backend/services/llm_engine.py
 
+import asyncio
 import logging
 import hashlib
 import json
 import re
+import threading
 from collections import OrderedDict
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 
 from ..config import settings
+from .tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -21,13 +24,24 @@ class LLMEngine:
     - Groq LLM integration
     """
 
+    NON_IVF_REPLY = (
+        "I can only help with **IVF, fertility, embryos, sperm, eggs, hormones**, "
+        "and reproductive treatment-related questions.\n\n"
+        "Your question does **not seem to be IVF-related**, so I cannot answer it."
+    )
+
+    # sampling for chat answers (blocking, awaited and streamed alike)
+    CHAT_COMPLETION = {"temperature": 0.25, "top_p": 0.9, "max_tokens": 700}
+
     def __init__(self):
         self.client = None
+        self.async_client = None
         self._initialize_client()
 
-        # Simple FIFO response cache
+        # Simple LRU response cache (shared by the chat worker threads)
         self._response_cache: OrderedDict[str, str] = OrderedDict()
         self._cache_max = 256
+        self._cache_lock = threading.Lock()
 
     # -----------------------------------------------------------
     # Initialize Groq Client
@@ -39,8 +53,9 @@ class LLMEngine:
                 return
 
             try:
-                from groq import Groq
+                from groq import Groq, AsyncGroq
                 self.client = Groq(api_key=settings.GROQ_API_KEY)
+                self.async_client = AsyncGroq(api_key=settings.GROQ_API_KEY)
             except ImportError:
                 import groq
                 self.client = groq.Client(api_key=settings.GROQ_API_KEY)
@@ -65,16 +80,17 @@ class LLMEngine:
         return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
     def _cache_get(self, key: str) -> Optional[str]:
-        if key in self._response_cache:
-            val = self._response_cache.pop(key)
-            self._response_cache[key] = val
-            return val
-        return None
+        with self._cache_lock:
+            if key in self._response_cache:
+                self._response_cache.move_to_end(key)
+                return self._response_cache[key]
+            return None
 
     def _cache_set(self, key: str, val: str):
-        self._response_cache[key] = val
-        if len(self._response_cache) > self._cache_max:
-            self._response_cache.popitem(last=False)
+        with self._cache_lock:
+            self._response_cache[key] = val
+            if len(self._response_cache) > self._cache_max:
+                self._response_cache.popitem(last=False)
 
     # -----------------------------------------------------------
     # IVF-only Safety Filter
@@ -93,11 +109,7 @@ class LLMEngine:
         return bool(re.search(pattern, text.lower()))
 
     def _reject_non_ivf(self):
-        return (
-            "I can only help with **IVF, fertility, embryos, sperm, eggs, hormones**, "
-            "and reproductive treatment-related questions.\n\n"
-            "Your question does **not seem to be IVF-related**, so I cannot answer it."
-        )
+        return self.NON_IVF_REPLY
 
     # -----------------------------------------------------------
     # System Prompt
@@ -114,9 +126,100 @@ class LLMEngine:
             "6. Keep language simple and supportive.\n"
         )
 
+    def _build_messages(self, system_prompt, context, conversation_history, user_message):
+        messages = [{"role": "system", "content": system_prompt}]
+
+        if context:
+            messages.append({"role": "system", "content": f"Relevant IVF context:\n{context}"})
+
+        if conversation_history:
+            messages.extend(self._fit_history(conversation_history))
+
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    @staticmethod
+    def _fit_history(conversation_history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        Pinned summary first, then as many of the newest turns as fit in HISTORY_TOKEN_BUDGET
+        (older turns are covered by the summary).
+        """
+        def tokens(m):
+            return m.get("tokens") or estimate_tokens(m.get("content", ""))
+
+        budget = settings.HISTORY_TOKEN_BUDGET
+        pinned = [m for m in conversation_history if m.get("summary")]
+        turns = [m for m in conversation_history if not m.get("summary")]
+        budget -= sum(tokens(m) for m in pinned)
+
+        kept = []
+        for m in reversed(turns):
+            cost = tokens(m)
+            if cost > budget:
+                break
+            kept.append(m)
+            budget -= cost
+
+        return [
+            {"role": m.get("role", "user"), "content": m.get("content", "")}
+            for m in pinned + kept[::-1]
+        ]
+
+    def summarize_conversation(self, previous_summary: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Fold `messages` into the running conversation summary. None when the LLM is unavailable."""
+        if not self.client or not messages:
+            return None
+
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            "Rewrite the summary to include the new messages. Keep facts the patient shared "
+            "(age, test results, treatment stage, medications), their open questions and what was "
+            "already explained. Plain prose, no advice, under 150 words."
+        )
+
+        try:
+            response = self.client.chat.completions.create(
+                model=settings.GROQ_MODEL,
+                messages=[
+                    {"role": "system", "content": "You summarize IVF support conversations for context."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+                max_tokens=settings.SUMMARY_MAX_TOKENS,
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.error(f"Conversation summary failed: {e}")
+            return None
+
     # -----------------------------------------------------------
     # CHAT MODE
     # -----------------------------------------------------------
+    def _prepare_chat(self, user_message, context, conversation_history, language):
+        """
+        Shared by every chat mode: IVF relevance check, prompt and response-cache lookup.
+        Returns (reply, key, messages): a ready reply (rejection or cache hit) or None when the
+        model has to be called with `messages`, caching the answer under `key`.
+        """
+        # IVF relevance check (CHAT MODE ONLY)
+        if not self._is_ivf_related(user_message):
+            return self._reject_non_ivf(), None, None
+
+        system_prompt = self._system_prompt(language)
+        key = self._make_key(system_prompt, context, conversation_history, user_message)
+        cached = self._cache_get(key)
+        if cached:
+            return cached, key, None
+
+        return None, key, self._build_messages(system_prompt, context, conversation_history, user_message)
+
+    def _store_reply(self, key: str, response) -> str:
+        output = response.choices[0].message.content.strip()
+        self._cache_set(key, output)
+        return output
+
     def generate_response(
         self,
         user_message: str,
@@ -124,52 +227,99 @@ class LLMEngine:
         conversation_history: List[Dict[str, str]] = None,
         language: str = "en"
     ) -> str:
-
-        # IVF relevance check (CHAT MODE ONLY)
-        if not self._is_ivf_related(user_message):
-            return self._reject_non_ivf()
-
+        reply, key, messages = self._prepare_chat(user_message, context, conversation_history, language)
+        if reply is not None:
+            return reply
         if not self.client:
             return self._fallback(user_message)
 
         try:
-            system_prompt = self._system_prompt(language)
-            messages = [{"role": "system", "content": system_prompt}]
-
-            if context:
-                messages.append({"role": "system", "content": f"Relevant IVF context:\n{context}"})
-
-            if conversation_history:
-                for m in conversation_history[-6:]:
-                    messages.append({
-                        "role": m.get("role", "user"),
-                        "content": m.get("content", "")
-                    })
-
-            messages.append({"role": "user", "content": user_message})
+            response = self.client.chat.completions.create(
+                model=settings.GROQ_MODEL, messages=messages, **self.CHAT_COMPLETION
+            )
+            return self._store_reply(key, response)
 
-            # Cache
-            key = self._make_key(system_prompt, context, conversation_history, user_message)
-            cached = self._cache_get(key)
-            if cached:
-                return cached
+        except Exception as e:
+            logger.error(f"Groq LLM error: {e}")
+            return self._fallback(user_message)
 
-            response = self.client.chat.completions.create(
-                model=settings.GROQ_MODEL,
-                messages=messages,
-                temperature=0.25,
-                top_p=0.9,
-                max_tokens=700,
+    async def agenerate_response(
+        self,
+        user_message: str,
+        context: str = "",
+        conversation_history: List[Dict[str, str]] = None,
+        language: str = "en"
+    ) -> str:
+        """generate_response with the Groq call awaited instead of blocking the event loop."""
+        reply, key, messages = self._prepare_chat(user_message, context, conversation_history, language)
+        if reply is not None:
+            return reply
+        if not self.async_client:
+            # legacy SDK without AsyncGroq (or no key): same result, just off the loop
+            return await asyncio.to_thread(
+                self.generate_response, user_message, context, conversation_history, language
             )
 
-            output = response.choices[0].message.content.strip()
-            self._cache_set(key, output)
-            return output
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=settings.GROQ_MODEL, messages=messages, **self.CHAT_COMPLETION
+            )
+            return self._store_reply(key, response)
 
         except Exception as e:
             logger.error(f"Groq LLM error: {e}")
             return self._fallback(user_message)
 
+    async def aclose(self):
+        if self.async_client:
+            await self.async_client.close()
+
+    # -----------------------------------------------------------
+    # CHAT MODE — streamed (voice pipeline)
+    # -----------------------------------------------------------
+    def stream_response(
+        self,
+        user_message: str,
+        context: str = "",
+        conversation_history: List[Dict[str, str]] = None,
+        language: str = "en"
+    ) -> Iterator[str]:
+        """Yield the answer as text deltas while Groq generates it (same prompt and cache as generate_response)."""
+        reply, key, messages = self._prepare_chat(user_message, context, conversation_history, language)
+        if reply is not None:
+            yield reply
+            return
+        if not self.client:
+            yield self._fallback(user_message)
+            return
+
+        parts = []
+        try:
+            stream = self.client.chat.completions.create(
+                model=settings.GROQ_MODEL, messages=messages, stream=True, **self.CHAT_COMPLETION
+            )
+            try:
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            finally:
+                # also runs when the consumer closes us early: drop the HTTP stream instead of draining it
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+
+        except Exception as e:
+            logger.error(f"Groq LLM stream error: {e}")
+            if not parts:
+                yield self._fallback(user_message)
+            return
+
+        output = "".join(parts).strip()
+        if output:
+            self._cache_set(key, output)
+
     # -----------------------------------------------------------
     # DOCUMENT EXPLANATION MODE
     # -----------------------------------------------------------
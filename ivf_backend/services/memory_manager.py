@@ -1,81 +1,371 @@
 # ivf_backend/services/memory_manager.py
-import sqlite3, json, logging
-from datetime import datetime
-from typing import List, Optional
+import sqlite3, json, logging, threading
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple, Dict, Any
 from pathlib import Path
+from ..config import settings
 from ..models.chat_models import ChatMessage, ConversationSession
+from .session_store import SessionStore
+from .tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
-class MemoryManager:
-    def __init__(self):
-        self.db_path = str(Path(__file__).parent.parent / "data" / "conversation_memory.db")
+class MemoryManager(SessionStore):
+    """
+    SQLite session store (the default backend) with write-behind message persistence:
+    add_message only queues; a background thread writes queued messages in one transaction
+    per batch (MEMORY_FLUSH_BATCH messages or every MEMORY_FLUSH_INTERVAL seconds).
+    Reads merge in queued and in-flight messages, and close() flushes what is left.
+    Connections are opened once per thread in WAL mode and reads never wait for a flush: the batch
+    being written stays visible in memory until the commit that makes it visible in SQLite.
+    The last MEMORY_WINDOW_SIZE messages of active sessions live in a memory-capped LRU kept
+    write-through by add_message, so their history reads never touch SQLite.
+    Every message stores its token count, and each session keeps a rolling summary of its older
+    messages (refreshed in the background every SUMMARY_EVERY_TURNS turns), so prompts can be
+    built from the summary plus recent turns instead of the full history.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: Optional[str] = None):
+        super().__init__()
+        self.db_path = db_path or str(Path(__file__).parent.parent / "data" / "conversation_memory.db")
+
+        # one long-lived connection per thread (statement cache + page cache survive between calls)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
         self._init_database()
 
+        # (session_id, message, timestamp) not yet in the database; flush stamps message_id
+        self._pending: List[Tuple[str, ChatMessage, str]] = []
+        # the batch being written; committed and cleared under _lock, which also bumps _flush_gen,
+        # so a reader that saw the same generation before and after its query saw exactly one copy
+        self._inflight: List[Tuple[str, ChatMessage, str]] = []
+        self._flush_gen = 0
+        self._lock = threading.Lock()
+        # serializes flushes (and retention deletes against them); readers never take it
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="memory-writer", daemon=True)
+        self._writer.start()
+
+        # session_id -> recent ChatMessages; guarded by _lock (same lock as _pending, so the two agree)
+        self._windows: OrderedDict[str, deque] = OrderedDict()
+        self._window_bytes: Dict[str, int] = {}
+        self._cache_bytes = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        # session_id -> (summary, last summarized message id, summary tokens), for windowed sessions
+        self._summaries: Dict[str, Tuple[str, int, int]] = {}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=settings.SQLITE_BUSY_TIMEOUT,
+                cached_statements=settings.SQLITE_CACHED_STATEMENTS,
+                check_same_thread=False,  # only so close() can close it; each thread uses its own
+            )
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; safe with WAL
+            conn.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_KB}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_MB * 1024 * 1024}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
     def _init_database(self):
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._conn() as conn:
+                # freed pages can be returned to the OS after retention deletes (takes effect
+                # immediately on a new file; existing files are converted by the VACUUM below)
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("PRAGMA journal_mode=WAL")  # persistent, stored in the database file
                 cursor = conn.cursor()
                 cursor.execute('''CREATE TABLE IF NOT EXISTS conversations (session_id TEXT PRIMARY KEY, user_id TEXT, created_at TEXT DEFAULT (datetime('now')), updated_at TEXT DEFAULT (datetime('now')), message_count INTEGER DEFAULT 0, metadata TEXT DEFAULT '{}')''')
                 cursor.execute('''CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, timestamp TEXT DEFAULT (datetime('now')), FOREIGN KEY(session_id) REFERENCES conversations(session_id))''')
-                cursor.execute('''CREATE INDEX IF NOT EXISTS idx_messages_session_time ON messages(session_id, timestamp)''')
+                # history is ordered by id (timestamps are second-resolution); one index serves
+                # windows, pages and summaries, so the old (session_id, timestamp) one goes
+                cursor.execute('''CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages(session_id, id)''')
+                cursor.execute('''DROP INDEX IF EXISTS idx_messages_session_time''')
+                cursor.execute('''CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at)''')
+                self._migrate(cursor)
+            if self._conn().execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logger.info("Converting memory DB to incremental auto-vacuum (one-time VACUUM)")
+                self._conn().execute("VACUUM")
             logger.info("Memory DB initialized")
         except Exception as e:
             logger.error(f"DB init error: {e}")
             raise
 
+    @staticmethod
+    def _migrate(cursor: sqlite3.Cursor):
+        """Add columns introduced after the first schema to existing databases."""
+        columns = {
+            "messages": [("tokens", "INTEGER")],
+            "conversations": [
+                ("summary", "TEXT DEFAULT ''"),
+                ("summary_upto_id", "INTEGER DEFAULT 0"),
+                ("summary_tokens", "INTEGER DEFAULT 0"),
+            ],
+        }
+        for table, wanted in columns.items():
+            existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+            for name, decl in wanted:
+                if name not in existing:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+                    logger.info(f"Memory DB migrated: {table}.{name}")
+
     def create_session(self, session_id: str, user_id: Optional[str] = None) -> bool:
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._conn() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''INSERT OR IGNORE INTO conversations (session_id, user_id) VALUES (?, ?)''', (session_id, user_id))
+                created = cursor.rowcount == 1
+            if created:
+                # a brand-new session has no history to load: its (empty) window is already complete
+                with self._lock:
+                    self._install_window(session_id, [], ("", 0, 0))
             return True
         except Exception as e:
             logger.error(f"create_session error: {e}")
             return False
 
     def add_message(self, session_id: str, role: str, content: str) -> bool:
+        # same text format as SQLite's datetime('now') so queued and stored rows read back alike
+        ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        msg = self._to_message(role, content, ts, tokens=estimate_tokens(content))
+        with self._lock:
+            if self._closed:
+                logger.error("add_message after close; message dropped")
+                return False
+            self._pending.append((session_id, msg, ts))
+            full = len(self._pending) >= settings.MEMORY_FLUSH_BATCH
+            if session_id in self._windows:
+                self._append_to_window(session_id, msg)
+        if full:
+            self._wake.set()
+        return True
+
+    # ---------- write-behind ----------
+    def _write_loop(self):
+        while True:
+            self._wake.wait(settings.MEMORY_FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+            if self._closed:
+                return
+
+    def flush(self) -> int:
+        """Write all queued messages in one transaction. Returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._inflight = batch
+            if not batch:
+                return 0
+            conn = self._conn()
+            try:
+                for sid, msg, ts in batch:
+                    cursor = conn.execute('''INSERT INTO messages (session_id, role, content, timestamp, tokens) VALUES (?, ?, ?, ?, ?)''', (sid, self._role(msg), msg.content, ts, msg.tokens))
+                    # cached windows hold the same objects, so they learn the row ids too
+                    msg.message_id = str(cursor.lastrowid)
+                counts = Counter(m[0] for m in batch)
+                conn.executemany('''UPDATE conversations SET updated_at = datetime('now'), message_count = message_count + ? WHERE session_id = ?''', [(n, sid) for sid, n in counts.items()])
+                with self._lock:
+                    conn.commit()
+                    self._inflight = []
+                    self._flush_gen += 1
+                return len(batch)
+            except Exception as e:
+                logger.error(f"Message flush error ({len(batch)} messages requeued): {e}")
+                conn.rollback()
+                with self._lock:
+                    for _, msg, _ in batch:
+                        msg.message_id = None
+                    self._inflight = []
+                    self._pending[:0] = batch
+                return 0
+
+    def close(self):
+        """Stop the writer and flush everything still queued (call on shutdown)."""
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        super().close()  # finish or cancel queued summaries before the final flush
+        self._writer.join(timeout=10)
+        self.flush()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    def _queued_for(self, session_id: str) -> List[Tuple[str, ChatMessage, str]]:
+        """Messages of the session not yet committed (in-flight batch, then pending), oldest first; hold _lock."""
+        return [m for m in self._inflight + self._pending if m[0] == session_id]
+
+    def _read_with_queued(self, session_id: str, read, merge):
+        """
+        merge(read(conn), queued messages) as one consistent view, without waiting for a flush.
+        merge runs under _lock. If a batch committed while read() ran, read() may or may not have
+        seen it, so the read is repeated; after a few tries it falls back to holding off flushes.
+        """
+        for _ in range(3):
+            with self._lock:
+                gen = self._flush_gen
+            result = read(self._conn())
+            with self._lock:
+                if self._flush_gen == gen:
+                    return merge(result, self._queued_for(session_id))
+        with self._flush_lock:
+            result = read(self._conn())
+            with self._lock:
+                return merge(result, self._queued_for(session_id))
+
+    @staticmethod
+    def _role(msg: ChatMessage) -> str:
+        return getattr(msg.role, "value", msg.role)
+
+    # ---------- recent-history cache ----------
+    @staticmethod
+    def _message_bytes(msg: ChatMessage) -> int:
+        return len(msg.content.encode("utf-8")) + 200  # text + rough object overhead
+
+    def _install_window(self, session_id: str, msgs: List[ChatMessage], summary: Tuple[str, int, int]):
+        self._drop_window(session_id)
+        self._windows[session_id] = deque(msgs, maxlen=settings.MEMORY_WINDOW_SIZE)
+        self._summaries[session_id] = summary
+        self._window_bytes[session_id] = 0
+        for m in self._windows[session_id]:
+            self._window_bytes[session_id] += self._message_bytes(m)
+        self._cache_bytes += self._window_bytes[session_id]
+        self._evict()
+
+    def _append_to_window(self, session_id: str, msg: ChatMessage):
+        window = self._windows[session_id]
+        size = self._message_bytes(msg)
+        if len(window) == window.maxlen:
+            size -= self._message_bytes(window[0])
+        window.append(msg)
+        self._window_bytes[session_id] += size
+        self._cache_bytes += size
+        self._windows.move_to_end(session_id)
+        self._evict()
+
+    def _drop_window(self, session_id: str):
+        if self._windows.pop(session_id, None) is not None:
+            self._cache_bytes -= self._window_bytes.pop(session_id)
+            self._summaries.pop(session_id, None)
+
+    def _evict(self):
+        while len(self._windows) > 1 and (
+            len(self._windows) > settings.MEMORY_CACHE_MAX_SESSIONS
+            or self._cache_bytes > settings.MEMORY_CACHE_MAX_BYTES
+        ):
+            self._drop_window(next(iter(self._windows)))
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._cache_hits + self._cache_misses
+            return {
+                "backend": self.name,
+                "sessions": len(self._windows),
+                "bytes": self._cache_bytes,
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "hit_rate": round(self._cache_hits / lookups, 4) if lookups else None,
+            }
+
+    @staticmethod
+    def _to_message(role: str, content: str, ts: str, message_id: Optional[int] = None,
+                    tokens: Optional[int] = None) -> ChatMessage:
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)''', (session_id, role, content))
-                cursor.execute('''UPDATE conversations SET updated_at = datetime('now'), message_count = message_count + 1 WHERE session_id = ?''', (session_id,))
-            return True
-        except Exception as e:
-            logger.error(f"add_message error: {e}")
-            return False
+            ts_parsed = datetime.fromisoformat(ts)
+        except:
+            from datetime import datetime as dt
+            try:
+                ts_parsed = dt.strptime(ts, "%Y-%m-%d %H:%M:%S")
+            except:
+                ts_parsed = datetime.now()
+        if tokens is None:
+            tokens = estimate_tokens(content)  # rows written before token counts were stored
+        return ChatMessage(
+            role=role, content=content, timestamp=ts_parsed,
+            message_id=str(message_id) if message_id is not None else None, tokens=tokens
+        )
 
     def get_conversation_history(self, session_id: str, limit: int = 10) -> List[ChatMessage]:
+        window_size = settings.MEMORY_WINDOW_SIZE
+        with self._lock:
+            window = self._windows.get(session_id)
+            if window is not None and limit <= window_size:
+                self._windows.move_to_end(session_id)
+                self._cache_hits += 1
+                return list(window)[-limit:] if limit > 0 else []
+            self._cache_misses += 1
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY timestamp DESC LIMIT ?''', (session_id, limit))
-                rows = cursor.fetchall()
-            msgs = []
-            for role, content, ts in rows:
-                try:
-                    ts_parsed = datetime.fromisoformat(ts)
-                except:
-                    from datetime import datetime as dt
-                    try:
-                        ts_parsed = dt.strptime(ts, "%Y-%m-%d %H:%M:%S")
-                    except:
-                        ts_parsed = datetime.now()
-                msgs.append(ChatMessage(role=role, content=content, timestamp=ts_parsed))
-            return list(reversed(msgs))
+            fetch = max(limit, window_size)
+
+            def read(conn):
+                rows = conn.execute('''SELECT id, role, content, timestamp, tokens FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?''', (session_id, fetch)).fetchall()
+                return rows, self._read_summary(conn, session_id)
+
+            def merge(result, queued):
+                rows, summary = result
+                stored = [self._to_message(role, content, ts, row_id, tokens) for row_id, role, content, ts, tokens in reversed(rows)]
+                # queued messages are the newest; the window is installed under the same lock that
+                # add_message holds, so no write can slip between this snapshot and the cache
+                msgs = (stored + [msg for _, msg, _ in queued])[-fetch:]
+                self._install_window(session_id, msgs[-window_size:], summary)
+                return msgs
+
+            msgs = self._read_with_queued(session_id, read, merge)
+            return msgs[-limit:] if limit > 0 else []
         except Exception as e:
             logger.error(f"get_conversation_history error: {e}")
             return []
 
+    def get_messages_page(self, session_id: str, before: Optional[int] = None, limit: int = 50) -> Tuple[List[ChatMessage], Optional[int]]:
+        """
+        One page of a session's messages older than message id `before` (newest page when None),
+        oldest first. Keyset pagination over (session_id, id): every page costs one index range
+        scan however long the session is. Returns (messages, cursor for the next older page or None).
+        """
+        self.flush()  # queued messages get their ids, so pages and cursors line up
+        try:
+            with self._conn() as conn:
+                if before is None:
+                    rows = conn.execute('''SELECT id, role, content, timestamp, tokens FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?''', (session_id, limit + 1)).fetchall()
+                else:
+                    rows = conn.execute('''SELECT id, role, content, timestamp, tokens FROM messages WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?''', (session_id, before, limit + 1)).fetchall()
+        except Exception as e:
+            logger.error(f"get_messages_page error: {e}")
+            return [], None
+        more = len(rows) > limit
+        rows = rows[:limit]
+        msgs = [self._to_message(role, content, ts, row_id, tokens) for row_id, role, content, ts, tokens in reversed(rows)]
+        return msgs, (rows[-1][0] if more else None)
+
     def get_session_info(self, session_id: str) -> Optional[ConversationSession]:
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''SELECT session_id, user_id, created_at, updated_at, message_count, metadata FROM conversations WHERE session_id = ?''', (session_id,))
-                row = cursor.fetchone()
+            row, pending = self._read_with_queued(
+                session_id,
+                lambda conn: conn.execute('''SELECT session_id, user_id, created_at, updated_at, message_count, metadata FROM conversations WHERE session_id = ?''', (session_id,)).fetchone(),
+                lambda row, queued: (row, queued),
+            )
             if not row:
                 return None
             sid, uid, created, updated, count, metadata = row
+            count += len(pending)
+            if pending:
+                updated = pending[-1][2]
             from datetime import datetime as dt
             try:
                 created_dt = dt.fromisoformat(created)
@@ -89,3 +379,115 @@ class MemoryManager:
         except Exception as e:
             logger.error(f"get_session_info error: {e}")
             return None
+
+    # ---------- retention ----------
+    def idle_sessions(self, cutoff: str, limit: int) -> List[str]:
+        """Up to `limit` sessions last updated before `cutoff` ("YYYY-MM-DD HH:MM:SS" UTC), oldest first."""
+        with self._lock:
+            busy = {sid for sid, _, _ in self._inflight + self._pending}
+        rows = self._conn().execute('''SELECT session_id FROM conversations WHERE updated_at < ? ORDER BY updated_at LIMIT ?''', (cutoff, limit + len(busy))).fetchall()
+        return [sid for (sid,) in rows if sid not in busy][:limit]
+
+    def export_sessions(self, session_ids: List[str]) -> List[Dict[str, Any]]:
+        """Full rows of the given sessions and their messages, for archiving."""
+        conn = self._conn()
+        out = []
+        for sid in session_ids:
+            row = conn.execute('''SELECT session_id, user_id, created_at, updated_at, message_count, metadata, summary, summary_upto_id FROM conversations WHERE session_id = ?''', (sid,)).fetchone()
+            if not row:
+                continue
+            messages = conn.execute('''SELECT id, role, content, timestamp, tokens FROM messages WHERE session_id = ? ORDER BY id''', (sid,)).fetchall()
+            out.append({
+                "session_id": row[0], "user_id": row[1], "created_at": row[2], "updated_at": row[3],
+                "message_count": row[4], "metadata": json.loads(row[5] or "{}"),
+                "summary": row[6] or "", "summary_upto_id": row[7] or 0,
+                "messages": [
+                    {"id": m[0], "role": m[1], "content": m[2], "timestamp": m[3], "tokens": m[4]}
+                    for m in messages
+                ],
+            })
+        return out
+
+    def delete_sessions(self, session_ids: List[str], cutoff: str) -> Tuple[int, int]:
+        """
+        Delete sessions that are still idle (updated before `cutoff`, nothing queued) in one
+        transaction. Returns (sessions, messages) deleted. A session that became active again
+        since it was exported stays (its archive copy is then just a snapshot).
+        """
+        if not session_ids:
+            return 0, 0
+        # no batch can be flushed while the idle check and the delete run
+        with self._flush_lock:
+            with self._lock:
+                busy = {sid for sid, _, _ in self._pending}
+            candidates = [sid for sid in session_ids if sid not in busy]
+            if not candidates:
+                return 0, 0
+            marks = ",".join("?" * len(candidates))
+            with self._conn() as conn:
+                idle = [sid for (sid,) in conn.execute(f'''SELECT session_id FROM conversations WHERE session_id IN ({marks}) AND updated_at < ?''', (*candidates, cutoff))]
+                if not idle:
+                    return 0, 0
+                marks = ",".join("?" * len(idle))
+                messages = conn.execute(f'''DELETE FROM messages WHERE session_id IN ({marks})''', idle).rowcount
+                conn.execute(f'''DELETE FROM conversations WHERE session_id IN ({marks})''', idle)
+            with self._lock:
+                for sid in idle:
+                    self._drop_window(sid)
+        return len(idle), messages
+
+    def reclaim_space(self):
+        """Return free pages to the OS and truncate the WAL."""
+        conn = self._conn()
+        # executescript steps the pragma to completion (execute() frees only one page)
+        conn.executescript("PRAGMA incremental_vacuum;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def disk_bytes(self) -> int:
+        """Database file plus its WAL, in bytes."""
+        total = 0
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                total += Path(path).stat().st_size
+            except OSError:
+                pass
+        return total
+
+    # ---------- rolling summary (SessionStore hooks) ----------
+    @staticmethod
+    def _read_summary(conn: sqlite3.Connection, session_id: str) -> Tuple[str, int, int]:
+        row = conn.execute('''SELECT summary, summary_upto_id, summary_tokens FROM conversations WHERE session_id = ?''', (session_id,)).fetchone()
+        if not row:
+            return ("", 0, 0)
+        return (row[0] or "", row[1] or 0, row[2] or 0)
+
+    def get_summary(self, session_id: str) -> Tuple[str, int, int]:
+        with self._lock:
+            cached = self._summaries.get(session_id)
+        if cached is not None:
+            return cached
+        try:
+            return self._read_summary(self._conn(), session_id)
+        except Exception as e:
+            logger.error(f"get_summary error: {e}")
+            return ("", 0, 0)
+
+    def set_summary(self, session_id: str, summary: str, upto_id: int, tokens: int):
+        with self._conn() as conn:
+            conn.execute('''UPDATE conversations SET summary = ?, summary_upto_id = ?, summary_tokens = ? WHERE session_id = ?''', (summary, upto_id, tokens, session_id))
+        with self._lock:
+            if session_id in self._windows:
+                self._summaries[session_id] = (summary, upto_id, tokens)
+
+    def _unsummarized_count(self, session_id: str, upto_id: int) -> int:
+        # checked after every turn: count, don't read the messages
+        return self._read_with_queued(
+            session_id,
+            lambda conn: conn.execute('''SELECT COUNT(*) FROM messages WHERE session_id = ? AND id > ?''', (session_id, upto_id)).fetchone()[0],
+            lambda stored, queued: stored + len(queued),
+        )
+
+    def messages_after(self, session_id: str, upto_id: int) -> List[ChatMessage]:
+        self.flush()  # queued messages get their ids
+        rows = self._conn().execute('''SELECT id, role, content, timestamp, tokens FROM messages WHERE session_id = ? AND id > ? ORDER BY id''', (session_id, upto_id)).fetchall()
+        return [self._to_message(role, content, ts, row_id, tokens) for row_id, role, content, ts, tokens in rows]
@@ -0,0 +1,177 @@
+# ivf_backend/services/ocr_service.py
+
+import asyncio
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from PIL import Image, ImageOps, ImageSequence
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+try:
+    import fitz  # PyMuPDF — rasterises scanned PDF pages
+except ImportError:
+    fitz = None
+
+
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"]
+
+
+# ---------------------------------------------------------
+# Worker-side helpers (run inside the process pool, must stay picklable)
+# ---------------------------------------------------------
+def _otsu_threshold(histogram: List[int]) -> int:
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+    sum_bg, weight_bg = 0.0, 0
+    best, threshold = -1.0, 127
+
+    for i, h in enumerate(histogram):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * h
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+
+    return threshold
+
+
+def _preprocess(img: Image.Image) -> Image.Image:
+    """Grayscale → downsample oversized photos → Otsu binarisation."""
+    img = ImageOps.exif_transpose(img).convert("L")
+
+    max_side = settings.OCR_MAX_SIDE
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    threshold = _otsu_threshold(img.histogram())
+    return img.point(lambda p: 255 if p > threshold else 0, mode="1")
+
+
+def _ocr_page(page_bytes: bytes) -> str:
+    img = Image.open(io.BytesIO(page_bytes))
+    return pytesseract.image_to_string(_preprocess(img), lang=settings.OCR_LANG)
+
+
+# ---------------------------------------------------------
+class OCRService:
+    """
+    OCR for image lab reports, multi-page TIFFs and scanned PDFs.
+    - tesseract runs in a process pool, pages in parallel
+    - results cached by page-image hash
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or settings.OCR_MAX_WORKERS
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._cache_max = settings.OCR_CACHE_SIZE
+
+    @property
+    def available(self) -> bool:
+        return pytesseract is not None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # created lazily so importing/starting the app never forks workers nobody uses
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    # ---------------------------------------------------------
+    # Cache
+    # ---------------------------------------------------------
+    def _cache_get(self, key: str) -> Optional[str]:
+        if key in self._cache:
+            val = self._cache.pop(key)
+            self._cache[key] = val
+            return val
+        return None
+
+    def _cache_set(self, key: str, val: str):
+        self._cache[key] = val
+        if len(self._cache) > self._cache_max:
+            self._cache.popitem(last=False)
+
+    # ---------------------------------------------------------
+    # Page splitting
+    # ---------------------------------------------------------
+    @staticmethod
+    def _split_pages(data: bytes, file_ext: str) -> List[bytes]:
+        """Return one encoded image per page."""
+        if file_ext == ".pdf":
+            if fitz is None:
+                raise RuntimeError("PyMuPDF not installed — cannot OCR scanned PDFs")
+            pages = []
+            with fitz.open(stream=data, filetype="pdf") as doc:
+                for page in doc:
+                    pages.append(page.get_pixmap(dpi=settings.OCR_PDF_DPI).tobytes("png"))
+            return pages
+
+        img = Image.open(io.BytesIO(data))
+        if getattr(img, "n_frames", 1) <= 1:
+            return [data]
+
+        pages = []
+        for frame in ImageSequence.Iterator(img):
+            buf = io.BytesIO()
+            frame.save(buf, format="PNG")
+            pages.append(buf.getvalue())
+        return pages
+
+    # ---------------------------------------------------------
+    # Main entrypoint
+    # ---------------------------------------------------------
+    async def extract_text(self, data: bytes, file_ext: str) -> Dict[str, Any]:
+        if not self.available:
+            raise RuntimeError("pytesseract not installed — OCR unavailable")
+
+        pages = await asyncio.to_thread(self._split_pages, data, file_ext)
+        keys = [hashlib.sha256(p).hexdigest() for p in pages]
+
+        texts: List[Optional[str]] = [self._cache_get(k) for k in keys]
+        pending = [i for i, t in enumerate(texts) if t is None]
+
+        if pending:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            results = await asyncio.gather(
+                *(loop.run_in_executor(executor, _ocr_page, pages[i]) for i in pending)
+            )
+            for i, text in zip(pending, results):
+                texts[i] = text
+                self._cache_set(keys[i], text)
+
+        logger.info(f"OCR: {len(pages)} pages ({len(pages) - len(pending)} cached)")
+        return {
+            "text": "\n".join(t.strip() for t in texts if t and t.strip()),
+            "page_count": len(pages),
+            "cached_pages": len(pages) - len(pending),
+        }
@@ -1,8 +1,10 @@
 # ivf_backend/services/rag_engine.py
 
 import json
+import time
 import logging
 import copy
+import threading
 from typing import List, Dict, Any, Optional
 from collections import OrderedDict
 import faiss
@@ -49,12 +51,19 @@ class RAGEngine:
         # Supabase
         self.supabase_client = None
 
-        # Caches
+        # Caches (shared by the chat worker threads: each one has its own lock)
         self._emb_cache: OrderedDict[str, np.ndarray] = OrderedDict()
         self._emb_cache_max = 256
+        self._emb_lock = threading.Lock()
 
         self._query_cache: OrderedDict[str, List[Dict[str, Any]]] = OrderedDict()
         self._query_cache_max = 512
+        self._query_lock = threading.Lock()
+
+        # full chunks retrieved ahead of time (speculatively, while the user is still speaking)
+        self._prefetched: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._prefetched_max = 64
+        self._prefetched_lock = threading.Lock()
 
         self._initialize_components()
 
@@ -140,20 +149,30 @@ class RAGEngine:
             raise ValueError("Embedding model not initialized.")
 
         # Cache hit
-        if text in self._emb_cache:
-            emb = self._emb_cache.pop(text)
-            self._emb_cache[text] = emb
-            return emb
+        with self._emb_lock:
+            if text in self._emb_cache:
+                self._emb_cache.move_to_end(text)
+                return self._emb_cache[text]
 
+        # encode outside the lock: concurrent misses for other texts must not queue behind it
         emb = self.embedding_model.encode([text], normalize_embeddings=True)
         arr = np.array(emb, dtype=np.float32)
 
-        self._emb_cache[text] = arr
-        if len(self._emb_cache) > self._emb_cache_max:
-            self._emb_cache.popitem(last=False)
+        with self._emb_lock:
+            self._emb_cache[text] = arr
+            if len(self._emb_cache) > self._emb_cache_max:
+                self._emb_cache.popitem(last=False)
 
         return arr
 
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Batch-encode texts without touching the query embedding cache."""
+        if not self.embedding_model:
+            raise ValueError("Embedding model not initialized.")
+
+        emb = self.embedding_model.encode(texts, normalize_embeddings=True)
+        return np.array(emb, dtype=np.float32)
+
     # ---------------------------------------------------------
     # Query cache
     # ---------------------------------------------------------
@@ -161,18 +180,43 @@ class RAGEngine:
         return f"{query.strip().lower()}||{top_k}"
 
     def _get_cached_results(self, key: str):
-        if key in self._query_cache:
-            v = self._query_cache.pop(key)
-            self._query_cache[key] = v
-            return copy.deepcopy(v)
-        return None
+        with self._query_lock:
+            if key not in self._query_cache:
+                return None
+            self._query_cache.move_to_end(key)
+            v = self._query_cache[key]
+        return copy.deepcopy(v)
 
     def _set_cached_results(self, key: str, results: List[Dict[str, Any]]):
         light = [{"id": r["id"], "similarity_score": r["similarity_score"]} for r in results]
-        self._query_cache[key] = light
+        with self._query_lock:
+            self._query_cache[key] = light
+            if len(self._query_cache) > self._query_cache_max:
+                self._query_cache.popitem(last=False)
 
-        if len(self._query_cache) > self._query_cache_max:
-            self._query_cache.popitem(last=False)
+    # ---------------------------------------------------------
+    # Prefetched results (one-shot, short-lived)
+    # ---------------------------------------------------------
+    def prime(self, query: str, chunks: List[Dict[str, Any]], top_k: int = None):
+        """Hand results retrieved ahead of time to the next search for `query`."""
+        key = query.strip().lower()
+        entry = {
+            "chunks": copy.deepcopy(chunks),
+            "top_k": top_k or settings.SIMILARITY_TOP_K,
+            "expires": time.monotonic() + settings.RAG_PREFETCH_TTL_SECONDS,
+        }
+        with self._prefetched_lock:
+            self._prefetched[key] = entry
+            self._prefetched.move_to_end(key)
+            if len(self._prefetched) > self._prefetched_max:
+                self._prefetched.popitem(last=False)
+
+    def _take_prefetched(self, query: str, top_k: int) -> Optional[List[Dict[str, Any]]]:
+        with self._prefetched_lock:
+            entry = self._prefetched.pop(query.strip().lower(), None)
+        if entry is None or entry["expires"] < time.monotonic() or entry["top_k"] < top_k:
+            return None
+        return entry["chunks"][:top_k]
 
     # ---------------------------------------------------------
     # MAIN SEARCH – IVF RESTRICTION APPLIED HERE 🔥
@@ -188,6 +232,10 @@ class RAGEngine:
         if top_k is None:
             top_k = settings.SIMILARITY_TOP_K
 
+        prefetched = self._take_prefetched(query, top_k)
+        if prefetched is not None:
+            return prefetched
+
         key = self._cache_key(query, top_k)
 
         # Cache
@@ -0,0 +1,110 @@
+# ivf_backend/services/retention.py
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from ..config import settings
+from .memory_manager import MemoryManager
+
+logger = logging.getLogger(__name__)
+
+_FIRST_RUN_DELAY = 60  # seconds after startup, so the job never competes with warm-up
+
+
+class RetentionJob:
+    """
+    Moves sessions idle for RETENTION_IDLE_DAYS out of the conversation database.
+    Each batch of RETENTION_BATCH_SESSIONS sessions is appended to a gzip JSON-lines archive
+    (one gzip member per batch, fsynced) before it is deleted, so a crash never loses a session.
+    Afterwards incremental vacuum and a WAL checkpoint hand the freed pages back to the OS.
+    aclose() stops a run between batches and waits for it, so the store can be closed safely.
+    """
+
+    def __init__(self, memory: MemoryManager, archive_dir: Optional[str] = None):
+        self.memory = memory
+        self.archive_dir = Path(archive_dir or settings.RETENTION_ARCHIVE_DIR)
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._running: Optional[asyncio.Future] = None
+
+    def run_once(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=settings.RETENTION_IDLE_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+
+        self.memory.flush()
+        bytes_before = self.memory.disk_bytes()
+        archive = self.archive_dir / f"sessions-{now.strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+
+        sessions = messages = 0
+        while not self._stop.is_set():
+            ids = self.memory.idle_sessions(cutoff, settings.RETENTION_BATCH_SESSIONS)
+            if not ids:
+                break
+            exported = self.memory.export_sessions(ids)
+            self._append(archive, exported)
+            deleted_sessions, deleted_messages = self.memory.delete_sessions(ids, cutoff)
+            sessions += deleted_sessions
+            messages += deleted_messages
+            if deleted_sessions == 0:
+                break  # everything selected turned active again
+
+        if not self._stop.is_set():
+            self.memory.reclaim_space()
+        bytes_after = self.memory.disk_bytes()
+
+        report = {
+            "ran_at": now.isoformat(),
+            "cutoff": cutoff,
+            "sessions_archived": sessions,
+            "messages_archived": messages,
+            "archive_file": str(archive) if archive.exists() else None,
+            "archive_bytes": archive.stat().st_size if archive.exists() else 0,
+            "db_bytes_before": bytes_before,
+            "db_bytes_after": bytes_after,
+            "bytes_reclaimed": max(0, bytes_before - bytes_after),
+            "duration_s": round(time.perf_counter() - start, 3),
+            "stopped": self._stop.is_set(),
+        }
+        self.last_report = report
+        logger.info(
+            f"Retention: archived {sessions} sessions / {messages} messages, "
+            f"reclaimed {report['bytes_reclaimed']} bytes (db now {bytes_after} bytes)"
+        )
+        return report
+
+    def _append(self, archive: Path, sessions):
+        if not sessions:
+            return
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        lines = "".join(json.dumps(s, ensure_ascii=False) + "\n" for s in sessions)
+        # concatenated gzip members are one valid gzip stream (gzip.open reads them all)
+        with open(archive, "ab") as f:
+            f.write(gzip.compress(lines.encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def run_forever(self):
+        await asyncio.sleep(_FIRST_RUN_DELAY)
+        while not self._stop.is_set():
+            # shielded: cancelling this task must not orphan a run still using the store
+            self._running = asyncio.ensure_future(asyncio.to_thread(self.run_once))
+            try:
+                await asyncio.shield(self._running)
+            except Exception as e:
+                logger.exception(f"Retention job failed: {e}")
+            await asyncio.sleep(settings.RETENTION_INTERVAL_HOURS * 3600)
+
+    async def aclose(self):
+        """Stop after the current batch and wait for a run already in progress to finish."""
+        self._stop.set()
+        if self._running:
+            await asyncio.gather(self._running, return_exceptions=True)
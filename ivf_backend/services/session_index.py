@@ -0,0 +1,192 @@
+# ivf_backend/services/session_index.py
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Dict, Any, Optional
+
+import faiss
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _SessionEntry:
+    """FAISS index + chunk texts for one session's uploaded documents."""
+
+    def __init__(self, dim: int):
+        self.index = faiss.IndexFlatIP(dim)
+        self.chunks: List[Dict[str, str]] = []
+        self.nbytes = 0
+        self.touched = time.monotonic()
+
+
+class SessionDocumentIndex:
+    """
+    Ephemeral per-session vector index over user-uploaded documents.
+    - one small in-memory FAISS index per session
+    - LRU eviction by session count and total memory
+    - idle sessions expire after a TTL
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], np.ndarray],
+        query_embed_fn: Optional[Callable[[str], np.ndarray]] = None,
+        max_sessions: int = None,
+        ttl_seconds: int = None,
+        max_bytes: int = None,
+        max_chunks_per_session: int = None
+    ):
+        self._embed = embed_fn
+        # queries can go through a cached single-text encoder (e.g. RAGEngine.get_embedding)
+        self._embed_query = query_embed_fn or (lambda q: embed_fn([q]))
+        self.max_sessions = max_sessions or settings.SESSION_INDEX_MAX_SESSIONS
+        self.ttl_seconds = ttl_seconds or settings.SESSION_INDEX_TTL_SECONDS
+        self.max_bytes = max_bytes or settings.SESSION_INDEX_MAX_BYTES
+        self.max_chunks_per_session = max_chunks_per_session or settings.SESSION_INDEX_MAX_CHUNKS
+
+        self._sessions: OrderedDict[str, _SessionEntry] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    # ---------------------------------------------------------
+    # Write
+    # ---------------------------------------------------------
+    def add_document(self, session_id: str, chunks: List[str], source: str = "") -> int:
+        """Embed and index document chunks for a session. Returns the number of chunks added."""
+        chunks = [c for c in chunks if c and c.strip()]
+        if not session_id or not chunks:
+            return 0
+
+        # cheap pre-check so a full session is not embedded for nothing
+        room = self._room(session_id)
+        if room <= 0:
+            logger.warning(f"Session {session_id} document index is full; skipping {source}")
+            return 0
+        chunks = chunks[:room]
+
+        # embed outside the lock — this is the slow part
+        vectors = np.ascontiguousarray(self._embed(chunks), dtype=np.float32)
+
+        with self._lock:
+            # re-check: a concurrent upload to the same session may have filled it meanwhile
+            room = self._room(session_id)
+            if room <= 0:
+                logger.warning(f"Session {session_id} document index is full; skipping {source}")
+                return 0
+            chunks, vectors = chunks[:room], vectors[:room]
+
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = _SessionEntry(vectors.shape[1])
+                self._sessions[session_id] = entry
+
+            entry.index.add(vectors)
+            added_bytes = vectors.nbytes
+            for text in chunks:
+                entry.chunks.append({"text": text, "source": source})
+                added_bytes += len(text.encode("utf-8"))
+
+            entry.nbytes += added_bytes
+            entry.touched = time.monotonic()
+            self._total_bytes += added_bytes
+            self._sessions.move_to_end(session_id)
+            self._evict(keep=session_id)
+
+        logger.info(f"Indexed {len(chunks)} chunks from {source or 'document'} for session {session_id}")
+        return len(chunks)
+
+    # ---------------------------------------------------------
+    # Read
+    # ---------------------------------------------------------
+    def search(self, session_id: str, query: str, top_k: int = None) -> List[Dict[str, Any]]:
+        if top_k is None:
+            top_k = settings.SESSION_DOC_TOP_K
+
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            if self._expired(entry):
+                self._drop(session_id)
+                return []
+            entry.touched = time.monotonic()
+            self._sessions.move_to_end(session_id)
+
+        query_emb = np.ascontiguousarray(self._embed_query(query), dtype=np.float32)
+
+        with self._lock:
+            # the session may have been evicted while we were embedding
+            if self._sessions.get(session_id) is not entry:
+                return []
+            scores, indices = entry.index.search(query_emb, min(top_k, entry.index.ntotal))
+
+            results = []
+            for score, idx in zip(scores[0], indices[0]):
+                if idx == -1 or score < settings.SIMILARITY_THRESHOLD:
+                    continue
+                chunk = dict(entry.chunks[idx])
+                chunk["similarity_score"] = float(score)
+                results.append(chunk)
+            return results
+
+    def has_documents(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return entry is not None and not self._expired(entry)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "chunks": sum(len(e.chunks) for e in self._sessions.values()),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # ---------------------------------------------------------
+    # Eviction (callers hold the lock)
+    # ---------------------------------------------------------
+    def _room(self, session_id: str) -> int:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return self.max_chunks_per_session - (len(entry.chunks) if entry else 0)
+
+    def _expired(self, entry: _SessionEntry) -> bool:
+        return time.monotonic() - entry.touched > self.ttl_seconds
+
+    def _drop(self, session_id: str):
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._total_bytes -= entry.nbytes
+
+    def _evict(self, keep: Optional[str] = None):
+        for sid in [sid for sid, e in self._sessions.items() if self._expired(e)]:
+            self._drop(sid)
+
+        while len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break
+            logger.info(f"Evicting document index for session {oldest}")
+            self._drop(oldest)
+
+    # ---------------------------------------------------------
+    def format_context(self, chunks: List[Dict[str, Any]]) -> str:
+        if not chunks:
+            return ""
+
+        lines = ["From the user's uploaded documents:"]
+        for i, c in enumerate(chunks, start=1):
+            source = f" [{c['source']}]" if c.get("source") else ""
+            lines.append(f"\n{i}.{source} {c.get('text', '')}")
+
+        return "\n".join(lines)
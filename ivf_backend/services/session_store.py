@@ -0,0 +1,483 @@
+# ivf_backend/services/session_store.py
+
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple, Dict, Any, Callable
+
+from ..config import settings
+from ..models.chat_models import ChatMessage, ConversationSession
+from .tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+Summarizer = Callable[[str, List[Dict[str, str]]], Optional[str]]
+
+
+def _utc_now() -> str:
+    # same text format as SQLite's datetime('now')
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _parse_ts(ts: str) -> datetime:
+    try:
+        return datetime.fromisoformat(ts)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+
+# ---------------------------------------------------------
+# Interface
+# ---------------------------------------------------------
+class SessionStore(ABC):
+    """
+    Conversation storage used by the chat pipeline. Backends store sessions and messages
+    (message ids increase within a session) and a rolling summary per session; summary
+    scheduling and prompt history are shared here.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        # summaries call the LLM; one worker keeps them off the request path and serialized
+        self._summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+        self._summarizing: set = set()
+        self._summarizing_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "SessionStore":
+        """Backend chosen by SESSION_STORE (sqlite | redis | memory); SQLite when Redis is unusable."""
+        kind = settings.SESSION_STORE
+        if kind == "memory":
+            return KVSessionStore(InProcessKV())
+        if kind == "redis":
+            if redis is None:
+                logger.error("SESSION_STORE=redis but the redis package is not installed — using SQLite.")
+            else:
+                try:
+                    client = redis.Redis.from_url(
+                        settings.REDIS_URL, decode_responses=True,
+                        socket_timeout=settings.REDIS_TIMEOUT, socket_connect_timeout=settings.REDIS_TIMEOUT
+                    )
+                    client.ping()
+                    return KVSessionStore(client)
+                except Exception as e:
+                    logger.error(f"Redis session store unavailable ({e}) — using SQLite.")
+
+        from .memory_manager import MemoryManager
+        return MemoryManager()
+
+    # ---------- backend operations ----------
+    @abstractmethod
+    def create_session(self, session_id: str, user_id: Optional[str] = None) -> bool:
+        ...
+
+    @abstractmethod
+    def add_message(self, session_id: str, role: str, content: str) -> bool:
+        ...
+
+    @abstractmethod
+    def get_conversation_history(self, session_id: str, limit: int = 10) -> List[ChatMessage]:
+        ...
+
+    @abstractmethod
+    def get_session_info(self, session_id: str) -> Optional[ConversationSession]:
+        ...
+
+    @abstractmethod
+    def get_messages_page(self, session_id: str, before: Optional[int] = None, limit: int = 50) -> Tuple[List[ChatMessage], Optional[int]]:
+        """One page of messages older than id `before` (newest page when None), oldest first, plus the next cursor."""
+
+    @abstractmethod
+    def get_summary(self, session_id: str) -> Tuple[str, int, int]:
+        """(summary, last summarized message id, summary tokens)."""
+
+    @abstractmethod
+    def set_summary(self, session_id: str, summary: str, upto_id: int, tokens: int):
+        ...
+
+    @abstractmethod
+    def messages_after(self, session_id: str, upto_id: int) -> List[ChatMessage]:
+        """Stored messages with id > upto_id, oldest first, ids set."""
+
+    def _unsummarized_count(self, session_id: str, upto_id: int) -> int:
+        return len(self.messages_after(session_id, upto_id))
+
+    def flush(self) -> int:
+        return 0
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    def close(self):
+        self._summarizer.shutdown(wait=True, cancel_futures=True)
+
+    # ---------- prompt history + rolling summary ----------
+    def get_prompt_history(self, session_id: str) -> Tuple[str, int, List[ChatMessage]]:
+        """
+        (summary, summary tokens, recent messages not covered by the summary), oldest first.
+        The caller fits them into its token budget.
+        """
+        msgs = self.get_conversation_history(session_id, limit=settings.MEMORY_WINDOW_SIZE)
+        text, upto, tokens = self.get_summary(session_id)
+        recent = [m for m in msgs if m.message_id is None or int(m.message_id) > upto]
+        return text, tokens, recent
+
+    def schedule_summary(self, session_id: str, summarize: Summarizer):
+        """Queue a background summary check for the session (cheap when nothing is due)."""
+        with self._summarizing_lock:
+            if session_id in self._summarizing:
+                return
+            self._summarizing.add(session_id)
+        try:
+            self._summarizer.submit(self._summarize_guarded, session_id, summarize)
+        except RuntimeError:  # executor already shut down
+            with self._summarizing_lock:
+                self._summarizing.discard(session_id)
+
+    def _summarize_guarded(self, session_id: str, summarize: Summarizer):
+        try:
+            self.maybe_summarize(session_id, summarize)
+        except Exception as e:
+            logger.error(f"Summary error for {session_id}: {e}")
+        finally:
+            with self._summarizing_lock:
+                self._summarizing.discard(session_id)
+
+    def maybe_summarize(self, session_id: str, summarize: Summarizer) -> bool:
+        """
+        Fold older messages into the session summary once SUMMARY_EVERY_TURNS turns have piled up
+        beyond the SUMMARY_KEEP_MESSAGES most recent ones. `summarize(previous_summary, messages)`
+        returns the new summary text (None keeps the old one). Returns True when the summary moved.
+        """
+        keep = settings.SUMMARY_KEEP_MESSAGES
+        due = keep + 2 * settings.SUMMARY_EVERY_TURNS
+
+        previous, upto, _ = self.get_summary(session_id)
+        if self._unsummarized_count(session_id, upto) < due:
+            return False
+
+        msgs = self.messages_after(session_id, upto)
+        fold = msgs[:-keep] if keep else msgs
+        if not fold:
+            return False
+
+        text = summarize(previous, [
+            {"role": getattr(m.role, "value", m.role), "content": m.content} for m in fold
+        ])
+        if not text:
+            return False
+        text = text.strip()
+        tokens = estimate_tokens(text)
+        self.set_summary(session_id, text, int(fold[-1].message_id), tokens)
+        logger.info(f"Summarized {len(fold)} messages of {session_id} ({tokens} tokens)")
+        return True
+
+
+# ---------------------------------------------------------
+# Networked key-value backend (Redis)
+# ---------------------------------------------------------
+class KVSessionStore(SessionStore):
+    """
+    Sessions in a shared key-value store, so any node can serve any session.
+      {prefix}:{session_id}:meta  hash — user_id, created_at, updated_at, message_count, seq, summary fields
+      {prefix}:{session_id}:msgs  list — JSON messages, capped at SESSION_MAX_MESSAGES
+    Both keys expire SESSION_TTL_SECONDS after the last write, which is the retention policy here;
+    history and pages only reach back as far as the capped list.
+    Works against a redis-py client (decode_responses=True) or InProcessKV.
+    """
+
+    name = "kv"
+
+    def __init__(self, client, prefix: str = None, ttl: int = None, max_messages: int = None):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix or settings.SESSION_KEY_PREFIX
+        self.ttl = ttl or settings.SESSION_TTL_SECONDS
+        # messages must not fall off the list before the summary has folded them in
+        floor = settings.SUMMARY_KEEP_MESSAGES + 2 * settings.SUMMARY_EVERY_TURNS + 2
+        self.max_messages = max(max_messages or settings.SESSION_MAX_MESSAGES, settings.MEMORY_WINDOW_SIZE, floor)
+
+    def _meta(self, session_id: str) -> str:
+        return f"{self.prefix}:{session_id}:meta"
+
+    def _msgs(self, session_id: str) -> str:
+        return f"{self.prefix}:{session_id}:msgs"
+
+    def _touch(self, pipe, session_id: str):
+        pipe.expire(self._meta(session_id), self.ttl)
+        pipe.expire(self._msgs(session_id), self.ttl)
+
+    @staticmethod
+    def _decode(raw: str) -> ChatMessage:
+        m = json.loads(raw)
+        return ChatMessage(
+            role=m["role"], content=m["content"], timestamp=_parse_ts(m["timestamp"]),
+            message_id=str(m["id"]), tokens=m.get("tokens")
+        )
+
+    def _all(self, session_id: str) -> List[ChatMessage]:
+        return [self._decode(raw) for raw in self.client.lrange(self._msgs(session_id), 0, -1)]
+
+    def create_session(self, session_id: str, user_id: Optional[str] = None) -> bool:
+        try:
+            meta, now = self._meta(session_id), _utc_now()
+            pipe = self.client.pipeline()
+            pipe.hsetnx(meta, "created_at", now)
+            pipe.hsetnx(meta, "updated_at", now)
+            pipe.hsetnx(meta, "message_count", 0)
+            if user_id:
+                pipe.hsetnx(meta, "user_id", user_id)
+            self._touch(pipe, session_id)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"create_session error: {e}")
+            return False
+
+    def add_message(self, session_id: str, role: str, content: str) -> bool:
+        meta, ts, tokens = self._meta(session_id), _utc_now(), estimate_tokens(content)
+
+        # the id is allocated and the message pushed in one WATCH/MULTI transaction (retried when
+        # another node wrote the session in between), so list order always matches id order
+        def write(pipe):
+            msg_id = int(pipe.hget(meta, "seq") or 0) + 1
+            pipe.multi()
+            pipe.rpush(self._msgs(session_id), json.dumps({
+                "id": msg_id, "role": role, "content": content, "timestamp": ts, "tokens": tokens,
+            }))
+            pipe.ltrim(self._msgs(session_id), -self.max_messages, -1)
+            pipe.hset(meta, mapping={"seq": msg_id, "updated_at": ts})
+            pipe.hincrby(meta, "message_count", 1)
+            self._touch(pipe, session_id)
+
+        try:
+            self.client.transaction(write, meta)
+            return True
+        except Exception as e:
+            logger.error(f"add_message error: {e}")
+            return False
+
+    def get_conversation_history(self, session_id: str, limit: int = 10) -> List[ChatMessage]:
+        if limit <= 0:
+            return []
+        try:
+            return [self._decode(raw) for raw in self.client.lrange(self._msgs(session_id), -limit, -1)]
+        except Exception as e:
+            logger.error(f"get_conversation_history error: {e}")
+            return []
+
+    def get_session_info(self, session_id: str) -> Optional[ConversationSession]:
+        try:
+            data = self.client.hgetall(self._meta(session_id))
+        except Exception as e:
+            logger.error(f"get_session_info error: {e}")
+            return None
+        if not data:
+            return None
+        return ConversationSession(
+            session_id=session_id, user_id=data.get("user_id"),
+            created_at=_parse_ts(data.get("created_at")), updated_at=_parse_ts(data.get("updated_at")),
+            message_count=int(data.get("message_count", 0)), metadata=json.loads(data.get("metadata", "{}"))
+        )
+
+    def get_messages_page(self, session_id: str, before: Optional[int] = None, limit: int = 50) -> Tuple[List[ChatMessage], Optional[int]]:
+        try:
+            msgs = self._all(session_id)  # capped, so this is bounded
+        except Exception as e:
+            logger.error(f"get_messages_page error: {e}")
+            return [], None
+        if before is not None:
+            msgs = [m for m in msgs if int(m.message_id) < before]
+        page = msgs[-limit:]
+        return page, (int(page[0].message_id) if len(msgs) > limit else None)
+
+    def get_summary(self, session_id: str) -> Tuple[str, int, int]:
+        try:
+            summary, upto, tokens = self.client.hmget(self._meta(session_id), ["summary", "summary_upto_id", "summary_tokens"])
+        except Exception as e:
+            logger.error(f"get_summary error: {e}")
+            return ("", 0, 0)
+        return (summary or "", int(upto or 0), int(tokens or 0))
+
+    def set_summary(self, session_id: str, summary: str, upto_id: int, tokens: int):
+        pipe = self.client.pipeline()
+        pipe.hset(self._meta(session_id), mapping={"summary": summary, "summary_upto_id": upto_id, "summary_tokens": tokens})
+        self._touch(pipe, session_id)
+        pipe.execute()
+
+    def messages_after(self, session_id: str, upto_id: int) -> List[ChatMessage]:
+        return [m for m in self._all(session_id) if int(m.message_id) > upto_id]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "ttl_seconds": self.ttl, "max_messages": self.max_messages}
+
+    def close(self):
+        super().close()
+        close = getattr(self.client, "close", None)
+        if close:
+            close()
+
+
+# ---------------------------------------------------------
+# In-process stand-in for Redis (single node, tests)
+# ---------------------------------------------------------
+class InProcessKV:
+    """
+    The subset of redis-py commands KVSessionStore uses, over dicts (string values, like a
+    client with decode_responses=True). Keys expire; pipelines run atomically under one lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+
+    def _get(self, name: str, factory=None):
+        deadline = self._expires.get(name)
+        if deadline is not None and deadline <= time.monotonic():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+        if name not in self._data and factory is not None:
+            self._data[name] = factory()
+        return self._data.get(name)
+
+    @staticmethod
+    def _span(n: int, start: int, end: int) -> slice:
+        # Redis ranges: inclusive end, negative indices count from the tail
+        start = max(start + n if start < 0 else start, 0)
+        end = end + n if end < 0 else min(end, n - 1)
+        return slice(start, end + 1) if start <= end else slice(0, 0)
+
+    # ---------- hashes ----------
+    def hsetnx(self, name: str, key: str, value) -> int:
+        with self._lock:
+            h = self._get(name, dict)
+            if key in h:
+                return 0
+            h[key] = str(value)
+            return 1
+
+    def hset(self, name: str, key: str = None, value=None, mapping: Dict[str, Any] = None) -> int:
+        with self._lock:
+            h = self._get(name, dict)
+            items = dict(mapping or {})
+            if key is not None:
+                items[key] = value
+            added = sum(1 for k in items if k not in h)
+            h.update({k: str(v) for k, v in items.items()})
+            return added
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            return (self._get(name) or {}).get(key)
+
+    def hmget(self, name: str, keys: List[str]) -> List[Optional[str]]:
+        with self._lock:
+            h = self._get(name) or {}
+            return [h.get(k) for k in keys]
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._get(name) or {})
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        with self._lock:
+            h = self._get(name, dict)
+            h[key] = str(int(h.get(key, 0)) + amount)
+            return int(h[key])
+
+    # ---------- lists ----------
+    def rpush(self, name: str, *values) -> int:
+        with self._lock:
+            lst = self._get(name, list)
+            lst.extend(str(v) for v in values)
+            return len(lst)
+
+    def ltrim(self, name: str, start: int, end: int) -> bool:
+        with self._lock:
+            lst = self._get(name)
+            if lst is not None:
+                self._data[name] = lst[self._span(len(lst), start, end)]
+            return True
+
+    def lrange(self, name: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            lst = self._get(name) or []
+            return lst[self._span(len(lst), start, end)]
+
+    # ---------- keys ----------
+    def expire(self, name: str, time_s: int) -> bool:
+        with self._lock:
+            if self._get(name) is None:
+                return False
+            self._expires[name] = time.monotonic() + time_s
+            return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            removed = 0
+            for name in names:
+                removed += self._get(name) is not None
+                self._data.pop(name, None)
+                self._expires.pop(name, None)
+            return removed
+
+    def ping(self) -> bool:
+        return True
+
+    def pipeline(self, transaction: bool = True) -> "_InProcessPipeline":
+        return _InProcessPipeline(self)
+
+    def transaction(self, func, *watches: str) -> List[Any]:
+        """redis-py's optimistic-transaction helper; here the whole call simply runs under the lock."""
+        with self._lock:
+            pipe = self.pipeline()
+            pipe.watch(*watches)
+            func(pipe)
+            return pipe.execute()
+
+    def close(self):
+        pass
+
+
+class _InProcessPipeline:
+    """
+    Queues commands; execute() runs them under the store lock and returns their results.
+    Like redis-py, commands run immediately between watch() and multi().
+    """
+
+    def __init__(self, kv: InProcessKV):
+        self._kv = kv
+        self._calls = []
+        self._immediate = False
+
+    def watch(self, *names: str):
+        self._immediate = True
+
+    def multi(self):
+        self._immediate = False
+
+    def __getattr__(self, command: str):
+        fn = getattr(self._kv, command)
+        if self._immediate:
+            return fn
+
+        def queue(*args, **kwargs):
+            self._calls.append((fn, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List[Any]:
+        with self._kv._lock:
+            calls, self._calls = self._calls, []
+            return [fn(*args, **kwargs) for fn, args, kwargs in calls]
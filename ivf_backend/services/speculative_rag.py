@@ -0,0 +1,197 @@
+# ivf_backend/services/speculative_rag.py
+
+import asyncio
+import difflib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List
+
+from ..config import settings
+from .rag_engine import RAGEngine
+
+logger = logging.getLogger(__name__)
+
+# re-runs outlive the stream that started them
+_background = set()
+
+
+class _SearchPool:
+    """
+    Dedicated threads for speculative searches, so they never compete with the chat pipeline and
+    STT on the default executor. A started search cannot be stopped, so `running` counts threads
+    until they actually finish (not until their awaiting task is cancelled).
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        self.running = 0
+
+    @property
+    def busy(self) -> bool:
+        with self._lock:
+            return self.running >= self.workers
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        with self._lock:
+            self.running += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return asyncio.wrap_future(future)
+
+    def _done(self, _future):
+        with self._lock:
+            self.running -= 1
+
+
+_pool = _SearchPool(settings.STT_SPECULATE_WORKERS)
+
+
+class SpeculationMetrics:
+    """How often retrieval started on a partial transcript could be reused for the final one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.started = 0
+        self.superseded = 0   # a newer stable partial replaced one still waiting to be searched
+        self.hits = 0         # final transcript close enough, speculative results reused
+        self.misses = 0       # final transcript diverged, retrieval re-run
+        self.ready = 0        # hits whose results were already complete when speech ended
+
+    def record(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            resolved = self.hits + self.misses
+            return {
+                "streams": self.streams,
+                "started": self.started,
+                "superseded": self.superseded,
+                "hits": self.hits,
+                "misses": self.misses,
+                "ready": self.ready,
+                "hit_rate": round(self.hits / resolved, 4) if resolved else None,
+                "ready_rate": round(self.ready / resolved, 4) if resolved else None,
+            }
+
+
+def _words(text: str) -> List[str]:
+    return (text or "").lower().split()
+
+
+class SpeculativeRetriever:
+    """
+    Per voice stream: starts RAG retrieval on stable partial transcripts so context is ready when
+    speech ends. On the final transcript the speculation is reused if the query barely changed,
+    otherwise retrieval is re-run; either way the results are primed on the RAG engine for the
+    chat request that follows.
+    At most one search per stream is in flight, on a small dedicated pool: stable partials that
+    arrive meanwhile collapse into the newest one, which is searched when the pool is free.
+    """
+
+    def __init__(self, rag: RAGEngine, metrics: SpeculationMetrics):
+        self.rag = rag
+        self.metrics = metrics
+        self.top_k = settings.SIMILARITY_TOP_K
+
+        self._stable = 0
+        self._query: Optional[str] = None          # query of the search in _task
+        self._task: Optional[asyncio.Future] = None
+        self._waiting: Optional[str] = None        # newest stable partial not yet searched
+
+        metrics.record("streams")
+
+    def observe(self, event: Dict[str, Any], text: str):
+        """
+        Called after every audio chunk with the recognizer event and the running transcript.
+        A finished Vosk segment (a pause) or a partial unchanged for STT_SPECULATE_STABLE_CHUNKS
+        chunks counts as stable.
+        """
+        self._launch()  # a partial held back while the pool was busy
+
+        if event["type"] == "result":
+            stable = True
+        else:
+            if event.get("changed", True):
+                self._stable = 0
+            else:
+                self._stable += 1
+            stable = self._stable + 1 >= settings.STT_SPECULATE_STABLE_CHUNKS
+
+        text = text.strip()
+        if not stable or len(_words(text)) < settings.STT_SPECULATE_MIN_WORDS:
+            return
+        latest = self._waiting if self._waiting is not None else self._query
+        if latest is not None and _words(text) == _words(latest):
+            return
+        self._start(text)
+
+    def _start(self, query: str):
+        if self._waiting is not None:
+            self.metrics.record("superseded")
+        self._waiting = query
+        self._launch()
+
+    def _launch(self):
+        """Search the waiting partial unless this stream's search is still running or the pool is full."""
+        if self._waiting is None or (self._task is not None and not self._task.done()) or _pool.busy:
+            return
+        self._query, self._waiting = self._waiting, None
+        self._task = _pool.submit(self.rag.search_similar_chunks, self._query, self.top_k)
+        self._task.add_done_callback(lambda _: self._launch())
+        self.metrics.record("started")
+
+    def _similar(self, final: str) -> bool:
+        ratio = difflib.SequenceMatcher(None, _words(self._query), _words(final)).ratio()
+        return ratio >= settings.STT_SPECULATE_MIN_SIMILARITY
+
+    async def resolve(self, final: str) -> bool:
+        """Prime the RAG engine for `final`. Returns True when a speculation was reused."""
+        final = final.strip()
+        self._waiting = None
+        if self._task is None or not final:
+            self.cancel()
+            return False
+
+        if self._similar(final):
+            ready = self._task.done()
+            try:
+                chunks = await self._task
+            except Exception as e:
+                logger.warning(f"Speculative retrieval failed: {e}")
+                chunks = None
+
+            if chunks is not None:
+                self.metrics.record("hits")
+                if ready:
+                    self.metrics.record("ready")
+                self.rag.prime(final, chunks, self.top_k)
+                self._task = None
+                return True
+
+        self.cancel()
+        self.metrics.record("misses")
+        # re-run for the final text without holding up the transcript; the chat request that
+        # follows uses it if it finished first, and searches normally otherwise
+        task = asyncio.ensure_future(self._prime(final))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+        return False
+
+    async def _prime(self, query: str):
+        try:
+            chunks = await _pool.submit(self.rag.search_similar_chunks, query, self.top_k)
+            self.rag.prime(query, chunks, self.top_k)
+        except Exception as e:
+            logger.warning(f"Retrieval for final transcript failed: {e}")
+
+    def cancel(self):
+        self._waiting = None
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
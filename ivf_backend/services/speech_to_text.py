@@ -2,14 +2,59 @@
 
 import os
 import json
+import time
 import wave
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
 import vosk
 
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 MODEL_PATH = os.path.join(BASE_DIR, "models", "vosk-model-small-en-us-0.15")
 
 
+class StreamingTranscriber:
+    """Incremental recognizer for audio that arrives in chunks (e.g. over a WebSocket)."""
+
+    def __init__(self, model, sample_rate: int = 16000):
+        self.rec = vosk.KaldiRecognizer(model, sample_rate)
+        self._segments = []
+        self._last_partial = ""
+
+    def feed(self, pcm: bytes) -> Dict[str, str]:
+        """Accept a PCM chunk; returns a finished segment ("result") or the running guess ("partial")."""
+        if self.rec.AcceptWaveform(pcm):
+            text = json.loads(self.rec.Result()).get("text", "")
+            if text:
+                self._segments.append(text)
+            self._last_partial = ""
+            return {"type": "result", "text": text}
+
+        partial = json.loads(self.rec.PartialResult()).get("partial", "")
+        changed = partial != self._last_partial
+        self._last_partial = partial
+        return {"type": "partial", "text": partial, "changed": changed}
+
+    @property
+    def text(self) -> str:
+        """Running transcript: finished segments plus the current partial."""
+        return " ".join(self._segments + [self._last_partial]).strip()
+
+    def finish(self) -> str:
+        final = json.loads(self.rec.FinalResult()).get("text", "")
+        if final:
+            self._segments.append(final)
+        return " ".join(self._segments).strip()
+
+
 class SpeechToText:
 
     def __init__(self):
@@ -22,33 +67,169 @@ class SpeechToText:
 
         print(f"✔ Loading Vosk model from: {MODEL_PATH}")
         self.model = vosk.Model(MODEL_PATH)
+        self.chunk_frames = settings.STT_CHUNK_FRAMES
+
+    def stream(self, sample_rate: int = 16000) -> StreamingTranscriber:
+        return StreamingTranscriber(self.model, sample_rate)
 
     def transcribe(self, wav_path: str) -> str:
         if not os.path.exists(wav_path):
             raise FileNotFoundError("WAV file not found")
 
-        wf = wave.open(wav_path, "rb")
+        with wave.open(wav_path, "rb") as wf:
+            if (
+                wf.getnchannels() != 1 
+                or wf.getsampwidth() != 2 
+                or wf.getframerate() not in [8000, 16000]
+            ):
+                raise RuntimeError(
+                    "Audio must be mono PCM WAV (16-bit), 8k or 16k sample rate"
+                )
 
-        if (
-            wf.getnchannels() != 1 
-            or wf.getsampwidth() != 2 
-            or wf.getframerate() not in [8000, 16000]
-        ):
-            raise RuntimeError(
-                "Audio must be mono PCM WAV (16-bit), 8k or 16k sample rate"
-            )
+            return self.transcribe_pcm(wf.readframes(wf.getnframes()), wf.getframerate())
 
-        rec = vosk.KaldiRecognizer(self.model, wf.getframerate())
+    def transcribe_pcm(self, pcm: bytes, sample_rate: int = 16000, recognizer=None) -> str:
+        """Feed raw 16-bit mono PCM straight to the recognizer (no WAV file involved)."""
+        rec = recognizer or vosk.KaldiRecognizer(self.model, sample_rate)
 
         text = ""
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
+        chunk_bytes = self.chunk_frames * 2  # 16-bit audio
+        for start in range(0, len(pcm), chunk_bytes):
+            if rec.AcceptWaveform(pcm[start:start + chunk_bytes]):
                 partial = json.loads(rec.Result()).get("text", "")
                 text += partial + " "
 
         final = json.loads(rec.FinalResult()).get("text", "")
         result = (text + " " + final).strip()
         return result
+
+
+# ---------------------------------------------------------
+# Pooled, off-loop transcription
+# ---------------------------------------------------------
+class STTBusyError(RuntimeError):
+    """Raised when the transcription queue is full."""
+
+
+class STTMetrics:
+    """Rolling real-time-factor stats (processing time / audio duration; < 1.0 is faster than real time)."""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._rtf = deque(maxlen=window)
+        self.requests = 0
+        self.rejected = 0
+        self.audio_seconds = 0.0
+        self.processing_seconds = 0.0
+
+    def record(self, audio_seconds: float, processing_seconds: float):
+        with self._lock:
+            self.requests += 1
+            self.audio_seconds += audio_seconds
+            self.processing_seconds += processing_seconds
+            if audio_seconds > 0:
+                self._rtf.append(processing_seconds / audio_seconds)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            rtf = sorted(self._rtf)
+            return {
+                "requests": self.requests,
+                "rejected": self.rejected,
+                "audio_seconds": round(self.audio_seconds, 2),
+                "processing_seconds": round(self.processing_seconds, 2),
+                "rtf_avg": round(sum(rtf) / len(rtf), 4) if rtf else None,
+                "rtf_p95": round(rtf[int(0.95 * (len(rtf) - 1))], 4) if rtf else None,
+            }
+
+
+class RecognizerPool:
+    """
+    Bounded pool of Vosk recognizers sharing one loaded model.
+    - decoding runs on a dedicated thread pool (Vosk releases the GIL), never on the event loop
+    - recognizers are reused per sample rate
+    - requests beyond pool size + max_queue are refused with STTBusyError
+    """
+
+    def __init__(self, stt: Optional[SpeechToText] = None, size: int = None, max_queue: int = None):
+        self.stt = stt or SpeechToText()
+        self.size = size or settings.STT_POOL_SIZE
+        self.max_queue = settings.STT_MAX_QUEUE if max_queue is None else max_queue
+
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="stt")
+        self._idle: Dict[int, List[Any]] = {}
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self.metrics = STTMetrics()
+
+    # ---------------------------------------------------------
+    def _acquire(self, sample_rate: int):
+        with self._lock:
+            idle = self._idle.get(sample_rate)
+            if idle:
+                return idle.pop()
+        return vosk.KaldiRecognizer(self.stt.model, sample_rate)
+
+    def _release(self, sample_rate: int, rec):
+        with self._lock:
+            idle = self._idle.setdefault(sample_rate, [])
+            if len(idle) < self.size:
+                idle.append(rec)
+
+    def _transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        rec = self._acquire(sample_rate)
+        start = time.perf_counter()
+        # FinalResult() resets the recognizer, so it is only reused after a clean run
+        text = self.stt.transcribe_pcm(pcm, sample_rate, recognizer=rec)
+        self._release(sample_rate, rec)
+
+        self.metrics.record(len(pcm) / (2 * sample_rate), time.perf_counter() - start)
+        return text
+
+    # ---------------------------------------------------------
+    async def run(self, fn, *args, limit: bool = True):
+        """
+        Run a blocking STT call on the pool, subject to the queue-depth limit.
+        limit=False is for chunks of an already-admitted stream, which must not be dropped midway.
+        """
+        with self._lock:
+            if limit and self._inflight >= self.size + self.max_queue:
+                self.metrics.reject()
+                raise STTBusyError("Speech recognition is busy, please retry shortly.")
+            self._inflight += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        # the slot is freed when the thread finishes, not when the caller stops waiting: a
+        # cancelled await (e.g. the losing engine of a latency_first race) keeps decoding
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def _done(self, _future):
+        with self._lock:
+            self._inflight -= 1
+
+    async def transcribe_pcm(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        return await self.run(self._transcribe, pcm, sample_rate)
+
+    def stream(self, sample_rate: int = 16000) -> StreamingTranscriber:
+        return self.stt.stream(sample_rate)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            inflight = self._inflight
+        return {
+            **self.metrics.snapshot(),
+            "pool_size": self.size,
+            "max_queue": self.max_queue,
+            "inflight": inflight,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,88 @@
+# ivf_backend/services/stage_graph.py
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+
+class Stage:
+    """One step of a pipeline: an async callable over the shared state, run once its dependencies finish."""
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Awaitable[Any]], after: Sequence[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+
+
+class StageMetrics:
+    """Rolling per-stage latency (ms), plus the whole graph under "total"."""
+
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+
+    def record(self, timings: Dict[str, float]):
+        with self._lock:
+            for name, seconds in timings.items():
+                self._samples.setdefault(name, deque(maxlen=self._window)).append(seconds * 1000)
+                self._counts[name] = self._counts.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for name, samples in self._samples.items():
+                ms = sorted(samples)
+                out[name] = {
+                    "count": self._counts[name],
+                    "avg_ms": round(sum(ms) / len(ms), 2),
+                    "p95_ms": round(ms[int(0.95 * (len(ms) - 1))], 2),
+                }
+            return out
+
+
+class StageGraph:
+    """
+    Small dependency graph of async stages.
+    Every stage starts as soon as the stages it depends on are done, so independent stages overlap
+    and the graph takes as long as its slowest dependency chain. Stage results land in the state
+    dict under the stage name; per-stage wall times are returned and recorded.
+    """
+
+    def __init__(self, stages: List[Stage], metrics: StageMetrics = None):
+        seen = set()
+        for stage in stages:
+            missing = [d for d in stage.after if d not in seen]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown or later stages: {missing}")
+            seen.add(stage.name)
+        self.stages = stages
+        self.metrics = metrics
+
+    async def run(self, state: Dict[str, Any]) -> Dict[str, float]:
+        timings: Dict[str, float] = {}
+        tasks: Dict[str, asyncio.Future] = {}
+
+        async def run_stage(stage: Stage):
+            if stage.after:
+                await asyncio.gather(*(tasks[d] for d in stage.after))
+            start = time.perf_counter()
+            state[stage.name] = await stage.fn(state)
+            timings[stage.name] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for stage in self.stages:
+            tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        timings["total"] = time.perf_counter() - start
+
+        if self.metrics:
+            self.metrics.record(timings)
+        return timings
@@ -0,0 +1,234 @@
+# ivf_backend/services/stt_service.py
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional
+
+import httpx
+
+from ..config import settings
+from .audio_service import AudioService
+from .speech_to_text import RecognizerPool
+
+logger = logging.getLogger(__name__)
+
+
+class STTUnavailableError(RuntimeError):
+    """Raised when no backend allowed by the policy can transcribe."""
+
+
+# ---------------------------------------------------------
+# Backends — all take 16-bit mono PCM
+# ---------------------------------------------------------
+class STTBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    async def transcribe(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        """Transcript of 16-bit mono PCM."""
+
+    async def aclose(self):
+        pass
+
+
+class VoskBackend(STTBackend):
+    """Local Vosk decoding on the shared recognizer pool."""
+
+    name = "vosk"
+
+    def __init__(self, pool: RecognizerPool):
+        self.pool = pool
+
+    async def transcribe(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        return await self.pool.transcribe_pcm(pcm, sample_rate)
+
+
+class WhisperBackend(STTBackend):
+    """Remote Groq Whisper over an async HTTP client (no blocking calls on the event loop)."""
+
+    name = "whisper"
+    URL = "https://api.groq.com/openai/v1/audio/transcriptions"
+
+    def __init__(self, api_key: str = None, model: str = None):
+        self.api_key = api_key or settings.GROQ_API_KEY
+        self.model = model or settings.STT_WHISPER_MODEL
+        self._client = httpx.AsyncClient(timeout=40)
+
+    async def transcribe(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        wav = AudioService.pcm_to_wav(pcm, sample_rate)
+        resp = await self._client.post(
+            self.URL,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            files={"file": ("audio.wav", wav, "audio/wav")},
+            data={"model": self.model, "response_format": "json"},
+        )
+
+        if resp.status_code != 200:
+            raise RuntimeError(f"GROQ Whisper Error ({resp.status_code}): {resp.text[:300]}")
+
+        return resp.json().get("text", "").strip()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class StubRemoteBackend(STTBackend):
+    """
+    Stand-in for the remote service in tests and offline development.
+    Returns a canned transcript after a configurable delay, or fails on demand.
+    """
+
+    name = "stub"
+
+    def __init__(self, text: str = "", latency: float = 0.0, fail: bool = False):
+        self.text = text
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    async def transcribe(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("stub remote STT failure")
+        return self.text
+
+
+# ---------------------------------------------------------
+class STTService:
+    """
+    Single entrypoint for speech-to-text, choosing backends by policy:
+    - local_only:     Vosk only
+    - fallback:       remote first; on timeout/error fall back to local
+    - latency_first:  race local and remote, first non-empty transcript wins
+    """
+
+    POLICIES = ("local_only", "fallback", "latency_first")
+
+    def __init__(
+        self,
+        local: Optional[STTBackend] = None,
+        remote: Optional[STTBackend] = None,
+        policy: str = None,
+        remote_timeout: float = None
+    ):
+        self.local = local
+        self.remote = remote
+        self.policy = policy or settings.STT_POLICY
+        self.remote_timeout = remote_timeout or settings.STT_REMOTE_TIMEOUT
+
+        if self.policy not in self.POLICIES:
+            raise ValueError(f"Unknown STT policy: {self.policy}")
+
+    @classmethod
+    def from_settings(cls, pool: Optional[RecognizerPool]) -> "STTService":
+        local = VoskBackend(pool) if pool else None
+
+        remote = None
+        kind = settings.STT_REMOTE_BACKEND
+        if kind == "groq" and settings.GROQ_API_KEY:
+            remote = WhisperBackend()
+        elif kind == "stub":
+            remote = StubRemoteBackend()
+
+        return cls(local=local, remote=remote)
+
+    async def aclose(self):
+        for backend in (self.local, self.remote):
+            if backend:
+                await backend.aclose()
+
+    # ---------------------------------------------------------
+    async def transcribe(self, pcm: bytes, sample_rate: int = 16000, policy: str = None) -> Dict[str, Any]:
+        """
+        Trim silence and split at pauses (VAD), transcribe the segments in parallel, stitch in order.
+        Both engines then only decode / upload the parts of the recording that contain speech.
+        A recording the VAD finds no speech in (e.g. one recorded below VAD_MIN_RMS) is transcribed whole.
+        """
+        policy = policy or self.policy
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown STT policy: {policy}")
+
+        if not settings.VAD_ENABLED:
+            result = await self._transcribe_segment(pcm, sample_rate, policy)
+            return {**result, "segments": 1}
+
+        segments = await asyncio.to_thread(AudioService.speech_segments, pcm, sample_rate)
+        if not segments:
+            if pcm.count(0) == len(pcm):
+                # empty or digital silence: nothing for a recognizer to find
+                return {"text": "", "engine": "vad", "policy": policy, "segments": 0}
+            # too quiet for the energy threshold is not the same as silent: let the recognizer decide
+            segments = [pcm]
+
+        # a long recording must not take the whole recognizer pool
+        limit = asyncio.Semaphore(settings.STT_SEGMENT_CONCURRENCY)
+
+        async def run(segment: bytes) -> Dict[str, Any]:
+            async with limit:
+                return await self._transcribe_segment(segment, sample_rate, policy)
+
+        results = await asyncio.gather(*(run(seg) for seg in segments))
+
+        engines = list(dict.fromkeys(r["engine"] for r in results))
+        return {
+            "text": " ".join(r["text"] for r in results if r["text"]).strip(),
+            "engine": "+".join(engines),
+            "policy": policy,
+            "segments": len(segments),
+        }
+
+    async def _transcribe_segment(self, pcm: bytes, sample_rate: int, policy: str) -> Dict[str, Any]:
+        if policy == "local_only" or not self.remote:
+            return await self._run(self.local, pcm, sample_rate, policy)
+
+        if not self.local:
+            return await self._run(self.remote, pcm, sample_rate, policy)
+
+        if policy == "fallback":
+            try:
+                return await asyncio.wait_for(self._run(self.remote, pcm, sample_rate, policy), self.remote_timeout)
+            except Exception as e:
+                logger.warning(f"Remote STT failed ({type(e).__name__}: {e}); falling back to local")
+                return await self._run(self.local, pcm, sample_rate, policy)
+
+        return await self._race(pcm, sample_rate, policy)
+
+    async def _run(self, backend: Optional[STTBackend], pcm: bytes, sample_rate: int, policy: str) -> Dict[str, Any]:
+        if backend is None:
+            raise STTUnavailableError("Speech recognition is not available.")
+        text = await backend.transcribe(pcm, sample_rate)
+        return {"text": text, "engine": backend.name, "policy": policy}
+
+    async def _race(self, pcm: bytes, sample_rate: int, policy: str) -> Dict[str, Any]:
+        tasks = {
+            asyncio.ensure_future(self._run(self.local, pcm, sample_rate, policy)),
+            asyncio.ensure_future(
+                asyncio.wait_for(self._run(self.remote, pcm, sample_rate, policy), self.remote_timeout)
+            ),
+        }
+        fallback: Optional[Dict[str, Any]] = None
+        error: Optional[BaseException] = None
+
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception():
+                        error = task.exception()
+                        logger.warning(f"STT backend failed during race: {error}")
+                        continue
+                    result = task.result()
+                    if result["text"]:
+                        return result
+                    # an empty transcript only wins if the other engine has nothing better
+                    fallback = fallback or result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if fallback is not None:
+            return fallback
+        raise error or STTUnavailableError("Speech recognition is not available.")
@@ -0,0 +1,238 @@
+# ivf_backend/services/text_to_speech.py
+
+import io
+import os
+import re
+import wave
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_MARKUP = re.compile(r"[*_#`>|~]+")
+
+
+class SentenceBuffer:
+    """Accumulates streamed text and releases complete sentences as soon as they end."""
+
+    def __init__(self):
+        self._buf = ""
+
+    @staticmethod
+    def split(text: str) -> List[str]:
+        return [s.strip() for s in _SENTENCE_SPLIT.split(text or "") if s.strip()]
+
+    def feed(self, delta: str) -> List[str]:
+        self._buf += delta
+        pieces = _SENTENCE_SPLIT.split(self._buf)
+        # the last piece may still be growing
+        self._buf = pieces.pop()
+        return [p.strip() for p in pieces if p.strip()]
+
+    def flush(self) -> str:
+        tail, self._buf = self._buf.strip(), ""
+        return tail
+
+
+class TextToSpeech:
+    """
+    Offline TTS (espeak-ng) with a per-sentence disk cache.
+    - text is split into sentences; each normalized sentence is synthesized once and cached as WAV
+    - the cache is capped at TTS_CACHE_MAX_BYTES; a hit refreshes the clip's mtime and the
+      least recently used clips are evicted first (one-off LLM sentences age out, disclaimers stay)
+    - uncached sentences are synthesized in parallel
+    - the reply is one concatenated WAV
+    """
+
+    def __init__(self, cache_dir: str = None, voice: str = None, rate: int = None, max_cache_bytes: int = None):
+        self.cache_dir = Path(cache_dir or settings.TTS_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.voice = voice or settings.TTS_VOICE
+        self.rate = rate or settings.TTS_RATE
+        self.max_cache_bytes = max_cache_bytes or settings.TTS_CACHE_MAX_BYTES
+
+        # running total of the cache size; the directory is rescanned whenever it passes the cap
+        self._cache_lock = threading.Lock()
+        self._cache_bytes = sum(size for _, size, _ in self._cache_entries())
+
+        self._binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        self._executor = ThreadPoolExecutor(max_workers=settings.TTS_MAX_WORKERS, thread_name_prefix="tts")
+
+        if not self._binary:
+            logger.warning("espeak-ng not found — TTS disabled.")
+
+    @property
+    def available(self) -> bool:
+        return self._binary is not None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---------------------------------------------------------
+    # Text handling
+    # ---------------------------------------------------------
+    @staticmethod
+    def clean(text: str) -> str:
+        """Drop markdown and emoji so they are neither spoken nor part of the cache key."""
+        text = _MARKUP.sub(" ", text)
+        text = "".join(ch for ch in text if unicodedata.category(ch) not in ("So", "Sk", "Cs", "Co"))
+        return " ".join(text.split())
+
+    @classmethod
+    def split_sentences(cls, text: str) -> List[str]:
+        sentences = [cls.clean(s) for s in SentenceBuffer.split(text)]
+        return [s for s in sentences if cls.speakable(s)]
+
+    @staticmethod
+    def speakable(sentence: str) -> bool:
+        return any(ch.isalnum() for ch in sentence)
+
+    def _cache_path(self, sentence: str) -> Path:
+        key = f"{self.voice}|{self.rate}|{sentence.lower()}"
+        return self.cache_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.wav"
+
+    def _cache_entries(self):
+        """(path, size, mtime) of every cached clip."""
+        entries = []
+        for path in self.cache_dir.glob("*.wav"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by another worker meanwhile
+            entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def _account(self, added: int):
+        """Count a newly stored clip; past the cap, evict least recently used clips down to 90% of it."""
+        with self._cache_lock:
+            self._cache_bytes += added
+            if self._cache_bytes <= self.max_cache_bytes:
+                return
+
+            entries = sorted(self._cache_entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_cache_bytes * 0.9)
+            evicted = 0
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+            self._cache_bytes = total
+        logger.info(f"TTS cache over {self.max_cache_bytes} bytes: evicted {evicted} clips")
+
+    # ---------------------------------------------------------
+    # Synthesis
+    # ---------------------------------------------------------
+    def synthesize_sentence(self, sentence: str) -> bytes:
+        """WAV bytes for one cleaned sentence, from the disk cache when possible."""
+        path = self._cache_path(sentence)
+        try:
+            audio = path.read_bytes()
+            os.utime(path)  # mtime is the LRU clock for eviction
+            return audio
+        except FileNotFoundError:
+            pass
+
+        proc = subprocess.run(
+            [self._binary, "-v", self.voice, "-s", str(self.rate), "--stdin", "--stdout"],
+            input=sentence.encode("utf-8"),
+            capture_output=True,
+            timeout=30,
+            check=True,
+        )
+        # espeak streams to stdout with a placeholder length in the header; store a well-formed WAV
+        audio = self._rewrap_wav(proc.stdout)
+
+        # write-then-rename so concurrent requests never read a half-written file
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False) as tmp:
+            tmp.write(audio)
+        os.replace(tmp.name, path)
+        self._account(len(audio))
+        return audio
+
+    async def synthesize_sentence_async(self, sentence: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.synthesize_sentence, sentence)
+
+    async def speak(self, text: str) -> Dict[str, Any]:
+        if not self.available:
+            raise RuntimeError("No offline TTS engine installed (espeak-ng).")
+
+        sentences = self.split_sentences(text)
+        cached = sum(1 for s in sentences if self._cache_path(s).exists())
+        clips = await asyncio.gather(*(self.synthesize_sentence_async(s) for s in sentences))
+
+        return {
+            "audio": self.concat_wav(clips),
+            "sentences": len(sentences),
+            "cached": cached,
+        }
+
+    async def warm(self, phrases: List[str]):
+        """Pre-synthesize phrases that repeat constantly (disclaimers, canned replies)."""
+        if not self.available:
+            return
+        try:
+            await self.speak("\n".join(phrases))
+            logger.info("TTS phrase cache warmed")
+        except Exception as e:
+            logger.warning(f"TTS warm-up failed: {e}")
+
+    # ---------------------------------------------------------
+    @staticmethod
+    def _rewrap_wav(data: bytes) -> bytes:
+        with wave.open(io.BytesIO(data), "rb") as reader:
+            params = reader.getparams()
+            frames = reader.readframes(reader.getnframes())
+
+        out = io.BytesIO()
+        with wave.open(out, "wb") as writer:
+            writer.setnchannels(params.nchannels)
+            writer.setsampwidth(params.sampwidth)
+            writer.setframerate(params.framerate)
+            writer.writeframes(frames)
+        return out.getvalue()
+
+    @staticmethod
+    def concat_wav(clips: List[bytes], pause_ms: int = 150) -> bytes:
+        """Join WAV clips from the same engine into one WAV, with a short pause between sentences."""
+        out = io.BytesIO()
+        params = None
+
+        with wave.open(out, "wb") as writer:
+            for clip in clips:
+                with wave.open(io.BytesIO(clip), "rb") as reader:
+                    frames = reader.readframes(reader.getnframes())
+                    if params is None:
+                        params = reader.getparams()
+                        writer.setnchannels(params.nchannels)
+                        writer.setsampwidth(params.sampwidth)
+                        writer.setframerate(params.framerate)
+                    else:
+                        silence_frames = params.framerate * pause_ms // 1000
+                        writer.writeframes(b"\x00" * silence_frames * params.sampwidth * params.nchannels)
+                    writer.writeframes(frames)
+
+            if params is None:
+                writer.setnchannels(1)
+                writer.setsampwidth(2)
+                writer.setframerate(22050)
+
+        return out.getvalue()
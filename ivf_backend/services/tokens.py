@@ -0,0 +1,12 @@
+# ivf_backend/services/tokens.py
+import math
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate for prompt budgeting (~4 characters per token for English with
+    Llama-family tokenizers). Deliberately dependency-free: budgets only need to be stable, not exact.
+    """
+    if not text:
+        return 0
+    return max(1, math.ceil(len(text) / 4))
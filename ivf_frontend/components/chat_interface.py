@@ -24,11 +24,12 @@ def play_voice_output(text: str):
         resp = requests.post(tts_url, json={"text": text}, timeout=30)
         if resp.status_code != 200:
             return
-        audio_base64 = resp.json().get("audio")
+        data = resp.json()
+        audio_base64 = data.get("audio")
         if not audio_base64:
             return
         audio_bytes = base64.b64decode(audio_base64)
-        st.audio(audio_bytes, format="audio/mp3")
+        st.audio(audio_bytes, format="audio/" + data.get("format", "wav"))
     except:
         pass
 
@@ -16,21 +16,27 @@ def render_file_uploader():
     uploaded = st.file_uploader(
         "Upload PDF / DOCX / TXT",
         type=["pdf", "docx", "txt"],
-        accept_multiple_files=False
+        accept_multiple_files=True
     )
 
     if not uploaded:
         return
 
-    st.info(f"Processing: **{uploaded.name}**")
+    st.info("Processing: " + ", ".join(f"**{u.name}**" for u in uploaded))
 
     try:
-        files = {
-            "file": (uploaded.name, uploaded.getvalue(), uploaded.type)
-        }
+        # session_id lets the backend index the documents for follow-up chat questions
+        data = {"session_id": st.session_state.get("session_id", "")}
 
-        api_url = get_api_url("/documents/analyze")
-        response = requests.post(api_url, files=files)
+        # A bundle of reports goes up in one request and gets one combined explanation
+        if len(uploaded) > 1:
+            files = [("files", (u.name, u.getvalue(), u.type)) for u in uploaded]
+            api_url = get_api_url("/documents/analyze-batch")
+        else:
+            files = {"file": (uploaded[0].name, uploaded[0].getvalue(), uploaded[0].type)}
+            api_url = get_api_url("/documents/analyze")
+
+        response = requests.post(api_url, files=files, data=data)
 
         # ---------------------------
         # ❌ HANDLE NON-IVF DOCUMENT
@@ -60,8 +66,18 @@ def render_file_uploader():
 
         st.success("✅ IVF-related document processed successfully!")
 
-        st.write("### 📝 Extracted Text")
-        st.write(data.get("extracted_text", ""))
+        if "files" in data:
+            st.write("### 📁 Files")
+            for f in data["files"]:
+                if f.get("duplicate_of"):
+                    st.caption(f"{f['filename']}: duplicate of {f['duplicate_of']}, skipped")
+                elif f.get("error"):
+                    st.caption(f"{f['filename']}: {f['error']}")
+                else:
+                    st.caption(f"{f['filename']}: processed")
+        else:
+            st.write("### 📝 Extracted Text")
+            st.write(data.get("extracted_text", ""))
 
         st.write("### 🤖 Summary (Safe Explanation)")
         st.write(data.get("explanation", ""))
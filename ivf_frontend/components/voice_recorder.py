@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import base64
 from ivf_frontend.utils.helpers import get_api_url
 from ivf_frontend.utils.multilingual import get_translation
 
@@ -35,61 +36,40 @@ def render_voice_recorder():
             files = {
                 "file": (filename, audio_bytes, mime)
             }
+            data = {
+                "session_id": st.session_state.get("session_id", "default-session"),
+                "language": "en",
+            }
 
-            stt_url = get_api_url("/audio/transcribe")
-            resp = requests.post(stt_url, files=files, timeout=40)
+            # one round trip: transcription, answer and voice reply
+            ask_url = get_api_url("/voice/ask")
+            resp = requests.post(ask_url, files=files, data=data, timeout=90)
 
-            if resp.status_code != 200:
-                st.error("Sorry, I couldn't understand the audio. Please try again.")
-                return
+            try:
+                result = resp.json()
+            except ValueError:
+                result = {}
 
-            text = resp.json().get("text", "").strip()
+        text = (result.get("transcript") or "").strip()
 
-        if not text:
+        if resp.status_code == 422 or (resp.status_code == 200 and not text):
             st.warning("I couldn’t clearly understand what you said. Please try again.")
             return
 
+        if resp.status_code != 200:
+            st.error("Sorry, I couldn't process your voice question. Please try again.")
+            return
+
         st.markdown("#### 🗣️ You said")
         st.success(text)
 
-        # -----------------------------------------------------
-        # CHAT ENGINE
-        # -----------------------------------------------------
-        with st.spinner("Preparing an answer…"):
-            chat_url = get_api_url("/chat")
-            payload = {
-                "message": text,
-                "session_id": st.session_state.get("session_id", "default-session"),
-                "language": "en",
-                "include_context": True
-            }
-            chat_resp = requests.post(chat_url, json=payload, timeout=60)
-
-            if chat_resp.status_code != 200:
-                st.error("The assistant couldn't generate a response.")
-                return
-
-            answer = chat_resp.json().get("response", "")
-
         st.markdown("#### 🤖 AI Response")
-        st.write(answer)
-
-        # -----------------------------------------------------
-        # TTS ENGINE
-        # -----------------------------------------------------
-        with st.spinner("Generating voice reply…"):
-            tts_url = get_api_url("/tts/speak")
-            tts_resp = requests.post(tts_url, json={"text": answer}, timeout=40)
-
-            try:
-                tts_data = tts_resp.json()
-            except:
-                tts_data = {}
+        st.write(result.get("response", ""))
 
-        audio_content = tts_data.get("audio")
+        audio_content = result.get("audio")
 
         if audio_content:
-            st.audio(audio_content)
+            st.audio(base64.b64decode(audio_content), format="audio/" + result.get("format", "wav"))
         else:
             st.caption("🔇 Voice playback unavailable.")
 
@@ -19,9 +19,12 @@ route_map = {
     "/feedback": "/feedback",                # feedback
     "/ready": "/ready",                      # health check
     "/documents/analyze": "/documents/analyze",# document analyzer
+    "/documents/analyze-batch": "/documents/analyze-batch",  # multi-file analyzer
     
     "/audio/transcribe": "/audio/transcribe",    # STT
     "/tts/speak": "/tts/speak",              # TTS
+    "/voice/chat": "/voice/chat",            # streamed spoken reply
+    "/voice/ask": "/voice/ask",              # audio in → transcript, answer, audio out
 }
 
 def get_api_url(logical_path: str) -> str:
@@ -0,0 +1,51 @@
+import asyncio
+
+from ivf_backend.config import settings
+from ivf_backend.models.chat_models import ChatRequest
+from ivf_backend.services.doctor_chatbot import DoctorChatbot
+from ivf_backend.services.session_store import InProcessKV, KVSessionStore
+
+
+class _StubRAG:
+    def search_similar_chunks(self, query, top_k=5):
+        return []
+
+    def format_context(self, chunks):
+        return ""
+
+
+class _StubLLM:
+    async def agenerate_response(self, **kwargs):
+        return "Embryo transfer usually happens on day 3 or day 5. Ask your doctor which applies."
+
+    def summarize_conversation(self, previous_summary, messages):
+        return None
+
+    async def aclose(self):
+        pass
+
+
+def test_user_message_is_stored_before_the_deferred_reply(monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_EVERY_TURNS", 10_000)
+    memory = KVSessionStore(InProcessKV())
+    chatbot = DoctorChatbot(rag=_StubRAG(), llm=_StubLLM(), memory=memory)
+    deferred = []
+
+    def defer(fn, *args):
+        deferred.append((fn, args))
+
+    request = ChatRequest(message="When is the embryo transfer?", session_id="s")
+    response = asyncio.run(chatbot.aprocess_message(request, defer=defer))
+
+    # only the assistant write waits for the background task
+    assert [(m.role, m.content) for m in memory.get_conversation_history("s")] == [
+        ("user", "When is the embryo transfer?")
+    ]
+    assert len(deferred) == 1
+
+    fn, args = deferred[0]
+    fn(*args)
+    history = memory.get_conversation_history("s")
+    assert [m.role for m in history] == ["user", "assistant"]
+    assert history[-1].content == response.response.split("\n\n")[0]
+    chatbot._executor.shutdown()
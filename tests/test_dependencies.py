@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+
+from ivf_backend import main
+from ivf_backend.config import settings
+from ivf_backend.services.doctor_chatbot import DoctorChatbot
+
+
+class _StubRAG:
+    """Startup RAG engine without the embedding model / FAISS / Supabase."""
+
+    embedding_model = None
+    faiss_index = None
+    supabase_client = None
+    id_map = {}
+
+    def search_similar_chunks(self, query, top_k=5):
+        return []
+
+    def format_context(self, chunks):
+        return ""
+
+
+def _client(monkeypatch):
+    monkeypatch.setattr(main, "RAGEngine", _StubRAG)
+    monkeypatch.setattr(settings, "SESSION_STORE", "memory")  # keep the real DB out of it
+    monkeypatch.setattr(settings, "GROQ_API_KEY", "")          # LLM falls back offline
+    return TestClient(main.app)
+
+
+def test_chatbot_built_once_for_many_requests(monkeypatch):
+    built = []
+    original = DoctorChatbot.__init__
+
+    def counting_init(self, *args, **kwargs):
+        built.append(self)
+        original(self, *args, **kwargs)
+
+    monkeypatch.setattr(DoctorChatbot, "__init__", counting_init)
+
+    with _client(monkeypatch) as client:
+        for i in range(3):
+            resp = client.post("/chat", json={"message": f"What is IVF? ({i})", "session_id": "dep-test"})
+            assert resp.status_code == 200
+
+    assert len(built) == 1
+
+
+def test_chat_unavailable_when_rag_fails(monkeypatch):
+    def broken_rag():
+        raise RuntimeError("embedding model missing")
+
+    built = []
+    monkeypatch.setattr(DoctorChatbot, "__init__", lambda self, *a, **kw: built.append(self))
+    client = _client(monkeypatch)
+    monkeypatch.setattr(main, "RAGEngine", broken_rag)
+
+    with client:
+        resp = client.post("/chat", json={"message": "What is IVF?", "session_id": "dep-test"})
+        assert resp.status_code == 503
+
+    # the failure is passed through: no pipeline (and no second RAGEngine) is built
+    assert built == []
@@ -0,0 +1,87 @@
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ivf_backend.api import document_routes
+from ivf_backend.config import settings
+
+
+def _client(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 1024)
+    monkeypatch.setattr(settings, "MAX_CSV_FILE_SIZE", 64 * 1024)
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_BYTES", 512)  # several chunks per upload
+    app = FastAPI()
+    app.include_router(document_routes.router)
+    return TestClient(app)
+
+
+def _csv(rows):
+    return ("amh,fsh\n" + "".join(f"{i % 5}.{i % 10},{i % 9}\n" for i in range(rows))).encode()
+
+
+def test_csv_over_max_file_size_reaches_the_csv_parser(monkeypatch):
+    client = _client(monkeypatch)
+    data = _csv(2000)
+    assert settings.MAX_FILE_SIZE < len(data) <= settings.MAX_CSV_FILE_SIZE
+
+    seen = {}
+    original = document_routes.processor._process_csv
+
+    def spy(path):
+        seen["size"] = os.path.getsize(path)
+        seen["path"] = path
+        result = original(path)
+        seen["rows"] = result["rows"]
+        return result
+
+    monkeypatch.setattr(document_routes.processor, "_process_csv", spy)
+
+    response = client.post("/documents/analyze", files={"file": ("labs.csv", data, "text/csv")})
+
+    assert response.status_code != 413
+    assert seen["size"] == len(data) and seen["rows"] == 2000
+    assert not os.path.exists(seen["path"])  # temp copy removed after the request
+
+
+def test_csv_over_its_own_limit_is_rejected(monkeypatch):
+    client = _client(monkeypatch)
+    data = _csv(12_000)
+    assert len(data) > settings.MAX_CSV_FILE_SIZE
+
+    response = client.post("/documents/analyze", files={"file": ("labs.csv", data, "text/csv")})
+    assert response.status_code == 413
+
+
+def test_other_types_keep_max_file_size(monkeypatch):
+    client = _client(monkeypatch)
+    data = b"AMH 1.2 ng/ml\n" * 200
+    assert len(data) > settings.MAX_FILE_SIZE
+
+    response = client.post("/documents/analyze", files={"file": ("report.txt", data, "text/plain")})
+    assert response.status_code == 413
+
+    response = client.post(
+        "/documents/analyze-batch",
+        files=[("files", ("report.txt", data, "text/plain")), ("files", ("labs.csv", _csv(2000), "text/csv"))],
+    )
+    entries = {e["filename"]: e for e in response.json()["files"]}
+    assert "exceeds" in entries["report.txt"]["error"]
+    assert "exceeds" not in entries["labs.csv"].get("error", "")
+
+
+def test_file_analyze_rejects_oversized_uploads_before_ocr(monkeypatch):
+    from ivf_backend.api import file_routes
+
+    client = _client(monkeypatch)
+    client.app.include_router(file_routes.router)
+
+    class _OCR:
+        available = True
+
+        async def extract_text(self, content, file_ext):
+            raise AssertionError("oversized upload reached OCR")
+
+    client.app.state.ocr_service = _OCR()
+    response = client.post("/files/analyze", files={"file": ("scan.png", b"\x89PNG" + b"\x00" * 2048, "image/png")})
+    assert response.status_code == 413
@@ -0,0 +1,62 @@
+from ivf_backend.services.document_processor import DocumentProcessor
+
+REPORT = """\
+Hormone profile
+AMH (Anti-Mullerian Hormone): 2.4 ng/ml   1.0 - 3.5
+FSH 7.8 mIU/ml (3.5-12.5)
+Estradiol: 45 pg/ml
+Semen analysis
+Volume: 2.5 ml  >1.5
+Sperm concentration: 40 million/ml  >15
+Total sperm count: 120 million/ejaculate  >39
+Progressive motility: 35 %  >32
+Patient name: Jane Doe
+"""
+
+
+def _by_analyte(text):
+    result = DocumentProcessor().extract_lab_values(text)
+    return {v["analyte"]: v for v in result["lab_values"]}, result
+
+
+def test_extracts_value_unit_and_reference_range():
+    values, _ = _by_analyte(REPORT)
+    assert values["AMH"] == {"analyte": "AMH", "value": "2.4", "unit": "ng/ml", "reference_range": "1.0-3.5"}
+    assert values["FSH"]["reference_range"] == "3.5-12.5"
+    assert values["Estradiol"]["unit"] == "pg/ml"
+    assert values["Progressive motility"]["reference_range"] == ">32"
+
+
+def test_total_sperm_count_is_not_read_as_concentration():
+    values, _ = _by_analyte(REPORT)
+    assert values["Total sperm count"]["value"] == "120"
+    assert values["Total sperm count"]["unit"] == "million/ejaculate"
+    assert values["Sperm concentration"]["value"] == "40"
+
+    values, _ = _by_analyte("Total sperm count: 120 million")
+    assert list(values) == ["Total sperm count"]
+
+
+def test_sperm_count_wording_is_concentration():
+    values, _ = _by_analyte("Sperm count: 40 million/ml  >15")
+    assert list(values) == ["Sperm concentration"]
+    assert values["Sperm concentration"]["value"] == "40"
+    assert values["Sperm concentration"]["unit"] == "million/ml"
+
+
+def test_coverage_counts_measurement_lines_only():
+    _, result = _by_analyte(REPORT)
+    assert result["lab_coverage"] == 1.0
+
+    _, result = _by_analyte("AMH: 2.4 ng/ml\nWBC 6.1 x10^6/ml\nComments: none")
+    assert result["lab_coverage"] == 0.5
+
+
+def test_fertility_markers_and_table():
+    values = DocumentProcessor().extract_lab_values(REPORT)["lab_values"]
+    assert DocumentProcessor.has_fertility_markers(values)
+    assert not DocumentProcessor.has_fertility_markers([{"analyte": "pH"}])
+
+    table = DocumentProcessor.format_lab_table(values)
+    assert table.splitlines()[0].startswith("Lab values")
+    assert "AMH | 2.4 | ng/ml | 1.0-3.5" in table
@@ -0,0 +1,30 @@
+import threading
+
+import numpy as np
+
+from ivf_backend.services.session_index import SessionDocumentIndex
+
+
+def test_concurrent_uploads_respect_the_chunk_cap():
+    # both uploads pass the early room check, then embed at the same time
+    barrier = threading.Barrier(2)
+
+    def embed(texts):
+        barrier.wait(5)
+        return np.random.default_rng(len(texts)).random((len(texts), 8), dtype=np.float32)
+
+    index = SessionDocumentIndex(embed, max_chunks_per_session=10)
+    added = []
+
+    def upload(name):
+        added.append(index.add_document("s", [f"{name} chunk {i}" for i in range(8)], source=name))
+
+    threads = [threading.Thread(target=upload, args=(n,)) for n in ("a.pdf", "b.pdf")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(added) == [2, 8]
+    entry = index._sessions["s"]
+    assert len(entry.chunks) == entry.index.ntotal == 10
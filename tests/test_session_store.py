@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from ivf_backend.config import settings
+from ivf_backend.services.session_store import InProcessKV, KVSessionStore, SessionStore
+
+
+@pytest.fixture
+def store():
+    store = KVSessionStore(InProcessKV(), max_messages=20)
+    yield store
+    store.close()
+
+
+def _contents(msgs):
+    return [m.content for m in msgs]
+
+
+def _fill(store, n, session_id="s"):
+    store.create_session(session_id, "user-1")
+    for i in range(n):
+        store.add_message(session_id, "user" if i % 2 == 0 else "assistant", f"m{i}")
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_history_is_in_order_with_ids(store):
+    _fill(store, 5)
+    history = store.get_conversation_history("s", limit=3)
+    assert _contents(history) == ["m2", "m3", "m4"]
+    assert [m.message_id for m in history] == ["3", "4", "5"]
+    assert store.get_conversation_history("s", limit=0) == []
+
+    info = store.get_session_info("s")
+    assert info.message_count == 5 and info.user_id == "user-1"
+    assert store.get_session_info("missing") is None
+
+
+def test_list_is_capped_but_ids_keep_counting(store):
+    _fill(store, 30)
+    kept = store.get_conversation_history("s", limit=100)
+    assert len(kept) == store.max_messages == 20
+    assert kept[0].message_id == "11" and kept[-1].message_id == "30"
+    assert store.get_session_info("s").message_count == 30
+
+
+def test_pages_walk_back_through_the_list(store):
+    _fill(store, 12)
+    pages, before = [], None
+    while True:
+        page, before = store.get_messages_page("s", before, limit=5)
+        pages.append(_contents(page))
+        if before is None:
+            break
+    assert pages == [
+        ["m7", "m8", "m9", "m10", "m11"],
+        ["m2", "m3", "m4", "m5", "m6"],
+        ["m0", "m1"],
+    ]
+
+
+def test_summary_folds_older_messages(store):
+    _fill(store, settings.SUMMARY_KEEP_MESSAGES + 2 * settings.SUMMARY_EVERY_TURNS)
+    seen = []
+
+    def summarize(previous, messages):
+        seen.append((previous, [m["content"] for m in messages]))
+        return "patient is 34, asked about AMH"
+
+    assert store.maybe_summarize("s", summarize)
+    keep = settings.SUMMARY_KEEP_MESSAGES
+    folded = len(seen[0][1])
+    assert seen[0][0] == "" and folded == store.get_session_info("s").message_count - keep
+
+    summary, tokens, recent = store.get_prompt_history("s")
+    assert summary == "patient is 34, asked about AMH" and tokens > 0
+    assert len(recent) == keep and recent[0].message_id == str(folded + 1)
+
+    # nothing new to fold yet
+    assert not store.maybe_summarize("s", summarize)
+
+
+def test_sessions_expire_after_ttl():
+    store = KVSessionStore(InProcessKV(), ttl=1)
+    _fill(store, 2)
+    assert len(store.get_conversation_history("s")) == 2
+    time.sleep(1.1)
+    assert store.get_conversation_history("s") == []
+    assert store.get_session_info("s") is None
+    store.close()
+
+
+def test_concurrent_writers_keep_ids_in_list_order():
+    store = KVSessionStore(InProcessKV(), max_messages=400)
+    store.create_session("s")
+
+    def writer(w):
+        for i in range(50):
+            store.add_message("s", "user", f"{w}-{i}")
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ids = [int(m.message_id) for m in store.get_conversation_history("s", limit=400)]
+    assert ids == list(range(1, 401))
+    store.close()
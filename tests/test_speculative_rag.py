@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import pytest
+
+from ivf_backend.services import speculative_rag
+from ivf_backend.services.speculative_rag import SpeculationMetrics, SpeculativeRetriever
+
+STABLE = {"type": "result"}
+
+
+class _SlowRAG:
+    """search_similar_chunks blocks until released and tracks how many run at once."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.queries = []
+        self.running = 0
+        self.max_running = 0
+        self.primed = {}
+        self._lock = threading.Lock()
+
+    def search_similar_chunks(self, query, top_k=5):
+        with self._lock:
+            self.queries.append(query)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.release.wait(5)
+        with self._lock:
+            self.running -= 1
+        return [{"id": query}]
+
+    def prime(self, query, chunks, top_k=None):
+        self.primed[query] = chunks
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = speculative_rag._SearchPool(2)
+    monkeypatch.setattr(speculative_rag, "_pool", pool)
+    return pool
+
+
+def test_one_search_in_flight_per_stream(pool):
+    rag = _SlowRAG()
+    metrics = SpeculationMetrics()
+
+    async def scenario():
+        spec = SpeculativeRetriever(rag, metrics)
+        for text in ["what is a", "what is a good", "what is a good amh", "what is a good amh level"]:
+            spec.observe(STABLE, text)
+            await asyncio.sleep(0.01)
+        in_flight = rag.running
+
+        rag.release.set()
+        await asyncio.sleep(0.1)  # the first search ends; only the newest waiting partial follows it
+        reused = await spec.resolve("what is a good amh level")
+        return in_flight, reused
+
+    in_flight, reused = asyncio.run(scenario())
+
+    assert in_flight == 1 and rag.max_running == 1
+    assert rag.queries == ["what is a", "what is a good amh level"]
+    assert reused and rag.primed["what is a good amh level"] == [{"id": "what is a good amh level"}]
+    assert metrics.snapshot()["superseded"] == 2 and metrics.snapshot()["started"] == 2
+    assert pool.running == 0
+
+
+def test_busy_pool_holds_partials_back(pool):
+    rag = _SlowRAG()
+    metrics = SpeculationMetrics()
+
+    async def scenario():
+        streams = [SpeculativeRetriever(rag, metrics) for _ in range(3)]
+        for i, spec in enumerate(streams):
+            spec.observe(STABLE, f"stream {i} asks about embryos")
+            await asyncio.sleep(0.01)
+        started = len(rag.queries)
+
+        rag.release.set()
+        await asyncio.sleep(0.1)
+        streams[2].observe({"type": "partial", "changed": False}, "stream 2 asks about embryos")
+        await asyncio.sleep(0.1)
+        return started
+
+    started = asyncio.run(scenario())
+
+    assert started == pool.workers == 2
+    assert rag.queries[-1] == "stream 2 asks about embryos" and len(rag.queries) == 3
@@ -0,0 +1,79 @@
+from ivf_backend.config import settings
+from ivf_backend.models.chat_models import ChatRequest
+from ivf_backend.services.doctor_chatbot import DoctorChatbot
+from ivf_backend.services.session_store import InProcessKV, KVSessionStore
+
+REPLACEMENT = (
+    "I cannot provide instructions about changing medications or treatment. "
+    "Please consult your fertility specialist or doctor before making medical decisions."
+)
+
+
+class _StubLLM:
+    """Streams fixed deltas and records whether the stream was closed before it ran out."""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.sent = 0
+        self.closed_early = False
+
+    def stream_response(self, **kwargs):
+        try:
+            for delta in self.deltas:
+                self.sent += 1
+                yield delta
+        except GeneratorExit:
+            self.closed_early = True
+            raise
+
+    def summarize_conversation(self, previous_summary, messages):
+        return None
+
+    async def aclose(self):
+        pass
+
+
+def _chatbot(monkeypatch, llm):
+    monkeypatch.setattr(settings, "SUMMARY_EVERY_TURNS", 10_000)
+    chatbot = DoctorChatbot(rag=object(), llm=llm, memory=KVSessionStore(InProcessKV()))
+    turn = {"message": "question", "context": "", "history": [], "chunks": []}
+    monkeypatch.setattr(chatbot, "_prepare_turn", lambda chat_request: turn)
+    return chatbot
+
+
+def _run(chatbot):
+    events = list(chatbot.stream_sentences(ChatRequest(message="question", session_id="s")))
+    return [e["text"] for e in events if e["type"] == "sentence"], events[-1]["response"]
+
+
+def test_unsafe_sentence_closes_the_stream_and_voices_only_the_replacement(monkeypatch):
+    llm = _StubLLM([
+        "Progesterone supports the uterine lining. ",
+        "You can stop taking it early. ",
+        "It is usually given for ten weeks. ",
+        "Ask your doctor.",
+    ])
+    chatbot = _chatbot(monkeypatch, llm)
+
+    sentences, response = _run(chatbot)
+
+    assert llm.closed_early and llm.sent < len(llm.deltas)
+    assert sentences[0] == "Progesterone supports the uterine lining."
+    assert " ".join(sentences[1:]) == REPLACEMENT
+    # the stored answer is what the user heard
+    assert response.response == f"Progesterone supports the uterine lining. {REPLACEMENT}"
+    history = chatbot.memory_manager.get_conversation_history("s")
+    assert history[-1].content == response.response
+    chatbot._executor.shutdown()
+
+
+def test_safe_answer_voices_each_sentence_once_plus_disclaimer(monkeypatch):
+    llm = _StubLLM(["An embryo transfer is quick. ", "Most clinics use ultrasound guidance."])
+    chatbot = _chatbot(monkeypatch, llm)
+
+    sentences, response = _run(chatbot)
+
+    assert not llm.closed_early
+    assert sentences[:2] == ["An embryo transfer is quick.", "Most clinics use ultrasound guidance."]
+    assert " ".join(sentences[2:]) in response.response and "healthcare provider" in sentences[-1]
+    chatbot._executor.shutdown()
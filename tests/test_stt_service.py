@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+import pytest
+
+from ivf_backend.config import settings
+from ivf_backend.services.speech_to_text import RecognizerPool
+from ivf_backend.services.stt_service import STTBackend, STTService, STTUnavailableError, StubRemoteBackend
+
+PCM = b"\x00\x01" * 1600
+
+
+@pytest.fixture(autouse=True)
+def no_vad(monkeypatch):
+    # policies are about backends; one segment per request keeps the call counts exact
+    monkeypatch.setattr(settings, "VAD_ENABLED", False)
+
+
+def _local(text="local text", latency=0.0, fail=False):
+    backend = StubRemoteBackend(text, latency=latency, fail=fail)
+    backend.name = "local"
+    return backend
+
+
+def _transcribe(service, policy):
+    return asyncio.run(service.transcribe(PCM, policy=policy))
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        STTBackend()
+
+
+def test_local_only_never_calls_remote():
+    local, remote = _local(), StubRemoteBackend("remote text")
+    result = _transcribe(STTService(local=local, remote=remote), "local_only")
+    assert result["text"] == "local text" and result["engine"] == "local"
+    assert remote.calls == 0
+
+
+def test_local_only_without_local_backend_is_unavailable():
+    with pytest.raises(STTUnavailableError):
+        _transcribe(STTService(local=None, remote=StubRemoteBackend("remote text")), "local_only")
+
+
+def test_fallback_prefers_remote():
+    local, remote = _local(), StubRemoteBackend("remote text")
+    result = _transcribe(STTService(local=local, remote=remote), "fallback")
+    assert result["engine"] == "stub" and result["text"] == "remote text"
+    assert local.calls == 0
+
+
+@pytest.mark.parametrize("remote", [
+    StubRemoteBackend("remote text", fail=True),
+    StubRemoteBackend("remote text", latency=0.5),
+])
+def test_fallback_uses_local_on_remote_error_or_timeout(remote):
+    service = STTService(local=_local(), remote=remote, remote_timeout=0.1)
+    result = _transcribe(service, "fallback")
+    assert result["engine"] == "local" and result["text"] == "local text"
+
+
+def test_latency_first_faster_engine_wins():
+    service = STTService(local=_local(latency=0.3), remote=StubRemoteBackend("remote text", latency=0.01))
+    assert _transcribe(service, "latency_first")["engine"] == "stub"
+
+    service = STTService(local=_local(latency=0.01), remote=StubRemoteBackend("remote text", latency=0.3))
+    assert _transcribe(service, "latency_first")["engine"] == "local"
+
+
+def test_latency_first_empty_transcript_loses_to_slower_text():
+    service = STTService(local=_local(latency=0.1), remote=StubRemoteBackend("", latency=0.01))
+    result = _transcribe(service, "latency_first")
+    assert result["engine"] == "local" and result["text"] == "local text"
+
+
+def test_latency_first_survives_one_failure_and_raises_when_both_fail():
+    service = STTService(local=_local(latency=0.05), remote=StubRemoteBackend(fail=True))
+    assert _transcribe(service, "latency_first")["engine"] == "local"
+
+    service = STTService(local=_local(fail=True), remote=StubRemoteBackend(fail=True))
+    with pytest.raises(RuntimeError):
+        _transcribe(service, "latency_first")
+
+
+def test_cancelled_decode_keeps_its_pool_slot_until_the_thread_finishes():
+    pool = RecognizerPool(stt=object(), size=1, max_queue=0)
+    release = threading.Event()
+    started = threading.Event()
+
+    def decode():
+        started.set()
+        release.wait(5)
+        return "late"
+
+    async def scenario():
+        task = asyncio.ensure_future(pool.run(decode))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        busy = pool.stats()["inflight"]
+        release.set()
+        await asyncio.sleep(0.1)
+        return busy
+
+    try:
+        assert asyncio.run(scenario()) == 1
+        assert pool.stats()["inflight"] == 0
+    finally:
+        release.set()
+        pool.shutdown()
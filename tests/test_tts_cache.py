@@ -0,0 +1,65 @@
+import io
+import os
+import subprocess
+import wave
+
+from ivf_backend.services import text_to_speech
+from ivf_backend.services.text_to_speech import TextToSpeech
+
+
+def _wav(n_frames=4000):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(b"\x00\x01" * n_frames)
+    return buf.getvalue()
+
+
+def _tts(monkeypatch, tmp_path, max_bytes):
+    calls = []
+
+    def fake_espeak(cmd, input, **kwargs):
+        calls.append(input.decode())
+        return subprocess.CompletedProcess(cmd, 0, stdout=_wav())
+
+    monkeypatch.setattr(text_to_speech.subprocess, "run", fake_espeak)
+    tts = TextToSpeech(cache_dir=str(tmp_path), max_cache_bytes=max_bytes)
+    tts._binary = "espeak-ng"
+    return tts, calls
+
+
+def _age(tts, sentence, seconds):
+    path = tts._cache_path(sentence)
+    t = path.stat().st_mtime - seconds
+    os.utime(path, (t, t))
+
+
+def test_cache_is_capped_and_evicts_least_recently_used(monkeypatch, tmp_path):
+    clip = len(_wav())
+    tts, calls = _tts(monkeypatch, tmp_path, max_bytes=3 * clip)
+
+    for i, s in enumerate(["one.", "two.", "three."]):
+        tts.synthesize_sentence(s)
+        _age(tts, s, 100 - i * 10)
+
+    tts.synthesize_sentence("one.")  # hit: refreshes "one." so "two." is now the oldest
+    assert calls == ["one.", "two.", "three."]
+
+    tts.synthesize_sentence("four.")
+    cached = {p.name for p in tmp_path.glob("*.wav")}
+    assert tts._cache_path("two.").name not in cached
+    assert tts._cache_path("one.").name in cached and tts._cache_path("four.").name in cached
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.wav")) <= 3 * clip
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_existing_cache_counts_towards_the_cap(monkeypatch, tmp_path):
+    clip = len(_wav())
+    tts, _ = _tts(monkeypatch, tmp_path, max_bytes=10 * clip)
+    for s in ["a.", "b.", "c."]:
+        tts.synthesize_sentence(s)
+
+    reopened, _ = _tts(monkeypatch, tmp_path, max_bytes=10 * clip)
+    assert reopened._cache_bytes == 3 * clip
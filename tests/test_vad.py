@@ -0,0 +1,61 @@
+import asyncio
+
+import numpy as np
+
+from ivf_backend.config import settings
+from ivf_backend.services.audio_service import AudioService, TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH
+from ivf_backend.services.stt_service import STTService, StubRemoteBackend
+
+RNG = np.random.default_rng(0)
+
+
+def _tone(seconds, amplitude):
+    t = np.arange(int(seconds * TARGET_SAMPLE_RATE)) / TARGET_SAMPLE_RATE
+    return amplitude * np.sin(2 * np.pi * 220 * t)
+
+
+def _noise(seconds, amplitude=5):
+    return RNG.normal(0, amplitude, int(seconds * TARGET_SAMPLE_RATE))
+
+
+def _pcm(*parts):
+    return np.concatenate(parts).astype(np.int16).tobytes()
+
+
+def _seconds(byte_range):
+    lo, hi = byte_range
+    return (hi - lo) / (TARGET_SAMPLE_WIDTH * TARGET_SAMPLE_RATE)
+
+
+def test_clip_without_silence_is_one_full_range():
+    pcm = _pcm(_tone(2.0, 8000))
+    assert AudioService.detect_speech(pcm) == [(0, len(pcm))]
+
+
+def test_pauses_split_the_clip_and_are_trimmed():
+    pcm = _pcm(_noise(1.0), _tone(1.0, 8000), _noise(1.5), _tone(1.0, 8000), _noise(1.0))
+
+    ranges = AudioService.detect_speech(pcm)
+    assert len(ranges) == 2
+    pad = 2 * settings.VAD_PADDING_MS / 1000
+    assert all(1.0 <= _seconds(r) <= 1.0 + pad + 0.1 for r in ranges)
+    assert len(AudioService.trim_silence(pcm)) < len(pcm) * 0.6
+
+
+def test_quiet_clip_is_still_transcribed():
+    # speech RMS ~70, below the VAD_MIN_RMS floor: the VAD finds nothing
+    pcm = _pcm(_noise(0.5, 2), _tone(1.5, 100), _noise(0.5, 2))
+    assert AudioService.detect_speech(pcm) == []
+
+    backend = StubRemoteBackend("my amh is low")
+    result = asyncio.run(STTService(local=backend, remote=None).transcribe(pcm, policy="local_only"))
+    assert result["text"] == "my amh is low" and result["segments"] == 1
+    assert backend.calls == 1
+
+
+def test_digital_silence_skips_the_recognizer():
+    backend = StubRemoteBackend("should not run")
+    pcm = bytes(TARGET_SAMPLE_RATE * TARGET_SAMPLE_WIDTH)
+    result = asyncio.run(STTService(local=backend, remote=None).transcribe(pcm, policy="local_only"))
+    assert result["engine"] == "vad" and result["text"] == ""
+    assert backend.calls == 0